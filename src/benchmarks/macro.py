@@ -0,0 +1,141 @@
+import math
+import time
+from collections import Counter
+from typing import Any, Callable
+
+from common import expressions, fake_krpc, gravity_turn, staging, streams, utils
+
+
+class _Phases:
+    """Counts RPCs per mission phase. A phase starts whenever the code being measured logs a
+    message, and is named after it."""
+
+    def __init__(self, conn: Any):
+        self._conn = conn
+        self.rpcs: Counter[str] = Counter()
+        self._name = "setup"
+        self._start = self._total()
+        self._log = utils.log
+
+    def _total(self):
+        return sum(self._conn.rpc_calls.values())
+
+    def mark(self, name: str):
+        total = self._total()
+        self.rpcs[self._name] += total - self._start
+        (self._name, self._start) = (name, total)
+
+    def __enter__(self):
+        def log(conn: Any, content: str, duration: float = 5):
+            self.mark(content)
+            self._log(conn, content, duration)
+
+        utils.log = log
+        return self
+
+    def __exit__(self, *args):
+        self.mark("")
+        utils.log = self._log
+
+
+def _mission(scenario: str, fly: Callable[[Any, Any], dict[str, float]]):
+    conn = fake_krpc.connect(scenario=scenario, time_scale=math.inf)
+    try:
+        vessel = conn.space_center.active_vessel
+        vessel.auto_pilot.engage()
+        start = time.perf_counter()
+        with _Phases(conn) as phases:
+            phases.mark("start")
+            metrics = fly(conn, vessel)
+        metrics["real_seconds"] = time.perf_counter() - start
+        rpcs = {name: count for name, count in phases.rpcs.items() if name != "setup"}
+        return {**metrics, "total_rpcs": sum(rpcs.values()), "rpcs": rpcs}
+    finally:
+        conn.close()
+
+
+def _execute_node(conn: Any, vessel: Any, cutoff: str = "overshoot"):
+    node = vessel.control.add_node(conn.space_center.ut + 120, prograde=100)
+    (apoapsis, periapsis) = (node.orbit.apoapsis_altitude, node.orbit.periapsis_altitude)
+    mass = vessel.mass
+    utils.execute_node(conn, vessel, node, cutoff=cutoff)
+    return {
+        "apoapsis_error_m": abs(vessel.orbit.apoapsis_altitude - apoapsis),
+        "periapsis_error_m": abs(vessel.orbit.periapsis_altitude - periapsis),
+        "fuel_used_kg": mass - vessel.mass,
+    }
+
+
+def _execute_node_predictive(conn: Any, vessel: Any):
+    return _execute_node(conn, vessel, "predictive")
+
+
+def _circularize(conn: Any, vessel: Any):
+    node = vessel.control.add_node(conn.space_center.ut + 60, prograde=150)
+    utils.execute_node(conn, vessel, node)
+    utils.log(conn, "Circularizing.")
+    utils.circularize(conn, vessel)
+    orbit = vessel.orbit
+    return {"eccentricity_error_m": orbit.apoapsis_altitude - orbit.periapsis_altitude}
+
+
+def _hohmann(conn: Any, vessel: Any):
+    target = 200_000
+    utils.hohmann(conn, vessel, target)
+    return {
+        "apoapsis_error_m": abs(vessel.orbit.apoapsis_altitude - target),
+        "periapsis_error_m": abs(vessel.orbit.periapsis_altitude - target),
+    }
+
+
+def _gravity_turn(conn: Any, vessel: Any):
+    """gravturn's recording ascent, without the menus: straight up, pitch over, then follow
+    surface prograde until the apoapsis is high enough."""
+    (turn_start_speed, turn_start_pitch, target_apoapsis) = (60, 6, 80_000)
+    registry = streams.StreamRegistry(conn)
+    ascent = gravity_turn.GravityTurn(conn, vessel, registry)
+    srb_fuel = expressions.resource_amount(
+        conn, vessel, "SolidFuel", vessel.control.current_stage - 2
+    )
+    staging_engine = staging.StagingEngine(conn)
+
+    utils.log(conn, "Launching.")
+    vessel.control.throttle = 1
+    ascent.launch(90)
+    staging_engine.when(srb_fuel <= 0, vessel.control.activate_next_stage)
+    ascent.wait_for_speed(turn_start_speed)
+
+    utils.log(conn, "Starting gravity turn.")
+    ascent.start_turn(turn_start_pitch)
+
+    utils.log(conn, "Tracking prograde.")
+    rpcs = sum(conn.rpc_calls.values())
+    start = time.perf_counter()
+    iterations = ascent.track_prograde(target_apoapsis)
+    elapsed = time.perf_counter() - start
+    rpcs = sum(conn.rpc_calls.values()) - rpcs
+    vessel.control.throttle = 0
+    utils.log(conn, "MECO.")
+    overshoot = ascent.apoapsis() - target_apoapsis
+    staging_engine.close()
+    registry.close()
+    return {
+        "loop_iterations": iterations,
+        "loop_iterations_per_second": iterations / elapsed,
+        "rpcs_per_iteration": rpcs / max(iterations, 1),
+        "apoapsis_overshoot_m": overshoot,
+    }
+
+
+MISSIONS: dict[str, tuple[str, Callable[[Any, Any], dict[str, float]]]] = {
+    "execute_node": ("orbit", _execute_node),
+    "execute_node_predictive": ("orbit", _execute_node_predictive),
+    "circularize": ("orbit", _circularize),
+    "hohmann": ("orbit", _hohmann),
+    "gravity_turn": ("launchpad", _gravity_turn),
+}
+
+
+def run() -> dict[str, dict[str, Any]]:
+    """Fly each mission against the fake client, as fast as it will go."""
+    return {name: _mission(scenario, fly) for name, (scenario, fly) in MISSIONS.items()}
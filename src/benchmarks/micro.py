@@ -0,0 +1,41 @@
+import timeit
+from types import SimpleNamespace
+from typing import Callable
+
+from common import orbits, utils
+from common.brachistochrone import ShipState
+
+# stand-ins for the kRPC objects the helpers read, so only the math is timed
+_SHIP = ShipState(available_thrust=60_000, specific_impulse=345, mass=4_000, propellant_mass=2_000)
+_KERBIN = SimpleNamespace(gravitational_parameter=3.5316e12, equatorial_radius=600_000)
+_ORBIT = SimpleNamespace(body=_KERBIN, apoapsis=700_000, periapsis=700_000)
+_KEPLER = orbits.circular(3.5316e12, 700_000, 0.1, 0.0)
+_A = (1.0, 2.0, 3.0)
+_B = (-4.0, 0.5, 2.0)
+
+BENCHMARKS: dict[str, Callable[[], object]] = {
+    "vec_sum": lambda: utils.vec_sum(_A, _B),
+    "vec_difference": lambda: utils.vec_difference(_A, _B),
+    "vec_scalar_mult": lambda: utils.vec_scalar_mult(2.0, _A),
+    "vec_dot": lambda: utils.vec_dot(_A, _B),
+    "vec_cross": lambda: utils.vec_cross(_A, _B),
+    "vec_magnitude": lambda: utils.vec_magnitude(_A),
+    "vec_normalize": lambda: utils.vec_normalize(_A),
+    "vec_angle": lambda: utils.vec_angle(_A, _B),
+    "get_burn_time": lambda: utils.get_burn_time(_SHIP, 500),
+    "get_dv_of_burn": lambda: utils.get_dv_of_burn(_SHIP, 30),
+    "hohmann_dv": lambda: utils._get_hohmann_dv(_ORBIT, 2_000_000),
+    "hohmann_transfer_time": lambda: utils._get_hohmann_transfer_time(_ORBIT, 2_000_000),
+    "kepler_state_at": lambda: _KEPLER.state_at(1234.5),
+}
+
+
+def run(repeat: int = 5) -> dict[str, dict[str, float]]:
+    """Best-of-repeat time per call of each benchmark, in nanoseconds."""
+    results = {}
+    for name, func in BENCHMARKS.items():
+        timer = timeit.Timer(func)
+        (number, _) = timer.autorange()
+        best = min(timer.repeat(repeat, number)) / number
+        results[name] = {"ns_per_call": best * 1e9}
+    return results
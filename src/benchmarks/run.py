@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+from typing import Any
+
+from benchmarks import macro, micro
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# errors this small (in metres) are noise, however much bigger they are than the baseline's
+_ACCURACY_SLACK = 5.0
+# nor are a few extra RPCs in a phase, from where a stream update happened to land
+_RPC_SLACK = 2
+
+
+def _flatten(results: dict[str, Any], prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _is_timing(name: str):
+    return name.endswith(("_per_second", "real_seconds", "ns_per_call"))
+
+
+def _regressed(name: str, baseline: float, current: float, tolerance: float):
+    if name.endswith("loop_iterations"):  # depends on how fast the fake ran, not better or worse
+        return False
+    if name.endswith("_per_second"):
+        return current < baseline * (1 - tolerance)
+    slack = 0
+    if name.endswith("_m"):
+        slack = _ACCURACY_SLACK
+    elif ".rpcs." in name or name.endswith("_rpcs"):
+        slack = _RPC_SLACK
+    return abs(current) > abs(baseline) * (1 + tolerance) + slack
+
+
+def compare(
+    baseline: dict[str, Any], results: dict[str, Any], tolerance: float, time_tolerance: float
+):
+    """Metrics that got worse than the baseline by more than tolerance (relative), or
+    time_tolerance for timings, which are noisier. Returns (name, baseline, current) for each."""
+    old = _flatten(baseline)
+    return [
+        (name, old[name], value)
+        for name, value in _flatten(results).items()
+        if name in old
+        and _regressed(name, old[name], value, time_tolerance if _is_timing(name) else tolerance)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmarks and compare to a baseline.")
+    parser.add_argument("--update", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--time-tolerance", type=float, default=0.5)
+    parser.add_argument("--only", choices=("micro", "macro"))
+    args = parser.parse_args()
+
+    results = {}
+    if args.only != "macro":
+        results["micro"] = micro.run()
+    if args.only != "micro":
+        results["macro"] = macro.run()
+    print(json.dumps(results, indent=2))
+
+    if args.update or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, results, args.tolerance, args.time_tolerance)
+    for name, old, new in regressions:
+        print(f"REGRESSION {name}: {old:.4g} -> {new:.4g}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+import math
+import sys
+from typing import Any, Callable
+
+from krpc.client import Client
+
+from common import expressions, streams, utils
+from common.krpc_types.SpaceCenter import Node, Vessel
+from common.performance import VesselPerformance
+
+RAILS_WARP_RATES = (1, 5, 10, 50, 100, 1_000, 10_000, 100_000)
+
+
+class AsyncStream:
+    """A kRPC stream that coroutines can await. Updates arrive on the stream thread and are
+    handed to the event loop, so nothing blocks while waiting for them.
+
+    The stream comes from the connection's shared registry unless another one is given, so
+    tasks waiting on the same value at once share it, and it lasts until the last one is done."""
+
+    def __init__(
+        self,
+        conn: Client,
+        func: Callable[..., Any],
+        *args: Any,
+        registry: streams.StreamRegistry | None = None,
+    ):
+        self._loop = asyncio.get_running_loop()
+        self._waiters: list[asyncio.Future[Any]] = []
+        self._stream = (streams.shared(conn) if registry is None else registry).stream(func, *args)
+        self._stream.add_callback(self._on_update)
+
+    def _on_update(self, value: Any):
+        self._loop.call_soon_threadsafe(self._wake, value)
+
+    def _wake(self, value: Any):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(value)
+
+    def __call__(self):
+        return self._stream()
+
+    async def changed(self):
+        """The next value the server sends."""
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        return await waiter
+
+    async def until(self, predicate: Callable[[Any], bool]):
+        """Wait for a value matching predicate, and return it."""
+        value = self._stream()
+        while not predicate(value):
+            value = await self.changed()
+        return value
+
+    def remove(self):
+        self._stream.remove_callback(self._on_update)
+        self._stream.remove()
+        for waiter in self._waiters:
+            waiter.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.remove()
+
+
+def stream(
+    conn: Client,
+    func: Callable[..., Any],
+    *args: Any,
+    registry: streams.StreamRegistry | None = None,
+):
+    """Like conn.stream, but awaitable. Must be called from a coroutine."""
+    return AsyncStream(conn, func, *args, registry=registry)
+
+
+async def wait_for(condition: expressions.ServerCondition):
+    """Like expressions.wait_for, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def on_event():
+        loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+    event = condition.add_event()
+    try:
+        event.add_callback(on_event)
+        if not event.stream():
+            await done
+    finally:
+        event.remove()
+
+
+async def wait_for_autopilot(conn: Client, vessel: Vessel, max_error: float = 0.5):
+    """Like vessel.auto_pilot.wait(), which would hold the RPC connection until it returned."""
+    error = expressions.server_value(conn, getattr, vessel.auto_pilot, "error")
+    await wait_for(error <= max_error)
+
+
+async def sleep(conn: Client, seconds: float):
+    """Sleep for the given amount of game time."""
+    async with stream(conn, getattr, conn.space_center, "ut") as ut:
+        end = ut() + seconds
+        await ut.until(lambda now: now >= end)
+
+
+async def warp_to(conn: Client, ut: float, max_rails_rate: float = 100_000):
+    """Like space_center.warp_to, but done from the client by stepping the rails warp factor
+    down as ut gets closer, so other tasks keep running while it warps."""
+    space_center = conn.space_center
+    factor = 0
+    async with stream(conn, getattr, space_center, "ut") as now, stream(
+        conn, getattr, space_center, "maximum_rails_warp_factor"
+    ) as max_factor:
+        while (remaining := ut - now()) > 0:
+            # slow enough to stop within a couple of seconds of real time
+            wanted = max(
+                (
+                    i
+                    for i, rate in enumerate(RAILS_WARP_RATES)
+                    if rate <= max_rails_rate and rate * 2 <= remaining
+                ),
+                default=0,
+            )
+            wanted = min(wanted, max_factor())
+            if wanted != factor:
+                space_center.rails_warp_factor = factor = wanted
+            await now.changed()
+    if factor != 0:
+        space_center.rails_warp_factor = 0
+
+
+async def execute_node(
+    conn: Client, vessel: Vessel, node: Node, performance: VesselPerformance | None = None
+):
+    """Like utils.execute_node with the overshoot cutoff, so another vessel can fly meanwhile."""
+    vessel.auto_pilot.engage()
+    vessel.auto_pilot.reference_frame = node.reference_frame
+    vessel.auto_pilot.target_direction = (0, 1, 0)
+    await wait_for_autopilot(conn, vessel)
+    async with stream(conn, getattr, node, "time_to") as time_to, stream(
+        conn, getattr, node, "remaining_delta_v"
+    ) as remaining_dv:
+        burn_time = utils.get_burn_time(
+            vessel if performance is None else performance, remaining_dv()
+        )
+        if math.isinf(burn_time):
+            utils.log(conn, "Not enough dV for the burn, aborting.")
+            sys.exit()
+        if time_to() > burn_time / 2 + 2:
+            await warp_to(conn, conn.space_center.ut + time_to() - burn_time / 2 - 2)
+        await time_to.until(lambda time: time <= burn_time / 2)
+
+        if burn_time > 0.5:
+            vessel.control.throttle = 1
+        await sleep(conn, burn_time - 0.3)
+        vessel.control.throttle = 0.05
+        await wait_for(expressions.burn_overshoot(conn, node))
+    node.remove()
+    vessel.control.throttle = 0
+
+
+async def circularize(conn: Client, vessel: Vessel, performance: VesselPerformance | None = None):
+    await execute_node(conn, vessel, utils.add_circularize_node(conn, vessel), performance)
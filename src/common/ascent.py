@@ -0,0 +1,282 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Sequence
+
+from common.krpc_types.SpaceCenter import Vessel
+from common.performance import G0
+
+
+@dataclass(frozen=True)
+class Planet:
+    """What the simulator needs to know about the body being launched from. The atmosphere is
+    exponential, cut off at atmosphere_depth."""
+
+    radius: float
+    mu: float
+    rotational_speed: float  # rad/s
+    atmosphere_depth: float
+    surface_density: float
+    scale_height: float
+
+    def density(self, altitude: float):
+        if altitude >= self.atmosphere_depth:
+            return 0.0
+        return self.surface_density * math.exp(-max(altitude, 0) / self.scale_height)
+
+    def pressure(self, altitude: float):
+        """In atmospheres, for interpolating Isp."""
+        return self.density(altitude) / self.surface_density
+
+
+KERBIN = Planet(600_000, 3.5316e12, 2 * math.pi / 21_549.425, 70_000, 1.225, 5_600)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One burn: every engine running in a stage, from when it's activated until the parts it
+    drops next are out of propellant."""
+
+    start_mass: float
+    end_mass: float
+    vacuum_thrust: float
+    vacuum_isp: float
+    sea_level_isp: float
+
+    @property
+    def flow_rate(self):
+        return self.vacuum_thrust / (self.vacuum_isp * G0)
+
+    def thrust(self, pressure: float):
+        isp = self.vacuum_isp + (self.sea_level_isp - self.vacuum_isp) * min(pressure, 1)
+        return self.flow_rate * isp * G0
+
+
+@dataclass(frozen=True)
+class Vehicle:
+    stages: Sequence[Stage]
+    drag_area: float  # drag coefficient times area, m^2
+
+    @classmethod
+    def of(cls, vessel: Vessel, drag_area: float = 1.0):
+        """Read the vessel's stages once, like a staging calculator would: each stage burns the
+        propellant in the parts it will drop when the next stage is activated."""
+        parts = [(part.mass, part.dry_mass, part.decouple_stage) for part in vessel.parts.all]
+        engines = [
+            (
+                engine.part.stage,
+                engine.part.decouple_stage,
+                engine.max_vacuum_thrust,
+                engine.vacuum_specific_impulse,
+                engine.kerbin_sea_level_specific_impulse,
+            )
+            for engine in vessel.parts.engines
+        ]
+        stages = []
+        for stage in range(vessel.control.current_stage - 1, -1, -1):
+            start_mass = sum(mass for (mass, _, decouple) in parts if decouple < stage)
+            propellant = sum(
+                mass - dry_mass for (mass, dry_mass, decouple) in parts if decouple == stage - 1
+            )
+            running = [e for e in engines if e[0] >= stage and e[1] < stage and e[3] > 0]
+            thrust = sum(e[2] for e in running)
+            if thrust <= 0 or propellant <= 0:
+                continue
+            # engines burning together have the thrust-weighted harmonic mean Isp
+            vacuum_isp = thrust / sum(e[2] / e[3] for e in running)
+            sea_level_isp = thrust / sum(e[2] / max(e[4], 1e-3) for e in running)
+            stages.append(
+                Stage(start_mass, start_mass - propellant, thrust, vacuum_isp, sea_level_isp)
+            )
+        return cls(stages, drag_area)
+
+
+@dataclass(frozen=True)
+class AscentParameters:
+    """The gravturn values the optimizer tunes."""
+
+    turn_start_speed: float
+    turn_start_pitch: float
+    apoapsis_margin: float
+
+
+@dataclass(frozen=True)
+class AscentResult:
+    """delta_v is everything needed to end up in a circular orbit at apoapsis_altitude, or inf if
+    the ascent failed."""
+
+    delta_v: float
+    ascent_delta_v: float
+    circularization_delta_v: float
+    apoapsis_altitude: float
+    flight_time: float
+
+
+FAILED = AscentResult(math.inf, math.inf, math.inf, math.nan, math.nan)
+
+
+def _apoapsis(mu: float, x: float, y: float, vx: float, vy: float):
+    r = math.hypot(x, y)
+    energy = (vx * vx + vy * vy) / 2 - mu / r
+    if energy >= 0:
+        return math.inf
+    a = -mu / (2 * energy)
+    h = x * vy - y * vx
+    e = math.sqrt(max(0.0, 1 + 2 * energy * h * h / (mu * mu)))
+    return a * (1 + e)
+
+
+def simulate(
+    vehicle: Vehicle,
+    parameters: AscentParameters,
+    target_apoapsis: float,
+    target_inclination: float = 0,
+    planet: Planet = KERBIN,
+    dt: float = 0.1,
+    max_time: float = 1200,
+) -> AscentResult:
+    """Fly gravturn's recording profile as a point mass in the launch plane: straight up until
+    turn_start_speed, pitch over by turn_start_pitch until surface prograde catches up, then
+    follow surface prograde until the apoapsis is target_apoapsis + apoapsis_margin. Coasts out
+    of the atmosphere, then adds the delta-v to circularize at whatever apoapsis drag left."""
+    mu, radius = planet.mu, planet.radius
+    # the planet rotates clockwise in this frame, so launching along +x is launching east
+    omega = planet.rotational_speed * math.cos(math.radians(target_inclination))
+    x, y = 0.0, radius
+    vx, vy = omega * radius, 0.0
+    turn_pitch = math.radians(90 - parameters.turn_start_pitch)
+    meco_radius = radius + target_apoapsis + parameters.apoapsis_margin
+    stages = iter(vehicle.stages)
+    stage = next(stages, None)
+    if stage is None:
+        return FAILED
+    mass = stage.start_mass
+    phase = 0  # vertical, pitching over, following prograde, coasting
+    ascent_dv = 0.0
+    t = 0.0
+    while True:
+        r = math.hypot(x, y)
+        altitude = r - radius
+        if altitude < -1 or t > max_time:
+            return FAILED
+        up_x, up_y = x / r, y / r
+        east_x, east_y = up_y, -up_x
+        # surface velocity: the ground under the vessel moves at omega (y, -x)
+        sx, sy = vx - omega * y, vy + omega * x
+        surface_speed = math.hypot(sx, sy)
+        prograde_pitch = math.atan2(sx * up_x + sy * up_y, sx * east_x + sy * east_y)
+
+        if phase == 0 and surface_speed >= parameters.turn_start_speed:
+            phase = 1
+        if phase == 1 and prograde_pitch <= turn_pitch:
+            phase = 2
+        if phase < 3 and _apoapsis(mu, x, y, vx, vy) >= meco_radius:
+            phase = 3
+        if phase == 3:
+            if altitude >= planet.atmosphere_depth:
+                break
+            if sx * up_x + sy * up_y < 0:  # past apoapsis without leaving the atmosphere
+                return FAILED
+
+        ax = -mu * x / r**3
+        ay = -mu * y / r**3
+        density = planet.density(altitude)
+        if density > 0 and surface_speed > 0:
+            drag = 0.5 * density * surface_speed * vehicle.drag_area / mass
+            ax -= drag * sx
+            ay -= drag * sy
+        if phase < 3:
+            assert stage is not None
+            pitch = math.pi / 2 if phase == 0 else turn_pitch if phase == 1 else prograde_pitch
+            thrust = stage.thrust(planet.pressure(altitude)) / mass
+            ax += thrust * (math.cos(pitch) * east_x + math.sin(pitch) * up_x)
+            ay += thrust * (math.cos(pitch) * east_y + math.sin(pitch) * up_y)
+            ascent_dv += thrust * dt
+            mass -= stage.flow_rate * dt
+            if mass <= stage.end_mass:
+                stage = next(stages, None)
+                if stage is None:  # out of propellant before MECO
+                    return FAILED
+                mass = stage.start_mass
+
+        vx += ax * dt
+        vy += ay * dt
+        x += vx * dt
+        y += vy * dt
+        t += dt
+
+    apoapsis = _apoapsis(mu, x, y, vx, vy)
+    if not math.isfinite(apoapsis):
+        return FAILED
+    # speed at apoapsis from conservation of angular momentum
+    apoapsis_speed = abs(x * vy - y * vx) / apoapsis
+    circularization_dv = abs(math.sqrt(mu / apoapsis) - apoapsis_speed)
+    return AscentResult(
+        ascent_dv + circularization_dv, ascent_dv, circularization_dv, apoapsis - radius, t
+    )
+
+
+def _simulate(args: tuple[Vehicle, AscentParameters, float, float, Planet]):
+    return simulate(*args)
+
+
+def optimize(
+    vehicle: Vehicle,
+    target_apoapsis: float,
+    target_inclination: float = 0,
+    planet: Planet = KERBIN,
+    processes: int | None = None,
+    miss_penalty: float = 0.1,
+) -> tuple[AscentParameters, AscentResult]:
+    """Find the gravturn parameters that use the least delta-v to get to the target orbit, plus
+    miss_penalty m/s for every metre the apoapsis ends up away from the target. A coarse grid
+    is simulated across a process pool, then refined by pattern search from the best point,
+    evaluating all the neighbours of each step in parallel."""
+    with ProcessPoolExecutor(processes) as executor:
+
+        def evaluate(candidates: list[AscentParameters]):
+            args = [
+                (vehicle, candidate, target_apoapsis, target_inclination, planet)
+                for candidate in candidates
+            ]
+            return [
+                (candidate, result, cost(result))
+                for candidate, result in zip(candidates, executor.map(_simulate, args, chunksize=4))
+            ]
+
+        def cost(result: AscentResult):
+            if not math.isfinite(result.delta_v):
+                return math.inf
+            miss = abs(result.apoapsis_altitude - target_apoapsis)
+            return result.delta_v + miss_penalty * miss
+
+        grid = [
+            AscentParameters(speed, pitch, margin)
+            for speed in range(10, 160, 10)
+            for pitch in range(1, 16)
+            for margin in range(-1000, 4000, 1000)
+        ]
+        (best, best_result, best_cost) = min(evaluate(grid), key=lambda row: row[2])
+        if not math.isfinite(best_cost):
+            raise ValueError("No ascent reached orbit")
+
+        steps = [5.0, 0.5, 250.0]
+        min_steps = [0.5, 0.05, 25.0]
+        while any(step > min_step for step, min_step in zip(steps, min_steps)):
+            neighbours = []
+            for axis, step in enumerate(steps):
+                for sign in (-1, 1):
+                    values = [
+                        best.turn_start_speed,
+                        best.turn_start_pitch,
+                        best.apoapsis_margin,
+                    ]
+                    values[axis] += sign * step
+                    if values[0] > 0 and values[1] > 0:
+                        neighbours.append(AscentParameters(*values))
+            (candidate, result, candidate_cost) = min(evaluate(neighbours), key=lambda row: row[2])
+            if candidate_cost < best_cost:
+                (best, best_result, best_cost) = (candidate, result, candidate_cost)
+            else:
+                steps = [step / 2 for step in steps]
+    return (best, best_result)
@@ -0,0 +1,197 @@
+import math
+from dataclasses import dataclass, replace
+
+from krpc.client import Client
+
+from common import orbits, utils
+from common.krpc_types.SpaceCenter import CelestialBody, Vessel
+from common.performance import G0, VesselPerformance
+from common.utils import Vec3
+
+
+@dataclass(frozen=True)
+class ShipState:
+    """What the burn functions in utils read from a vessel, copied so they don't need RPCs.
+    Has the same attribute names as Vessel, so it can be passed to them directly.
+
+    propellant_mass is what the engines can burn before they flame out."""
+
+    available_thrust: float
+    specific_impulse: float
+    mass: float
+    propellant_mass: float
+
+    @classmethod
+    def of(cls, vessel: Vessel | VesselPerformance):
+        """With a VesselPerformance, the propellant is the current stage's. A Vessel can only
+        tell us all the resources on board, so that's an upper bound."""
+        if isinstance(vessel, VesselPerformance):
+            stage = vessel.stages[0]
+            return cls(
+                stage.thrust,
+                stage.specific_impulse,
+                stage.start_mass,
+                stage.start_mass - stage.end_mass,
+            )
+        mass = vessel.mass
+        return cls(vessel.available_thrust, vessel.specific_impulse, mass, mass - vessel.dry_mass)
+
+    @property
+    def exhaust_velocity(self):
+        return self.specific_impulse * G0
+
+    @property
+    def flow_rate(self):
+        return self.available_thrust / self.exhaust_velocity
+
+    def after_burn(self, burn_time: float):
+        burned = self.flow_rate * burn_time
+        return replace(self, mass=self.mass - burned, propellant_mass=self.propellant_mass - burned)
+
+    def burn_distance(self, burn_time: float):
+        """Distance covered from rest by burning for this long (the integral of get_dv_of_burn)."""
+        x = 1 - self.flow_rate * burn_time / self.mass
+        return self.exhaust_velocity * self.mass / self.flow_rate * (x * math.log(x) - x + 1)
+
+    @property
+    def max_burn_time(self):
+        """How long until the propellant runs out."""
+        return self.propellant_mass / self.flow_rate
+
+
+@dataclass(frozen=True)
+class Plan:
+    """A flip-and-burn intercept: full thrust along accelerate_direction until flip_ut, then
+    along decelerate_direction until arrival_ut. Directions are unit vectors in the target's
+    parent body's non-rotating reference frame."""
+
+    start_ut: float
+    flip_ut: float
+    arrival_ut: float
+    accelerate_direction: Vec3
+    decelerate_direction: Vec3
+    delta_v: float
+
+    def direction_at(self, ut: float) -> Vec3:
+        return self.accelerate_direction if ut < self.flip_ut else self.decelerate_direction
+
+
+def _burn_directions(
+    ship: ShipState, accelerate_time: float, decelerate_time: float, dv: Vec3, displacement: Vec3
+):
+    """The directions two full-thrust burns of these lengths would need to change velocity by
+    dv and end up displaced by displacement (both relative to coasting). Only unit vectors if
+    the burn times are right."""
+    dv1 = utils.get_dv_of_burn(ship, accelerate_time)
+    s1 = ship.burn_distance(accelerate_time)
+    second = ship.after_burn(accelerate_time)
+    dv2 = utils.get_dv_of_burn(second, decelerate_time)
+    s2 = second.burn_distance(decelerate_time)
+    # dv1 u1 + dv2 u2 = dv and (s1 + dv1 t2) u1 + s2 u2 = displacement, solved for u1 and u2
+    k = s1 + dv1 * decelerate_time
+    det = dv1 * s2 - dv2 * k
+    u1 = utils.vec_scalar_mult(
+        1 / det,
+        utils.vec_difference(
+            utils.vec_scalar_mult(s2, dv), utils.vec_scalar_mult(dv2, displacement)
+        ),
+    )
+    u2 = utils.vec_scalar_mult(
+        1 / det,
+        utils.vec_difference(
+            utils.vec_scalar_mult(dv1, displacement), utils.vec_scalar_mult(k, dv)
+        ),
+    )
+    return (u1, u2)
+
+
+def solve(
+    ship: ShipState,
+    position: Vec3,
+    velocity: Vec3,
+    target: orbits.KeplerOrbit,
+    ut: float,
+    tolerance: float = 1e-6,
+    max_iterations: int = 50,
+) -> Plan:
+    """Plan a flip-and-burn from position/velocity at ut to rendezvous with target, which must be
+    in the same frame. Gravity is ignored, which is fine for torchships but nothing else.
+
+    For a given arrival time, the flip time is found by bisection so both burns need the same
+    (normalized) thrust, and the arrival time itself by the secant method until that thrust is
+    exactly what the vessel has."""
+
+    def evaluate(travel_time: float):
+        (target_position, target_velocity) = target.state_at(ut + travel_time)
+        dv = utils.vec_difference(target_velocity, velocity)
+        displacement = utils.vec_difference(
+            target_position, utils.vec_sum(position, utils.vec_scalar_mult(travel_time, velocity))
+        )
+
+        def imbalance(accelerate_time: float):
+            (u1, u2) = _burn_directions(
+                ship, accelerate_time, travel_time - accelerate_time, dv, displacement
+            )
+            return (utils.vec_magnitude(u1) - utils.vec_magnitude(u2), u1, u2)
+
+        lo, hi = 0.0, travel_time
+        for _ in range(60):
+            mid = (lo + hi) / 2
+            if imbalance(mid)[0] > 0:  # first burn needs more thrust than it has, so lengthen it
+                lo = mid
+            else:
+                hi = mid
+        accelerate_time = (lo + hi) / 2
+        (_, u1, u2) = imbalance(accelerate_time)
+        return (utils.vec_magnitude(u1) - 1, accelerate_time, u1, u2)
+
+    acceleration = ship.available_thrust / ship.mass
+    distance = utils.vec_magnitude(utils.vec_difference(target.position_at(ut), position))
+    closing_speed = utils.vec_magnitude(utils.vec_difference(target.velocity_at(ut), velocity))
+    # constant acceleration brachistochrone, plus time to cancel the relative velocity
+    limit = ship.max_burn_time * (1 - 1e-9)
+    if evaluate(limit)[0] > 0:
+        raise ValueError("Not enough delta-v to reach the target")
+    t0 = min(2 * math.sqrt(distance / acceleration) + closing_speed / acceleration, limit * 0.9)
+    t1 = min(t0 * 1.1, limit)
+    f0 = evaluate(t0)[0]
+    f1 = evaluate(t1)[0]
+    for _ in range(max_iterations):
+        if abs(f1) < tolerance:
+            break
+        if f1 == f0:
+            raise ValueError("Brachistochrone solver stalled")
+        t0, t1 = t1, utils.clamp(t1 - f1 * (t1 - t0) / (f1 - f0), t1 / 2, limit)
+        f0, f1 = f1, evaluate(t1)[0]
+    else:
+        raise ValueError("Brachistochrone solver didn't converge")
+
+    (_, accelerate_time, u1, u2) = evaluate(t1)
+    return Plan(
+        ut,
+        ut + accelerate_time,
+        ut + t1,
+        utils.vec_normalize(u1),
+        utils.vec_normalize(u2),
+        utils.get_dv_of_burn(ship, t1),
+    )
+
+
+def plan_intercept(
+    conn: Client,
+    vessel: Vessel,
+    target: CelestialBody,
+    performance: VesselPerformance | None = None,
+) -> Plan:
+    """Read the vessel's and target's state once and solve() for an intercept, in the frame of
+    the body the target orbits. Pass the vessel's performance to limit the burns to the current
+    stage's propellant."""
+    assert target.orbit
+    frame = target.orbit.body.non_rotating_reference_frame
+    return solve(
+        ShipState.of(vessel if performance is None else performance),
+        vessel.position(frame),
+        vessel.velocity(frame),
+        orbits.snapshot(target.orbit, frame),
+        conn.space_center.ut,
+    )
@@ -0,0 +1,132 @@
+import time
+from typing import Any, Callable
+
+from krpc.client import Client
+
+from common.krpc_types.SpaceCenter import Node, Vessel
+
+
+class ServerValue:
+    """A value the server computes from remote calls. Compare it against numbers or other
+    ServerValues to get a ServerCondition."""
+
+    def __init__(self, conn: Client, expression: Any, is_double: bool = False):
+        self._conn = conn
+        self._expression = expression
+        self._is_double = is_double
+
+    def _double(self):
+        if self._is_double:
+            return self._expression
+        # calls return whatever type the procedure does (eg. float for resource amounts), and
+        # the server won't compare mismatched types
+        krpc = self._conn.krpc
+        return krpc.Expression.cast(self._expression, krpc.Type.double())
+
+    def _operand(self, other: "ServerValue | float"):
+        if isinstance(other, ServerValue):
+            return other._double()
+        return self._conn.krpc.Expression.constant_double(float(other))
+
+    def _condition(self, build: Callable[[Any, Any], Any], other: "ServerValue | float"):
+        return ServerCondition(self._conn, build(self._double(), self._operand(other)))
+
+    def _value(self, build: Callable[[Any, Any], Any], other: "ServerValue | float"):
+        return ServerValue(self._conn, build(self._double(), self._operand(other)), True)
+
+    def __getitem__(self, index: int):
+        Expression = self._conn.krpc.Expression
+        return ServerValue(
+            self._conn, Expression.get(self._expression, Expression.constant_int(index))
+        )
+
+    def __gt__(self, other: "ServerValue | float"):
+        return self._condition(self._conn.krpc.Expression.greater_than, other)
+
+    def __ge__(self, other: "ServerValue | float"):
+        return self._condition(self._conn.krpc.Expression.greater_than_or_equal, other)
+
+    def __lt__(self, other: "ServerValue | float"):
+        return self._condition(self._conn.krpc.Expression.less_than, other)
+
+    def __le__(self, other: "ServerValue | float"):
+        return self._condition(self._conn.krpc.Expression.less_than_or_equal, other)
+
+    def __add__(self, other: "ServerValue | float"):
+        return self._value(self._conn.krpc.Expression.add, other)
+
+    def __sub__(self, other: "ServerValue | float"):
+        return self._value(self._conn.krpc.Expression.subtract, other)
+
+    def __mul__(self, other: "ServerValue | float"):
+        return self._value(self._conn.krpc.Expression.multiply, other)
+
+    def __truediv__(self, other: "ServerValue | float"):
+        return self._value(self._conn.krpc.Expression.divide, other)
+
+
+class ServerCondition:
+    """A boolean expression evaluated by the server. Combine with &, | and ~."""
+
+    def __init__(self, conn: Client, expression: Any):
+        self._conn = conn
+        self._expression = expression
+
+    def __and__(self, other: "ServerCondition"):
+        return ServerCondition(
+            self._conn, self._conn.krpc.Expression.and_(self._expression, other._expression)
+        )
+
+    def __or__(self, other: "ServerCondition"):
+        return ServerCondition(
+            self._conn, self._conn.krpc.Expression.or_(self._expression, other._expression)
+        )
+
+    def __invert__(self):
+        return ServerCondition(self._conn, self._conn.krpc.Expression.not_(self._expression))
+
+    def add_event(self, callback: Callable[[], None] | None = None):
+        """Start a server-side event for this condition. If given, callback is called from the
+        stream thread each time the condition becomes true. Remember to remove() it."""
+        event = self._conn.krpc.add_event(self._expression)
+        if callback is not None:
+            event.stream.add_callback(lambda value: callback() if value else None)
+        event.start()
+        return event
+
+
+def server_value(conn: Client, func: Callable[..., Any], *args: Any):
+    """The result of func(*args), evaluated on the server. Takes the same arguments as
+    conn.add_stream, eg. server_value(conn, getattr, vessel.orbit, "apoapsis_altitude")."""
+    return ServerValue(conn, conn.krpc.Expression.call(conn.get_call(func, *args)))
+
+
+def burn_overshoot(conn: Client, node: Node):
+    """True once the remaining burn vector points backwards, ie. remaining dV starts going up."""
+    return server_value(conn, node.remaining_burn_vector, node.reference_frame)[1] < 0
+
+
+def resource_amount(
+    conn: Client, vessel: Vessel, resource: str, decouple_stage: int, cumulative: bool = True
+):
+    """Amount of resource in the parts decoupled in decouple_stage (and, if cumulative, in the
+    stages after it), eg. resource_amount(conn, vessel, "SolidFuel", stage) <= 0 at burnout."""
+    resources = vessel.resources_in_decouple_stage(decouple_stage, cumulative)
+    return server_value(conn, resources.amount, resource)
+
+
+def wait_for(condition: ServerCondition, timeout: float | None = None):
+    """Block until the server reports the condition is true. Returns False on timeout."""
+    event = condition.add_event()
+    try:
+        stream = event.stream
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with stream.condition:
+            while not stream():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                stream.wait(remaining)
+        return True
+    finally:
+        event.remove()
@@ -0,0 +1,2446 @@
+import copy
+import math
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Hashable
+
+from common import orbits, utils
+from common.utils import Vec3
+
+G0 = 9.80665
+PHYSICS_DT = 0.02
+PHYSICS_WARP_RATES = (1, 2, 3, 4)
+RAILS_WARP_RATES = (1, 5, 10, 50, 100, 1_000, 10_000, 100_000)
+RESOURCE_DENSITIES = {
+    "LiquidFuel": 5.0,
+    "Oxidizer": 5.0,
+    "SolidFuel": 7.5,
+    "MonoPropellant": 4.0,
+    "XenonGas": 0.1,
+}
+
+
+@dataclass
+class FakeStage:
+    """A group of parts that activate and decouple together.
+
+    Engines light when `stage` is activated and only draw from this group's own fuel."""
+
+    name: str
+    dry_mass: float
+    fuel: float = 0
+    resource: str = "LiquidFuel"
+    thrust: float = 0
+    vacuum_isp: float = 0
+    sea_level_isp: float | None = None
+    stage: int = 0
+    decouple_stage: int = -1
+    drag_area: float = 0.5
+
+    def __post_init__(self):
+        self.max_fuel = self.fuel
+        if self.sea_level_isp is None:
+            self.sea_level_isp = self.vacuum_isp
+
+    @property
+    def is_solid(self):
+        return self.resource == "SolidFuel"
+
+    @property
+    def fuel_mass(self):
+        return self.fuel * RESOURCE_DENSITIES.get(self.resource, 1)
+
+
+def default_rocket() -> list[FakeStage]:
+    """SRB + liquid core lifting an upper stage, staged the way gravturn.py expects."""
+    return [
+        FakeStage(
+            "Booster",
+            dry_mass=3000,
+            fuel=2040,
+            resource="SolidFuel",
+            thrust=600_000,
+            vacuum_isp=210,
+            sea_level_isp=175,
+            stage=3,
+            decouple_stage=2,
+            drag_area=1.0,
+        ),
+        FakeStage(
+            "Core",
+            dry_mass=2000,
+            fuel=3200,
+            thrust=215_000,
+            vacuum_isp=320,
+            sea_level_isp=250,
+            stage=3,
+            decouple_stage=1,
+            drag_area=1.0,
+        ),
+        FakeStage(
+            "Upper",
+            dry_mass=2000,
+            fuel=800,
+            thrust=60_000,
+            vacuum_isp=345,
+            sea_level_isp=85,
+            stage=1,
+        ),
+    ]
+
+
+def _to_local(axes: tuple[Vec3, Vec3, Vec3], v: Vec3) -> Vec3:
+    return (utils.vec_dot(axes[0], v), utils.vec_dot(axes[1], v), utils.vec_dot(axes[2], v))
+
+
+def _to_world(axes: tuple[Vec3, Vec3, Vec3], v: Vec3) -> Vec3:
+    return (
+        axes[0][0] * v[0] + axes[1][0] * v[1] + axes[2][0] * v[2],
+        axes[0][1] * v[0] + axes[1][1] * v[1] + axes[2][1] * v[2],
+        axes[0][2] * v[0] + axes[1][2] * v[1] + axes[2][2] * v[2],
+    )
+
+
+def _basis_from_y(y: Vec3, hint: Vec3) -> tuple[Vec3, Vec3, Vec3]:
+    """Right-handed (x cross y = z) basis with the given y axis and z as close to hint as possible."""
+    y = utils.vec_normalize(y)
+    z = utils.vec_difference(hint, utils.vec_scalar_mult(utils.vec_dot(hint, y), y))
+    if utils.vec_magnitude(z) < 1e-9:
+        z = (1.0, 0.0, 0.0) if abs(y[0]) < 0.9 else (0.0, 0.0, 1.0)
+        z = utils.vec_difference(z, utils.vec_scalar_mult(utils.vec_dot(z, y), y))
+    z = utils.vec_normalize(z)
+    return (utils.vec_cross(y, z), y, z)
+
+
+# Reference frames
+
+
+@dataclass(frozen=True)
+class _FrameState:
+    origin: Vec3
+    axes: tuple[Vec3, Vec3, Vec3]
+    velocity: Vec3
+    angular_velocity: Vec3 = (0.0, 0.0, 0.0)
+
+    def position_to_local(self, p: Vec3):
+        return _to_local(self.axes, utils.vec_difference(p, self.origin))
+
+    def position_to_world(self, p: Vec3):
+        return utils.vec_sum(self.origin, _to_world(self.axes, p))
+
+    def velocity_to_local(self, p: Vec3, v: Vec3):
+        frame_velocity = utils.vec_sum(
+            self.velocity,
+            utils.vec_cross(self.angular_velocity, utils.vec_difference(p, self.origin)),
+        )
+        return _to_local(self.axes, utils.vec_difference(v, frame_velocity))
+
+    def velocity_to_world(self, p: Vec3, v: Vec3):
+        frame_velocity = utils.vec_sum(
+            self.velocity,
+            utils.vec_cross(self.angular_velocity, utils.vec_difference(p, self.origin)),
+        )
+        return utils.vec_sum(_to_world(self.axes, v), frame_velocity)
+
+
+class _Remote:
+    """Base class for fake remote objects. Public attribute access is counted as one RPC."""
+
+    _service = "SpaceCenter"
+    _remote_name = ""
+
+    def __init__(self, client: "FakeClient"):
+        object.__setattr__(self, "_client", client)
+
+    def __getattribute__(self, name: str):
+        if name.startswith("_"):
+            return object.__getattribute__(self, name)
+        cls = type(self)
+        attribute = getattr(cls, name, object.__getattribute__(self, "__dict__").get(name))
+        if isinstance(attribute, type):  # enums and nested classes are client-side
+            return attribute
+        is_method = callable(attribute) and not isinstance(attribute, property)
+        return object.__getattribute__(self, "_client")._call(
+            cls._service,
+            f"{cls._remote_name}_{name}" if is_method else f"{cls._remote_name}_get_{name}",
+            lambda: object.__getattribute__(self, name),
+        )
+
+    def __setattr__(self, name: str, value: Any):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+            return
+        cls = type(self)
+        self._client._call(
+            cls._service,
+            f"{cls._remote_name}_set_{name}",
+            lambda: object.__setattr__(self, name, value),
+        )
+
+    def _init_attributes(self, **attributes: Any):
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+
+
+class FakeReferenceFrame(_Remote):
+    _remote_name = "ReferenceFrame"
+
+    def __init__(self, client: "FakeClient", state: Callable[[], _FrameState]):
+        super().__init__(client)
+        self._state = state
+
+    # like real remote objects, two handles to the same frame are equal
+    def __eq__(self, other: object):
+        return isinstance(other, FakeReferenceFrame) and self._state == other._state
+
+    def __hash__(self):
+        return hash(self._state)
+
+    @classmethod
+    def create_hybrid(
+        cls,
+        position: "FakeReferenceFrame",
+        rotation: "FakeReferenceFrame | None" = None,
+        velocity: "FakeReferenceFrame | None" = None,
+        angular_velocity: "FakeReferenceFrame | None" = None,
+    ):
+        rotation = rotation or position
+        velocity = velocity or position
+        angular_velocity = angular_velocity or rotation
+
+        def state():
+            p, r, v = position._state(), rotation._state(), velocity._state()
+            return _FrameState(
+                p.origin,
+                r.axes,
+                v.velocity_to_world(p.origin, (0, 0, 0)),
+                angular_velocity._state().angular_velocity,
+            )
+
+        client = position._client
+        return client._call(cls._service, "ReferenceFrame_CreateHybrid", lambda: cls(client, state))
+
+
+# Space center
+
+
+class SASMode(Enum):
+    stability_assist = 0
+    maneuver = 1
+    prograde = 2
+    retrograde = 3
+    normal = 4
+    anti_normal = 5
+    radial = 6
+    anti_radial = 7
+    target = 8
+    anti_target = 9
+
+
+class SpeedMode(Enum):
+    orbit = 0
+    surface = 1
+    target = 2
+
+
+class FakeCelestialBody(_Remote):
+    _remote_name = "CelestialBody"
+
+    def __init__(
+        self,
+        client: "FakeClient",
+        name: str,
+        gravitational_parameter: float,
+        equatorial_radius: float,
+        rotational_period: float,
+        sphere_of_influence: float,
+        atmosphere_depth: float = 0,
+        space_high_altitude_threshold: float = 0,
+        parent: "FakeCelestialBody | None" = None,
+        elements: orbits.KeplerOrbit | None = None,
+    ):
+        super().__init__(client)
+        self._name = name
+        self._mu = gravitational_parameter
+        self._radius = equatorial_radius
+        self._rotational_period = rotational_period
+        self._soi = sphere_of_influence
+        self._atmosphere_depth = atmosphere_depth
+        self._space_high = space_high_altitude_threshold
+        self._parent = parent
+        self._elements = elements
+
+    def _world_state(self, ut: float | None = None) -> tuple[Vec3, Vec3]:
+        if self._parent is None or self._elements is None:
+            return ((0.0, 0.0, 0.0), (0.0, 0.0, 0.0))
+        ut = self._client._ut if ut is None else ut
+        (parent_position, parent_velocity) = self._parent._world_state(ut)
+        (position, velocity) = self._elements.state_at(ut)
+        return (utils.vec_sum(parent_position, position), utils.vec_sum(parent_velocity, velocity))
+
+    def _angular_velocity(self) -> Vec3:
+        # pointing south means fixed points move "east" (up cross north)
+        return (0.0, -2 * math.pi / self._rotational_period, 0.0)
+
+    def _rotation_axes(self):
+        theta = 2 * math.pi * self._client._ut / self._rotational_period
+        return (
+            (math.cos(theta), 0.0, math.sin(theta)),
+            (0.0, 1.0, 0.0),
+            (-math.sin(theta), 0.0, math.cos(theta)),
+        )
+
+    def _rotating_state(self):
+        (position, velocity) = self._world_state()
+        return _FrameState(position, self._rotation_axes(), velocity, self._angular_velocity())
+
+    def _non_rotating_state(self):
+        (position, velocity) = self._world_state()
+        return _FrameState(position, ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)), velocity)
+
+    def _orbital_state(self):
+        (position, velocity) = self._world_state()
+        if self._parent is None:
+            return self._non_rotating_state()
+        (parent_position, parent_velocity) = self._parent._world_state()
+        return _FrameState(
+            position,
+            _orbital_axes(
+                utils.vec_difference(position, parent_position),
+                utils.vec_difference(velocity, parent_velocity),
+            ),
+            velocity,
+        )
+
+    def _pressure(self, altitude: float):
+        """Fraction of sea level pressure."""
+        if altitude >= self._atmosphere_depth:
+            return 0.0
+        return math.exp(-altitude / 5600)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def gravitational_parameter(self):
+        return self._mu
+
+    @property
+    def mass(self):
+        return self._mu / 6.67408e-11
+
+    @property
+    def surface_gravity(self):
+        return self._mu / self._radius**2
+
+    @property
+    def equatorial_radius(self):
+        return self._radius
+
+    @property
+    def rotational_period(self):
+        return self._rotational_period
+
+    @property
+    def rotational_speed(self):
+        return 2 * math.pi / self._rotational_period
+
+    @property
+    def sphere_of_influence(self):
+        return self._soi
+
+    @property
+    def has_atmosphere(self):
+        return self._atmosphere_depth > 0
+
+    @property
+    def atmosphere_depth(self):
+        return self._atmosphere_depth
+
+    @property
+    def space_high_altitude_threshold(self):
+        return self._space_high
+
+    @property
+    def orbit(self):
+        if self._parent is None or self._elements is None:
+            return None
+        return FakeOrbit(self._client, self._parent, lambda: self._elements, changes_soi=False)
+
+    def _satellites(self):
+        return [b for b in self._client.space_center._bodies.values() if b._parent is self]
+
+    @property
+    def satellites(self):
+        return self._satellites()
+
+    @property
+    def reference_frame(self):
+        return FakeReferenceFrame(self._client, self._rotating_state)
+
+    @property
+    def non_rotating_reference_frame(self):
+        return FakeReferenceFrame(self._client, self._non_rotating_state)
+
+    @property
+    def orbital_reference_frame(self):
+        return FakeReferenceFrame(self._client, self._orbital_state)
+
+    def position(self, reference_frame: FakeReferenceFrame):
+        return reference_frame._state().position_to_local(self._world_state()[0])
+
+    def velocity(self, reference_frame: FakeReferenceFrame):
+        return reference_frame._state().velocity_to_local(*self._world_state())
+
+    def angular_velocity(self, reference_frame: FakeReferenceFrame):
+        return _to_local(reference_frame._state().axes, self._angular_velocity())
+
+
+def _orbital_axes(r: Vec3, v: Vec3):
+    """Anti-radial, prograde, normal."""
+    prograde = utils.vec_normalize(v)
+    normal = utils.vec_normalize(utils.vec_cross(v, r))
+    return (utils.vec_cross(prograde, normal), prograde, normal)
+
+
+def _soi_change(
+    body: FakeCelestialBody, elements: orbits.KeplerOrbit, ut: float, until: float = math.inf
+) -> tuple[float, FakeCelestialBody] | None:
+    """(UT, body) of the first SOI change of an orbit around body after ut: escaping to its
+    parent, or entering one of its satellites' SOIs. Encounters are found by sampling one
+    period ahead (or until until) and bisecting, so a grazing one can be missed."""
+    change: tuple[float, FakeCelestialBody] | None = None
+    if body._parent is not None and elements.apoapsis > body._soi:
+        true_anomaly = elements.true_anomaly_at_radius(body._soi)
+        change = (elements.ut_at_true_anomaly(true_anomaly, ut), body._parent)
+    end = min(ut + elements.search_span, until, math.inf if change is None else change[0])
+    for satellite in body._satellites():
+        radius = satellite._elements.semi_major_axis
+        if (
+            elements.apoapsis < radius - satellite._soi
+            or elements.periapsis > radius + satellite._soi
+        ):
+            continue
+
+        def inside(t: float):
+            distance = utils.vec_difference(
+                elements.position_at(t), satellite._elements.position_at(t)
+            )
+            return utils.vec_magnitude(distance) < satellite._soi
+
+        samples = max(2, math.ceil(360 * (end - ut) / elements.search_span))
+        step = (end - ut) / samples
+        hit = next((i for i in range(1, samples + 1) if inside(ut + i * step)), None)
+        if hit is None:
+            continue
+        (lo, hi) = (ut + (hit - 1) * step, ut + hit * step)
+        while hi - lo > 1e-3:
+            mid = (lo + hi) / 2
+            (lo, hi) = (lo, mid) if inside(mid) else (mid, hi)
+        change = (hi, satellite)
+        end = hi
+    return change
+
+
+def _transfer(
+    body: FakeCelestialBody, elements: orbits.KeplerOrbit, ut: float, to: FakeCelestialBody
+):
+    """The elements around to of an orbit around body, from its state at ut."""
+    (position, velocity) = elements.state_at(ut)
+    (body_position, body_velocity) = body._world_state(ut)
+    (to_position, to_velocity) = to._world_state(ut)
+    return orbits.from_state(
+        to._mu,
+        utils.vec_difference(utils.vec_sum(body_position, position), to_position),
+        utils.vec_difference(utils.vec_sum(body_velocity, velocity), to_velocity),
+        ut,
+    )
+
+
+class FakeOrbit(_Remote):
+    _remote_name = "Orbit"
+
+    def __init__(
+        self,
+        client: "FakeClient",
+        body: FakeCelestialBody,
+        elements: Callable[[], orbits.KeplerOrbit],
+        start_ut: float = -math.inf,
+        changes_soi: bool = True,
+    ):
+        """start_ut is when the vessel gets onto the orbit, for nodes' and next orbits."""
+        super().__init__(client)
+        self._body = body
+        self._elements = elements
+        self._start_ut = start_ut
+        self._changes_soi = changes_soi
+
+    def _soi_change(self):
+        if not self._changes_soi:
+            return None
+        return _soi_change(self._body, self._elements(), max(self._client._ut, self._start_ut))
+
+    def __eq__(self, other: object):
+        return (
+            isinstance(other, FakeOrbit)
+            and self._body is other._body
+            and self._elements == other._elements
+        )
+
+    def __hash__(self):
+        return hash(self._elements)
+
+    def _state_at(self, ut: float):
+        return self._elements().state_at(ut)
+
+    def _world_position_at(self, ut: float):
+        return utils.vec_sum(self._body._world_state()[0], self._state_at(ut)[0])
+
+    @property
+    def body(self):
+        return self._body
+
+    @property
+    def semi_major_axis(self):
+        return self._elements().semi_major_axis
+
+    @property
+    def eccentricity(self):
+        return self._elements().eccentricity
+
+    @property
+    def apoapsis(self):
+        return self._elements().apoapsis
+
+    @property
+    def periapsis(self):
+        return self._elements().periapsis
+
+    @property
+    def apoapsis_altitude(self):
+        return self.apoapsis - self._body._radius
+
+    @property
+    def periapsis_altitude(self):
+        return self.periapsis - self._body._radius
+
+    @property
+    def radius(self):
+        return utils.vec_magnitude(self._state_at(self._client._ut)[0])
+
+    @property
+    def speed(self):
+        return utils.vec_magnitude(self._state_at(self._client._ut)[1])
+
+    @property
+    def period(self):
+        return self._elements().period
+
+    @property
+    def inclination(self):
+        return self._elements().inclination
+
+    @property
+    def longitude_of_ascending_node(self):
+        return self._elements().longitude_of_ascending_node
+
+    @property
+    def argument_of_periapsis(self):
+        return self._elements().argument_of_periapsis
+
+    @property
+    def mean_anomaly(self):
+        return self._elements().mean_anomaly(self._client._ut)
+
+    @property
+    def mean_anomaly_at_epoch(self):
+        return self._elements().mean_anomaly_at_epoch
+
+    @property
+    def epoch(self):
+        return self._elements().epoch
+
+    @property
+    def true_anomaly(self):
+        return self._elements().true_anomaly(self._client._ut)
+
+    @property
+    def time_to_apoapsis(self):
+        if self._elements().eccentricity >= 1:
+            return math.inf
+        return self._elements().time_to_mean_anomaly(math.pi, self._client._ut)
+
+    @property
+    def time_to_periapsis(self):
+        return self._elements().time_to_mean_anomaly(0, self._client._ut)
+
+    @property
+    def time_to_soi_change(self):
+        change = self._soi_change()
+        return math.nan if change is None else change[0] - self._client._ut
+
+    @property
+    def next_orbit(self):
+        change = self._soi_change()
+        if change is None:
+            return None
+        last = [change]
+
+        def elements():
+            # like the game's patches, it follows changes to the orbit before it
+            change = self._soi_change()
+            if change is not None and change[1] is last[0][1]:
+                last[0] = change
+            return _transfer(self._body, self._elements(), *last[0])
+
+        return FakeOrbit(self._client, change[1], elements, change[0])
+
+    def position_at(self, ut: float, reference_frame: FakeReferenceFrame):
+        return reference_frame._state().position_to_local(self._world_position_at(ut))
+
+    def true_anomaly_at_radius(self, radius: float):
+        return self._elements().true_anomaly_at_radius(radius)
+
+    def ut_at_true_anomaly(self, true_anomaly: float):
+        return self._elements().ut_at_true_anomaly(true_anomaly, self._client._ut)
+
+    def time_of_closest_approach(self, orbit: "FakeOrbit"):
+        return self._closest_approach(orbit)[0]
+
+    def distance_at_closest_approach(self, orbit: "FakeOrbit"):
+        return self._closest_approach(orbit)[1]
+
+    def _closest_approach(self, orbit: "FakeOrbit"):
+        def distance(ut):
+            return utils.vec_magnitude(
+                utils.vec_difference(self._world_position_at(ut), orbit._world_position_at(ut))
+            )
+
+        return orbits.closest_approach(distance, self._client._ut, self._elements().search_span)
+
+
+class _FakeVesselOrbit(FakeOrbit):
+    """A vessel's orbit, which like the game's follows the vessel into other SOIs."""
+
+    def __init__(self, client: "FakeClient", vessel: "FakeVessel"):
+        _Remote.__init__(self, client)
+        self._vessel = vessel
+        self._elements = vessel._elements
+        self._start_ut = -math.inf
+        self._changes_soi = True
+
+    @property
+    def _body(self):
+        return self._vessel._body
+
+
+class FakeNode(_Remote):
+    _remote_name = "Node"
+
+    def __init__(self, client: "FakeClient", vessel: "FakeVessel", ut: float):
+        super().__init__(client)
+        self._vessel = vessel
+        self._ut = ut
+        self._prograde = 0.0
+        self._normal = 0.0
+        self._radial = 0.0
+        self._applied = (0.0, 0.0, 0.0)
+        self._burn = (0.0, 0.0, 0.0)
+
+    def _pre_burn_state(self):
+        return self._vessel._elements().state_at(self._ut)
+
+    def _update_burn(self):
+        (anti_radial, prograde, normal) = _orbital_axes(*self._pre_burn_state())
+        self._burn = utils.vec_sum(
+            utils.vec_sum(
+                utils.vec_scalar_mult(self._prograde, prograde),
+                utils.vec_scalar_mult(self._normal, normal),
+            ),
+            utils.vec_scalar_mult(-self._radial, anti_radial),
+        )
+
+    def _remaining(self):
+        return utils.vec_difference(self._burn, self._applied)
+
+    def _frame_state(self):
+        direction = self._burn if utils.vec_magnitude(self._burn) > 0 else (0, 1, 0)
+        (r, v) = self._pre_burn_state()
+        return _FrameState(
+            self._vessel._position,
+            _basis_from_y(direction, utils.vec_cross(v, r)),
+            self._vessel._velocity,
+        )
+
+    def _orbital_frame_state(self):
+        (r, v) = self._pre_burn_state()
+        body_position = self._vessel._body._world_state()[0]
+        return _FrameState(utils.vec_sum(body_position, r), _orbital_axes(r, v), v)
+
+    @property
+    def ut(self):
+        return self._ut
+
+    @ut.setter
+    def ut(self, value: float):
+        self._ut = value
+        self._update_burn()
+
+    @property
+    def time_to(self):
+        return self._ut - self._client._ut
+
+    @property
+    def prograde(self):
+        return self._prograde
+
+    @prograde.setter
+    def prograde(self, value: float):
+        self._prograde = value
+        self._update_burn()
+
+    @property
+    def normal(self):
+        return self._normal
+
+    @normal.setter
+    def normal(self, value: float):
+        self._normal = value
+        self._update_burn()
+
+    @property
+    def radial(self):
+        return self._radial
+
+    @radial.setter
+    def radial(self, value: float):
+        self._radial = value
+        self._update_burn()
+
+    @property
+    def delta_v(self):
+        return math.sqrt(self._prograde**2 + self._normal**2 + self._radial**2)
+
+    @delta_v.setter
+    def delta_v(self, value: float):
+        current = self.delta_v
+        if current == 0:
+            self._prograde = value
+        else:
+            k = value / current
+            self._prograde, self._normal, self._radial = (
+                self._prograde * k,
+                self._normal * k,
+                self._radial * k,
+            )
+        self._update_burn()
+
+    @property
+    def remaining_delta_v(self):
+        return utils.vec_magnitude(self._remaining())
+
+    @property
+    def orbit(self):
+        (r, v) = self._pre_burn_state()
+        elements = orbits.from_state(
+            self._vessel._body._mu, r, utils.vec_sum(v, self._burn), self._ut
+        )
+        return FakeOrbit(self._client, self._vessel._body, lambda: elements, self._ut)
+
+    @property
+    def reference_frame(self):
+        return FakeReferenceFrame(self._client, self._frame_state)
+
+    @property
+    def orbital_reference_frame(self):
+        return FakeReferenceFrame(self._client, self._orbital_frame_state)
+
+    def burn_vector(self, reference_frame: FakeReferenceFrame | None = None):
+        frame = reference_frame._state() if reference_frame else self._frame_state()
+        return _to_local(frame.axes, self._burn)
+
+    def remaining_burn_vector(self, reference_frame: FakeReferenceFrame | None = None):
+        frame = reference_frame._state() if reference_frame else self._frame_state()
+        return _to_local(frame.axes, self._remaining())
+
+    def position(self, reference_frame: FakeReferenceFrame):
+        return reference_frame._state().position_to_local(self._orbital_frame_state().origin)
+
+    def remove(self):
+        if self in self._vessel._nodes:
+            self._vessel._nodes.remove(self)
+
+
+class FakeControl(_Remote):
+    _remote_name = "Control"
+
+    def __init__(self, client: "FakeClient", vessel: "FakeVessel"):
+        super().__init__(client)
+        self._vessel = vessel
+        self._throttle = 0.0
+        self._sas = False
+        self._rcs = False
+        self._speed_mode = SpeedMode.orbit
+
+    @property
+    def throttle(self):
+        return self._throttle
+
+    @throttle.setter
+    def throttle(self, value: float):
+        self._throttle = utils.clamp(value, 0, 1)
+
+    @property
+    def sas(self):
+        return self._sas
+
+    @sas.setter
+    def sas(self, value: bool):
+        self._sas = value
+
+    @property
+    def rcs(self):
+        return self._rcs
+
+    @rcs.setter
+    def rcs(self, value: bool):
+        self._rcs = value
+
+    @property
+    def speed_mode(self):
+        return self._speed_mode
+
+    @speed_mode.setter
+    def speed_mode(self, value: SpeedMode):
+        self._speed_mode = value
+
+    @property
+    def current_stage(self):
+        return self._vessel._current_stage
+
+    @property
+    def nodes(self):
+        return list(self._vessel._nodes)
+
+    def activate_next_stage(self):
+        return self._vessel._activate_next_stage()
+
+    def add_node(self, ut: float, prograde: float = 0, normal: float = 0, radial: float = 0):
+        node = FakeNode(self._client, self._vessel, ut)
+        node._prograde, node._normal, node._radial = prograde, normal, radial
+        node._update_burn()
+        self._vessel._nodes.append(node)
+        self._vessel._nodes.sort(key=lambda n: n._ut)
+        return node
+
+    def remove_nodes(self):
+        self._vessel._nodes.clear()
+
+
+class FakeAutoPilot(_Remote):
+    _remote_name = "AutoPilot"
+
+    def __init__(self, client: "FakeClient", vessel: "FakeVessel"):
+        super().__init__(client)
+        self._vessel = vessel
+        self._engaged = False
+        self._reference_frame: FakeReferenceFrame | None = None
+        self._target_direction: Vec3 = (1.0, 0.0, 0.0)
+        self._target_roll = math.nan
+        self._sas_mode = SASMode.stability_assist
+
+    def _target(self) -> Vec3 | None:
+        """Target direction in world space, or None to hold attitude."""
+        vessel = self._vessel
+        if self._engaged:
+            frame = (self._reference_frame or vessel.surface_reference_frame)._state()
+            return _to_world(frame.axes, self._target_direction)
+        if not vessel._control._sas:
+            return None
+        mode = self._sas_mode
+        if mode in (SASMode.prograde, SASMode.retrograde):
+            velocity = vessel._velocity_for_speed_mode()
+            sign = 1 if mode == SASMode.prograde else -1
+            return utils.vec_scalar_mult(sign, velocity) if utils.vec_magnitude(velocity) else None
+        if mode == SASMode.maneuver and vessel._nodes:
+            remaining = vessel._nodes[0]._remaining()
+            return remaining if utils.vec_magnitude(remaining) > 0 else None
+        if mode in (SASMode.target, SASMode.anti_target):
+            target = self._client.space_center._target_position()
+            if target is None:
+                return None
+            sign = 1 if mode == SASMode.target else -1
+            return utils.vec_scalar_mult(sign, utils.vec_difference(target, vessel._position))
+        if mode in (SASMode.normal, SASMode.anti_normal, SASMode.radial, SASMode.anti_radial):
+            axes = vessel._orbital_state().axes
+            return {
+                SASMode.normal: axes[2],
+                SASMode.anti_normal: utils.vec_scalar_mult(-1, axes[2]),
+                SASMode.radial: utils.vec_scalar_mult(-1, axes[0]),
+                SASMode.anti_radial: axes[0],
+            }[mode]
+        return None
+
+    def _error(self):
+        target = self._target()
+        if target is None:
+            return 0.0
+        return math.degrees(utils.vec_angle(self._vessel._direction, target))
+
+    @property
+    def error(self):
+        return self._error()
+
+    @property
+    def reference_frame(self):
+        return self._reference_frame or self._vessel.surface_reference_frame
+
+    @reference_frame.setter
+    def reference_frame(self, value: FakeReferenceFrame):
+        self._reference_frame = value
+
+    @property
+    def target_direction(self):
+        return self._target_direction
+
+    @target_direction.setter
+    def target_direction(self, value: Vec3):
+        self._target_direction = utils.vec_normalize(tuple(value))
+
+    @property
+    def target_roll(self):
+        return self._target_roll
+
+    @target_roll.setter
+    def target_roll(self, value: float):
+        self._target_roll = value
+
+    @property
+    def sas_mode(self):
+        return self._sas_mode
+
+    @sas_mode.setter
+    def sas_mode(self, value: SASMode):
+        self._sas_mode = value
+
+    @property
+    def target_pitch(self):
+        return math.degrees(math.asin(utils.clamp(self._target_direction[0], -1, 1)))
+
+    @target_pitch.setter
+    def target_pitch(self, value: float):
+        self._set_pitch_and_heading(value, self.target_heading)
+
+    @property
+    def target_heading(self):
+        d = self._target_direction
+        return math.degrees(math.atan2(d[2], d[1])) % 360
+
+    @target_heading.setter
+    def target_heading(self, value: float):
+        self._set_pitch_and_heading(self.target_pitch, value)
+
+    def _set_pitch_and_heading(self, pitch: float, heading: float):
+        p, h = math.radians(pitch), math.radians(heading)
+        self._target_direction = (math.sin(p), math.cos(p) * math.cos(h), math.cos(p) * math.sin(h))
+
+    def target_pitch_and_heading(self, pitch: float, heading: float):
+        self._set_pitch_and_heading(pitch, heading)
+
+    def engage(self):
+        self._engaged = True
+
+    def disengage(self):
+        self._engaged = False
+
+    def wait(self):
+        self._client._wait_for(lambda: self._error() < 0.5)
+
+
+class FakeResources(_Remote):
+    _remote_name = "Resources"
+
+    def __init__(self, client: "FakeClient", stages: Callable[[], list[FakeStage]]):
+        super().__init__(client)
+        self._stages = stages
+
+    @property
+    def names(self):
+        return sorted({s.resource for s in self._stages() if s.max_fuel > 0})
+
+    def has_resource(self, name: str):
+        return name in self.names
+
+    def amount(self, name: str):
+        return sum(s.fuel for s in self._stages() if s.resource == name)
+
+    def max(self, name: str):
+        return sum(s.max_fuel for s in self._stages() if s.resource == name)
+
+
+class FakePart(_Remote):
+    """One part per FakeStage, holding its fuel and its engine, if it has one."""
+
+    _remote_name = "Part"
+
+    def __init__(self, client: "FakeClient", vessel: "FakeVessel", stage: FakeStage):
+        super().__init__(client)
+        self._vessel = vessel
+        self._stage = stage
+
+    @property
+    def name(self):
+        return self._stage.name
+
+    @property
+    def title(self):
+        return self._stage.name
+
+    @property
+    def mass(self):
+        return self._stage.dry_mass + self._stage.fuel_mass
+
+    @property
+    def dry_mass(self):
+        return self._stage.dry_mass
+
+    @property
+    def stage(self):
+        return self._stage.stage if self._stage.thrust > 0 else -1
+
+    @property
+    def decouple_stage(self):
+        return self._stage.decouple_stage
+
+    @property
+    def engine(self):
+        return FakeEngine(self._client, self) if self._stage.thrust > 0 else None
+
+    @property
+    def resources(self):
+        return FakeResources(self._client, lambda: [self._stage])
+
+
+class FakeEngine(_Remote):
+    _remote_name = "Engine"
+
+    def __init__(self, client: "FakeClient", part: FakePart):
+        super().__init__(client)
+        self._part = part
+
+    @property
+    def part(self):
+        return self._part
+
+    @property
+    def active(self):
+        return self._part._stage.stage >= self._part._vessel._current_stage
+
+    @property
+    def has_fuel(self):
+        return self._part._stage.fuel > 0
+
+    @property
+    def thrust_limit(self):
+        return 1.0
+
+    @property
+    def max_vacuum_thrust(self):
+        return self._part._stage.thrust
+
+    @property
+    def vacuum_specific_impulse(self):
+        return self._part._stage.vacuum_isp
+
+    @property
+    def kerbin_sea_level_specific_impulse(self):
+        return self._part._stage.sea_level_isp
+
+    @property
+    def propellant_names(self):
+        return [self._part._stage.resource]
+
+
+class FakeParts(_Remote):
+    _remote_name = "Parts"
+
+    def __init__(self, client: "FakeClient", vessel: "FakeVessel"):
+        super().__init__(client)
+        self._vessel = vessel
+
+    def _parts(self):
+        return [FakePart(self._client, self._vessel, s) for s in self._vessel._stages]
+
+    @property
+    def all(self):
+        return self._parts()
+
+    @property
+    def engines(self):
+        return [FakeEngine(self._client, part) for part in self._parts() if part._stage.thrust > 0]
+
+    def in_decouple_stage(self, stage: int):
+        return [part for part in self._parts() if part._stage.decouple_stage == stage]
+
+
+class FakeFlight(_Remote):
+    _remote_name = "Flight"
+
+    def __init__(self, client: "FakeClient", vessel: "FakeVessel", frame: FakeReferenceFrame):
+        super().__init__(client)
+        self._vessel = vessel
+        self._frame = frame
+
+    def __eq__(self, other: object):
+        return (
+            isinstance(other, FakeFlight)
+            and self._vessel is other._vessel
+            and self._frame == other._frame
+        )
+
+    def __hash__(self):
+        return hash((id(self._vessel), self._frame))
+
+    def _velocity(self):
+        return self._frame._state().velocity_to_local(
+            self._vessel._position, self._vessel._velocity
+        )
+
+    @property
+    def mean_altitude(self):
+        return self._vessel._altitude()
+
+    @property
+    def surface_altitude(self):
+        return self._vessel._altitude()
+
+    @property
+    def velocity(self):
+        return self._velocity()
+
+    @property
+    def speed(self):
+        return utils.vec_magnitude(self._velocity())
+
+    @property
+    def vertical_speed(self):
+        return utils.vec_dot(self._vessel._surface_velocity(), self._vessel._up())
+
+    @property
+    def horizontal_speed(self):
+        surface_velocity = self._vessel._surface_velocity()
+        vertical = utils.vec_dot(surface_velocity, self._vessel._up())
+        return math.sqrt(max(utils.vec_dot(surface_velocity, surface_velocity) - vertical**2, 0))
+
+    @property
+    def direction(self):
+        return _to_local(self._frame._state().axes, self._vessel._direction)
+
+    @property
+    def pitch(self):
+        return math.degrees(math.asin(utils.clamp(self._vessel._surface_direction()[0], -1, 1)))
+
+    @property
+    def heading(self):
+        d = self._vessel._surface_direction()
+        return math.degrees(math.atan2(d[2], d[1])) % 360
+
+    @property
+    def atmosphere_density(self):
+        return 1.225 * self._vessel._body._pressure(self._vessel._altitude())
+
+    @property
+    def static_pressure(self):
+        return 101325 * self._vessel._body._pressure(self._vessel._altitude())
+
+    @property
+    def dynamic_pressure(self):
+        speed = utils.vec_magnitude(self._vessel._surface_velocity())
+        return 0.5 * self.atmosphere_density * speed**2
+
+
+class FakeVessel(_Remote):
+    _remote_name = "Vessel"
+
+    def __init__(
+        self,
+        client: "FakeClient",
+        name: str,
+        body: FakeCelestialBody,
+        stages: list[FakeStage],
+        position: Vec3,
+        velocity: Vec3,
+        direction: Vec3,
+        current_stage: int,
+        landed: bool = False,
+    ):
+        super().__init__(client)
+        self._name = name
+        self._body = body
+        self._stages = stages
+        self._position = position
+        self._velocity = velocity
+        self._direction = utils.vec_normalize(direction)
+        self._current_stage = current_stage
+        self._landed = landed
+        self._nodes: list[FakeNode] = []
+        self._control = FakeControl(client, self)
+        self._auto_pilot = FakeAutoPilot(client, self)
+        self._thrust = 0.0
+
+    # physics
+
+    def _relative_state(self):
+        (body_position, body_velocity) = self._body._world_state()
+        return (
+            utils.vec_difference(self._position, body_position),
+            utils.vec_difference(self._velocity, body_velocity),
+        )
+
+    def _elements(self):
+        return orbits.from_state(self._body._mu, *self._relative_state(), self._client._ut)
+
+    def _altitude(self):
+        return utils.vec_magnitude(self._relative_state()[0]) - self._body._radius
+
+    def _up(self):
+        return utils.vec_normalize(self._relative_state()[0])
+
+    def _surface_velocity(self):
+        return self._body._rotating_state().velocity_to_local(self._position, self._velocity)
+
+    def _velocity_for_speed_mode(self):
+        mode = self._control._speed_mode
+        if mode == SpeedMode.surface:
+            return _to_world(self._body._rotation_axes(), self._surface_velocity())
+        if mode == SpeedMode.target:
+            target_velocity = self._client.space_center._target_velocity()
+            if target_velocity is not None:
+                return utils.vec_difference(self._velocity, target_velocity)
+        return self._relative_state()[1]
+
+    def _surface_direction(self):
+        return _to_local(self._surface_state().axes, self._direction)
+
+    def _mass(self):
+        return sum(s.dry_mass + s.fuel_mass for s in self._stages)
+
+    def _active_engines(self):
+        return [
+            s
+            for s in self._stages
+            if s.thrust > 0 and s.stage >= self._current_stage and s.fuel > 0
+        ]
+
+    def _isp(self, stage: FakeStage):
+        pressure = self._body._pressure(self._altitude())
+        assert stage.sea_level_isp is not None
+        return stage.vacuum_isp + (stage.sea_level_isp - stage.vacuum_isp) * pressure
+
+    def _available_thrust(self):
+        return sum(s.thrust * self._isp(s) / s.vacuum_isp for s in self._active_engines())
+
+    def _specific_impulse(self):
+        engines = self._active_engines()
+        thrust = sum(s.thrust * self._isp(s) / s.vacuum_isp for s in engines)
+        flow = sum(s.thrust / s.vacuum_isp for s in engines)
+        return thrust / flow if flow else 0.0
+
+    def _burn_fuel(self, dt: float):
+        """Consume fuel for one step and return the thrust produced."""
+        thrust = 0.0
+        for stage in self._active_engines():
+            throttle = 1.0 if stage.is_solid else self._control._throttle
+            if throttle <= 0:
+                continue
+            density = RESOURCE_DENSITIES.get(stage.resource, 1)
+            needed = stage.thrust * throttle / (stage.vacuum_isp * G0) * dt / density
+            fraction = min(1.0, stage.fuel / needed)
+            stage.fuel = max(stage.fuel - needed, 0.0)
+            thrust += stage.thrust * throttle * fraction * self._isp(stage) / stage.vacuum_isp
+        return thrust
+
+    def _hold_on_surface(self):
+        frame = self._body._rotating_state()
+        surface_position = frame.position_to_local(self._position)
+        self._position = frame.position_to_world(surface_position)
+        self._velocity = frame.velocity_to_world(self._position, (0, 0, 0))
+        self._direction = self._up()
+
+    def _turn(self, dt: float, rate: float = math.radians(30)):
+        target = self._auto_pilot._target()
+        if target is None or utils.vec_magnitude(target) == 0:
+            return
+        target = utils.vec_normalize(target)
+        angle = utils.vec_angle(self._direction, target)
+        step = rate * dt
+        if angle <= step:
+            self._direction = target
+        elif angle > math.pi - 1e-6:
+            self._direction = utils.vec_normalize(
+                utils.vec_sum(self._direction, _basis_from_y(self._direction, (0, 1, 0))[0])
+            )
+        else:
+            a = math.sin(angle - step) / math.sin(angle)
+            b = math.sin(step) / math.sin(angle)
+            self._direction = utils.vec_normalize(
+                utils.vec_sum(
+                    utils.vec_scalar_mult(a, self._direction), utils.vec_scalar_mult(b, target)
+                )
+            )
+
+    def _step(self, dt: float):
+        ut = self._client._ut
+        mass = self._mass()
+        thrust = self._burn_fuel(dt)
+        self._thrust = thrust
+        (r, v) = self._relative_state()
+        r_mag = utils.vec_magnitude(r)
+        gravity = utils.vec_scalar_mult(-self._body._mu / r_mag**3, r)
+
+        if self._landed:
+            if thrust / mass <= utils.vec_magnitude(gravity):
+                self._hold_on_surface()
+                return
+            self._landed = False
+        self._turn(dt)
+
+        thrust_acceleration = utils.vec_scalar_mult(thrust / mass, self._direction)
+        if self._nodes:
+            node = self._nodes[0]
+            node._applied = utils.vec_sum(
+                node._applied, utils.vec_scalar_mult(dt, thrust_acceleration)
+            )
+
+        altitude = r_mag - self._body._radius
+        if thrust == 0 and altitude >= self._body._atmosphere_depth:
+            elements = orbits.from_state(self._body._mu, r, v, ut)
+            (r, v) = elements.state_at(ut + dt)
+        else:
+            surface_velocity = self._surface_velocity()
+            density = 1.225 * self._body._pressure(altitude)
+            speed = utils.vec_magnitude(surface_velocity)
+            drag_area = sum(s.drag_area for s in self._stages)
+            drag = utils.vec_scalar_mult(
+                -0.5 * density * speed * drag_area / mass,
+                _to_world(self._body._rotation_axes(), surface_velocity),
+            )
+            acceleration = utils.vec_sum(utils.vec_sum(gravity, thrust_acceleration), drag)
+            v = utils.vec_sum(v, utils.vec_scalar_mult(dt, acceleration))
+            r = utils.vec_sum(r, utils.vec_scalar_mult(dt, v))
+
+        (body_position, body_velocity) = self._body._world_state(ut + dt)
+        self._position = utils.vec_sum(body_position, r)
+        self._velocity = utils.vec_sum(body_velocity, v)
+        if utils.vec_magnitude(r) < self._body._radius:
+            self._landed = True
+        self._update_soi(ut + dt)
+
+    def _update_soi(self, ut: float):
+        """Switch to the body whose SOI the vessel is in now, like the game does."""
+        body = self._body
+        r = utils.vec_difference(self._position, body._world_state(ut)[0])
+        if body._parent is not None and utils.vec_magnitude(r) > body._soi:
+            self._body = body._parent
+            return
+        for satellite in body._satellites():
+            r = utils.vec_difference(self._position, satellite._world_state(ut)[0])
+            if utils.vec_magnitude(r) < satellite._soi:
+                self._body = satellite
+                return
+
+    def _coast(self, ut: float):
+        """Jump straight to ut on rails, changing SOI on the way if the orbit does."""
+        if self._landed:
+            return
+        now = self._client._ut
+        while True:
+            (body_position, body_velocity) = self._body._world_state(now)
+            elements = orbits.from_state(
+                self._body._mu,
+                utils.vec_difference(self._position, body_position),
+                utils.vec_difference(self._velocity, body_velocity),
+                now,
+            )
+            change = _soi_change(self._body, elements, now, ut)
+            end = ut if change is None or change[0] >= ut else change[0]
+            (r, v) = elements.state_at(end)
+            (body_position, body_velocity) = self._body._world_state(end)
+            self._position = utils.vec_sum(body_position, r)
+            self._velocity = utils.vec_sum(body_velocity, v)
+            if end == ut:
+                return
+            (now, self._body) = change
+
+    def _can_coast(self):
+        return self._landed or (
+            not any((s.is_solid or self._control._throttle > 0) for s in self._active_engines())
+            and self._altitude() >= self._body._atmosphere_depth
+        )
+
+    def _activate_next_stage(self):
+        self._current_stage -= 1
+        decoupled = [s for s in self._stages if s.decouple_stage == self._current_stage]
+        if not decoupled:
+            return []
+        self._stages = [s for s in self._stages if s not in decoupled]
+        debris = FakeVessel(
+            self._client,
+            f"{self._name} Debris",
+            self._body,
+            decoupled,
+            self._position,
+            self._velocity,
+            self._direction,
+            self._current_stage,
+            self._landed,
+        )
+        self._client.space_center._vessels.append(debris)
+        return [debris]
+
+    # reference frames
+
+    def _surface_state(self):
+        up = self._up()
+        return _FrameState(
+            self._position,
+            _surface_axes(up),
+            self._body._rotating_state().velocity_to_world(self._position, (0, 0, 0)),
+            self._body._angular_velocity(),
+        )
+
+    def _surface_velocity_state(self):
+        surface_velocity = _to_world(self._body._rotation_axes(), self._surface_velocity())
+        state = self._surface_state()
+        if utils.vec_magnitude(surface_velocity) < 1e-6:
+            return state
+        y = utils.vec_normalize(surface_velocity)
+        x = utils.vec_difference(self._up(), utils.vec_scalar_mult(utils.vec_dot(self._up(), y), y))
+        if utils.vec_magnitude(x) < 1e-9:
+            return state
+        x = utils.vec_normalize(x)
+        return _FrameState(
+            state.origin, (x, y, utils.vec_cross(x, y)), state.velocity, state.angular_velocity
+        )
+
+    def _orbital_state(self):
+        (r, v) = self._relative_state()
+        return _FrameState(self._position, _orbital_axes(r, v), self._velocity)
+
+    def _vessel_state(self):
+        return _FrameState(
+            self._position, _basis_from_y(self._direction, self._up()), self._velocity
+        )
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def mass(self):
+        return self._mass()
+
+    @property
+    def dry_mass(self):
+        return sum(s.dry_mass for s in self._stages)
+
+    @property
+    def thrust(self):
+        return self._thrust
+
+    @property
+    def available_thrust(self):
+        return self._available_thrust()
+
+    @property
+    def max_thrust(self):
+        return self._available_thrust()
+
+    @property
+    def max_vacuum_thrust(self):
+        return sum(s.thrust for s in self._active_engines())
+
+    @property
+    def specific_impulse(self):
+        return self._specific_impulse()
+
+    @property
+    def vacuum_specific_impulse(self):
+        engines = self._active_engines()
+        flow = sum(s.thrust / s.vacuum_isp for s in engines)
+        return sum(s.thrust for s in engines) / flow if flow else 0.0
+
+    @property
+    def orbit(self):
+        return _FakeVesselOrbit(self._client, self)
+
+    @property
+    def control(self):
+        return self._control
+
+    @property
+    def auto_pilot(self):
+        return self._auto_pilot
+
+    @property
+    def parts(self):
+        return FakeParts(self._client, self)
+
+    @property
+    def resources(self):
+        return FakeResources(self._client, lambda: self._stages)
+
+    def resources_in_decouple_stage(self, stage: int, cumulative: bool = True):
+        return FakeResources(
+            self._client,
+            lambda: [
+                s
+                for s in self._stages
+                if s.decouple_stage == stage or (cumulative and s.decouple_stage < stage)
+            ],
+        )
+
+    @property
+    def reference_frame(self):
+        return FakeReferenceFrame(self._client, self._vessel_state)
+
+    @property
+    def orbital_reference_frame(self):
+        return FakeReferenceFrame(self._client, self._orbital_state)
+
+    @property
+    def surface_reference_frame(self):
+        return FakeReferenceFrame(self._client, self._surface_state)
+
+    @property
+    def surface_velocity_reference_frame(self):
+        return FakeReferenceFrame(self._client, self._surface_velocity_state)
+
+    def flight(self, reference_frame: FakeReferenceFrame | None = None):
+        return FakeFlight(self._client, self, reference_frame or self.surface_reference_frame)
+
+    def position(self, reference_frame: FakeReferenceFrame):
+        return reference_frame._state().position_to_local(self._position)
+
+    def velocity(self, reference_frame: FakeReferenceFrame):
+        return reference_frame._state().velocity_to_local(self._position, self._velocity)
+
+    def direction(self, reference_frame: FakeReferenceFrame):
+        return _to_local(reference_frame._state().axes, self._direction)
+
+
+def _surface_axes(up: Vec3):
+    """Up, north, east."""
+    north = utils.vec_difference((0, 1, 0), utils.vec_scalar_mult(up[1], up))
+    if utils.vec_magnitude(north) < 1e-9:
+        north = (1.0, 0.0, 0.0)
+    north = utils.vec_normalize(north)
+    return (up, north, utils.vec_cross(up, north))
+
+
+class FakeSpaceCenter(_Remote):
+    _remote_name = "SpaceCenter"
+
+    ReferenceFrame = FakeReferenceFrame
+    SASMode = SASMode
+    SpeedMode = SpeedMode
+
+    def __init__(self, client: "FakeClient"):
+        super().__init__(client)
+        kerbin = FakeCelestialBody(
+            client,
+            "Kerbin",
+            gravitational_parameter=3.5316e12,
+            equatorial_radius=600_000,
+            rotational_period=21_549.425,
+            sphere_of_influence=84_159_286,
+            atmosphere_depth=70_000,
+            space_high_altitude_threshold=250_000,
+        )
+        mun = FakeCelestialBody(
+            client,
+            "Mun",
+            gravitational_parameter=6.5138398e10,
+            equatorial_radius=200_000,
+            rotational_period=138_984.38,
+            sphere_of_influence=2_429_559.1,
+            space_high_altitude_threshold=60_000,
+            parent=kerbin,
+            elements=orbits.circular(kerbin._mu, 12_000_000, 0, 1.7),
+        )
+        minmus = FakeCelestialBody(
+            client,
+            "Minmus",
+            gravitational_parameter=1.7658e9,
+            equatorial_radius=60_000,
+            rotational_period=40_400,
+            sphere_of_influence=2_247_428.4,
+            space_high_altitude_threshold=30_000,
+            parent=kerbin,
+            elements=orbits.circular(kerbin._mu, 47_000_000, math.radians(6), 0.9),
+        )
+        self._bodies = {body._name: body for body in (kerbin, mun, minmus)}
+        self._vessels: list[FakeVessel] = []
+        self._active_vessel: FakeVessel | None = None
+        self._target_body: FakeCelestialBody | None = None
+        self._target_vessel: FakeVessel | None = None
+        self._physics_warp_factor = 0
+        self._rails_warp_factor = 0
+
+    def _target_position(self):
+        if self._target_body is not None:
+            return self._target_body._world_state()[0]
+        if self._target_vessel is not None:
+            return self._target_vessel._position
+        return None
+
+    def _target_velocity(self):
+        if self._target_body is not None:
+            return self._target_body._world_state()[1]
+        if self._target_vessel is not None:
+            return self._target_vessel._velocity
+        return None
+
+    @property
+    def ut(self):
+        return self._client._ut
+
+    @property
+    def g(self):
+        return 6.67408e-11
+
+    @property
+    def bodies(self):
+        return dict(self._bodies)
+
+    @property
+    def vessels(self):
+        return list(self._vessels)
+
+    @property
+    def active_vessel(self):
+        return self._active_vessel
+
+    @active_vessel.setter
+    def active_vessel(self, value: FakeVessel):
+        self._active_vessel = value
+
+    @property
+    def target_body(self):
+        return self._target_body
+
+    @target_body.setter
+    def target_body(self, value: FakeCelestialBody | None):
+        self._target_body = value
+        self._target_vessel = None
+
+    @property
+    def target_vessel(self):
+        return self._target_vessel
+
+    @target_vessel.setter
+    def target_vessel(self, value: FakeVessel | None):
+        self._target_vessel = value
+        self._target_body = None
+
+    def clear_target(self):
+        self._target_body = None
+        self._target_vessel = None
+
+    @property
+    def physics_warp_factor(self):
+        return self._physics_warp_factor
+
+    @physics_warp_factor.setter
+    def physics_warp_factor(self, value: int):
+        self._physics_warp_factor = int(utils.clamp(value, 0, len(PHYSICS_WARP_RATES) - 1))
+
+    @property
+    def rails_warp_factor(self):
+        return self._rails_warp_factor
+
+    @rails_warp_factor.setter
+    def rails_warp_factor(self, value: int):
+        self._rails_warp_factor = int(utils.clamp(value, 0, self._max_rails_warp_factor()))
+
+    def _max_rails_warp_factor(self):
+        active = self._active_vessel
+        return len(RAILS_WARP_RATES) - 1 if active is None or active._can_coast() else 0
+
+    @property
+    def maximum_rails_warp_factor(self):
+        return self._max_rails_warp_factor()
+
+    @property
+    def warp_rate(self):
+        if self._rails_warp_factor > 0:
+            return RAILS_WARP_RATES[self._rails_warp_factor]
+        return PHYSICS_WARP_RATES[self._physics_warp_factor]
+
+    def warp_to(self, ut: float, max_rails_rate: float = 100_000, max_physics_rate: float = 2):
+        self._client._warp_to(ut)
+
+    def transform_position(
+        self, position: Vec3, from_: FakeReferenceFrame, to: FakeReferenceFrame
+    ) -> Vec3:
+        return to._state().position_to_local(from_._state().position_to_world(position))
+
+    def transform_direction(
+        self, direction: Vec3, from_: FakeReferenceFrame, to: FakeReferenceFrame
+    ) -> Vec3:
+        return _to_local(to._state().axes, _to_world(from_._state().axes, direction))
+
+    def transform_velocity(
+        self,
+        position: Vec3,
+        velocity: Vec3,
+        from_: FakeReferenceFrame,
+        to: FakeReferenceFrame,
+    ) -> Vec3:
+        source = from_._state()
+        world_position = source.position_to_world(position)
+        world_velocity = source.velocity_to_world(world_position, velocity)
+        return to._state().velocity_to_local(world_position, world_velocity)
+
+
+# UI
+
+
+class MessagePosition(Enum):
+    bottom_center = 0
+    top_center = 1
+    top_left = 2
+    top_right = 3
+
+
+class TextAnchor(Enum):
+    lower_center = 0
+    lower_left = 1
+    lower_right = 2
+    middle_center = 3
+    middle_left = 4
+    middle_right = 5
+    upper_center = 6
+    upper_left = 7
+    upper_right = 8
+
+
+class FontStyle(Enum):
+    normal = 0
+    bold = 1
+    italic = 2
+    bold_and_italic = 3
+
+
+class FakeRectTransform(_Remote):
+    _service = "UI"
+    _remote_name = "RectTransform"
+
+    def __init__(self, client: "FakeClient", size: tuple[float, float]):
+        super().__init__(client)
+        self._init_attributes(
+            position=(0.0, 0.0),
+            local_position=(0.0, 0.0, 0.0),
+            size=size,
+            pivot=(0.5, 0.5),
+            anchor=(0.5, 0.5),
+            rotation=(0.0, 0.0, 0.0, 1.0),
+            scale=(1.0, 1.0, 1.0),
+        )
+
+
+class _FakeElement(_Remote):
+    _service = "UI"
+
+    def __init__(
+        self,
+        client: "FakeClient",
+        parent: "_FakeContainer | None",
+        size: tuple[float, float],
+        visible: bool = True,
+    ):
+        super().__init__(client)
+        self._parent = parent
+        self._init_attributes(rect_transform=FakeRectTransform(client, size), visible=visible)
+        if parent is not None:
+            parent._children.append(self)
+
+    def _is_shown(self) -> bool:
+        if not object.__getattribute__(self, "visible"):
+            return False
+        return self._parent is None or self._parent._is_shown()
+
+    def remove(self):
+        if self._parent is not None and self in self._parent._children:
+            self._parent._children.remove(self)
+
+
+class FakeText(_FakeElement):
+    _remote_name = "Text"
+
+    def __init__(
+        self,
+        client: "FakeClient",
+        parent: "_FakeContainer | None",
+        content: str,
+        visible: bool = True,
+    ):
+        super().__init__(client, parent, (200, 30), visible)
+        self._init_attributes(
+            content=content,
+            font="Arial",
+            size=14,
+            style=FontStyle.normal,
+            color=(1.0, 1.0, 1.0),
+            alignment=TextAnchor.upper_left,
+            line_spacing=1.0,
+        )
+
+
+class FakeButton(_FakeElement):
+    _remote_name = "Button"
+
+    def __init__(
+        self,
+        client: "FakeClient",
+        parent: "_FakeContainer",
+        content: str,
+        visible: bool = True,
+    ):
+        super().__init__(client, parent, (120, 30), visible)
+        self._init_attributes(text=FakeText(client, None, content), clicked=False)
+
+
+class FakeInputField(_FakeElement):
+    _remote_name = "InputField"
+
+    def __init__(self, client: "FakeClient", parent: "_FakeContainer", visible: bool = True):
+        super().__init__(client, parent, (200, 30), visible)
+        self._init_attributes(value="", text=FakeText(client, None, ""), changed=False)
+
+
+class _FakeContainer(_FakeElement):
+    def __init__(
+        self,
+        client: "FakeClient",
+        parent: "_FakeContainer | None",
+        size: tuple[float, float],
+        visible: bool = True,
+    ):
+        self._children: list[_FakeElement] = []
+        super().__init__(client, parent, size, visible)
+
+    def add_panel(self, visible: bool = True):
+        return FakePanel(self._client, self, visible)
+
+    def add_text(self, content: str, visible: bool = True):
+        return FakeText(self._client, self, content, visible)
+
+    def add_button(self, content: str, visible: bool = True):
+        return FakeButton(self._client, self, content, visible)
+
+    def add_input_field(self, visible: bool = True):
+        return FakeInputField(self._client, self, visible)
+
+
+class FakePanel(_FakeContainer):
+    _remote_name = "Panel"
+
+    def __init__(self, client: "FakeClient", parent: "_FakeContainer", visible: bool = True):
+        super().__init__(client, parent, (100, 100), visible)
+
+
+class FakeCanvas(_FakeContainer):
+    _remote_name = "Canvas"
+
+    def __init__(self, client: "FakeClient", ui: "FakeUI", size: tuple[float, float]):
+        super().__init__(client, None, size)
+        self._ui = ui
+        ui._canvases.append(self)
+
+    def remove(self):
+        if self in self._ui._canvases:
+            self._ui._canvases.remove(self)
+
+
+class FakeUI(_Remote):
+    _service = "UI"
+    _remote_name = "UI"
+
+    MessagePosition = MessagePosition
+    TextAnchor = TextAnchor
+    FontStyle = FontStyle
+
+    def __init__(self, client: "FakeClient"):
+        super().__init__(client)
+        self._canvases: list[FakeCanvas] = []
+        self._stock_canvas = FakeCanvas(client, self, (1920, 1080))
+        self._messages: list[tuple[float, str]] = []
+
+    def _buttons(self, element: _FakeElement | None = None):
+        if element is None:
+            for canvas in self._canvases:
+                yield from self._buttons(canvas)
+        elif isinstance(element, FakeButton):
+            yield element
+        elif isinstance(element, _FakeContainer):
+            for child in element._children:
+                yield from self._buttons(child)
+
+    @property
+    def stock_canvas(self):
+        return self._stock_canvas
+
+    def add_canvas(self):
+        return FakeCanvas(self._client, self, (1920, 1080))
+
+    def message(
+        self,
+        content: str,
+        duration: float = 1,
+        position: MessagePosition = MessagePosition.top_center,
+        color: tuple[float, float, float] = (1.0, 0.92, 0.016),
+        size: float = 20,
+    ):
+        self._messages.append((self._client._ut, content))
+
+    def clear(self, client_only: bool = False):
+        for canvas in list(self._canvases):
+            if canvas is not self._stock_canvas:
+                canvas.remove()
+        self._stock_canvas._children.clear()
+
+
+# KRPC service
+
+
+class _FakeCall:
+    def __init__(self, func: Callable[..., Any], args: tuple, kwargs: dict[str, Any]):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+
+class FakeType:
+    _client: "FakeClient"
+
+    @classmethod
+    def _make(cls, name: str):
+        return cls._client._call("KRPC", f"Type_static_{name}", lambda: name)
+
+    @classmethod
+    def double(cls):
+        return cls._make("double")
+
+    @classmethod
+    def float(cls):
+        return cls._make("float")
+
+    @classmethod
+    def int(cls):
+        return cls._make("int")
+
+    @classmethod
+    def bool(cls):
+        return cls._make("bool")
+
+    @classmethod
+    def string(cls):
+        return cls._make("string")
+
+
+class FakeExpression:
+    """Mirrors KRPC.Expression. Building one is an RPC, evaluating it is local."""
+
+    _client: "FakeClient"
+
+    def __init__(self, evaluate: Callable[[], Any]):
+        self._evaluate = evaluate
+
+    @classmethod
+    def _make(cls, name: str, evaluate: Callable[[], Any]):
+        return cls._client._call("KRPC", f"Expression_static_{name}", lambda: cls(evaluate))
+
+    @classmethod
+    def _binary(cls, name: str, a: "FakeExpression", b: "FakeExpression", op: Callable):
+        return cls._make(name, lambda: op(a._evaluate(), b._evaluate()))
+
+    @classmethod
+    def constant_double(cls, value: float):
+        return cls._make("ConstantDouble", lambda: float(value))
+
+    @classmethod
+    def constant_float(cls, value: float):
+        return cls._make("ConstantFloat", lambda: float(value))
+
+    @classmethod
+    def constant_int(cls, value: int):
+        return cls._make("ConstantInt", lambda: int(value))
+
+    @classmethod
+    def constant_bool(cls, value: bool):
+        return cls._make("ConstantBool", lambda: bool(value))
+
+    @classmethod
+    def constant_string(cls, value: str):
+        return cls._make("ConstantString", lambda: str(value))
+
+    @classmethod
+    def call(cls, call: _FakeCall):
+        return cls._make("Call", lambda: call.func(*call.args, **call.kwargs))
+
+    @classmethod
+    def cast(cls, arg: "FakeExpression", type: str):
+        return cls._make("Cast", arg._evaluate)
+
+    @classmethod
+    def get(cls, arg: "FakeExpression", index: "FakeExpression"):
+        return cls._binary("Get", arg, index, lambda a, i: a[i])
+
+    @classmethod
+    def equal(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("Equal", a, b, lambda x, y: x == y)
+
+    @classmethod
+    def not_equal(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("NotEqual", a, b, lambda x, y: x != y)
+
+    @classmethod
+    def greater_than(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("GreaterThan", a, b, lambda x, y: x > y)
+
+    @classmethod
+    def greater_than_or_equal(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("GreaterThanOrEqual", a, b, lambda x, y: x >= y)
+
+    @classmethod
+    def less_than(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("LessThan", a, b, lambda x, y: x < y)
+
+    @classmethod
+    def less_than_or_equal(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("LessThanOrEqual", a, b, lambda x, y: x <= y)
+
+    @classmethod
+    def and_(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("And", a, b, lambda x, y: x and y)
+
+    @classmethod
+    def or_(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("Or", a, b, lambda x, y: x or y)
+
+    @classmethod
+    def not_(cls, arg: "FakeExpression"):
+        return cls._make("Not", lambda: not arg._evaluate())
+
+    @classmethod
+    def add(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("Add", a, b, lambda x, y: x + y)
+
+    @classmethod
+    def subtract(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("Subtract", a, b, lambda x, y: x - y)
+
+    @classmethod
+    def multiply(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("Multiply", a, b, lambda x, y: x * y)
+
+    @classmethod
+    def divide(cls, a: "FakeExpression", b: "FakeExpression"):
+        return cls._binary("Divide", a, b, lambda x, y: x / y)
+
+
+class FakeEvent:
+    """Mirrors krpc.event.Event, backed by a stream of the expression's value."""
+
+    def __init__(self, client: "FakeClient", expression: FakeExpression):
+        self._stream = FakeStream(client, lambda: bool(expression._evaluate()), (), {})
+
+    def start(self):
+        self._stream.start()
+
+    @property
+    def stream(self):
+        return self._stream
+
+    @property
+    def condition(self):
+        return self._stream.condition
+
+    def wait(self, timeout: float | None = None):
+        """Must be called with the condition held."""
+        self._stream.wait(timeout)
+
+    def add_callback(self, callback: Callable[[], None]):
+        self._stream.add_callback(lambda value: callback() if value else None)
+
+    def remove(self):
+        self._stream.remove()
+
+
+class FakeKRPC(_Remote):
+    _service = "KRPC"
+    _remote_name = "KRPC"
+
+    def __init__(self, client: "FakeClient"):
+        super().__init__(client)
+        self._paused = False
+        # bound to this client, like the classes krpc generates per connection
+        self._init_attributes(
+            Expression=type("Expression", (FakeExpression,), {"_client": client}),
+            Type=type("Type", (FakeType,), {"_client": client}),
+        )
+
+    def add_event(self, expression: FakeExpression):
+        return FakeEvent(self._client, expression)
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @paused.setter
+    def paused(self, value: bool):
+        self._paused = value
+
+    @property
+    def current_game_scene(self):
+        return "flight"
+
+
+# Client
+
+
+class FakeStream:
+    """Mirrors krpc.stream.Stream. Values are refreshed once per simulation tick, and the
+    condition and callbacks only fire when the value changes. Once removed, it keeps its last
+    value and never updates again."""
+
+    def __init__(
+        self,
+        client: "FakeClient",
+        func: Callable[..., Any],
+        args: tuple,
+        kwargs: dict[str, Any],
+        key: Hashable = None,
+    ):
+        self._client = client
+        self._key = key
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._condition = threading.Condition()
+        self._callbacks: list[Callable[[Any], None]] = []
+        self._value: Any = None
+        self._error: Exception | None = None
+        self._started = False
+        self.rate = 0.0
+
+    def _update(self):
+        try:
+            value = self._client._evaluate(self._func, self._args, self._kwargs)
+            error = None
+        except Exception as e:
+            value, error = None, e
+        if self._started and error is None and self._error is None and value == self._value:
+            return
+        with self._condition:
+            self._value = value
+            self._error = error
+            self._condition.notify_all()
+        if error is None:
+            for callback in list(self._callbacks):
+                callback(value)
+
+    def start(self, wait: bool = True):
+        if not self._started:
+            self._update()
+            self._started = True
+            self._client._start_stream(self)
+
+    def __call__(self):
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    @property
+    def condition(self):
+        return self._condition
+
+    def wait(self, timeout: float | None = None):
+        """Must be called with the condition held, like krpc.stream.Stream.wait."""
+        self._condition.wait(timeout)
+
+    def add_callback(self, callback: Callable[[Any], None]):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[Any], None]):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def remove(self):
+        self._client._remove_stream(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.remove()
+
+
+class FakeClient:
+    """In-process stand-in for krpc.client.Client, for running scripts without the game.
+
+    A background thread steps a point-mass simulation (Kepler coasting, thrust and mass flow,
+    exponential atmosphere with drag) in fixed PHYSICS_DT increments, at time_scale times real
+    time (math.inf runs as fast as possible). The physics is deterministic, but the timing of
+    the script's commands relative to the simulation is not.
+
+    Like kRPC, identical add_stream calls share one stream, so removing it through any of them
+    stops it for all of them.
+
+    sleep() waits for game time, so scripts keep their timing when running faster than real
+    time; utils.sleep uses it. latency adds a real-time delay to every RPC. Every call through a remote object is counted in rpc_calls.
+    """
+
+    def __init__(
+        self,
+        stages: list[FakeStage] | None = None,
+        orbit_altitude: float | None = None,
+        current_stage: int | None = None,
+        name: str = "Fake Rocket",
+        time_scale: float = 10,
+        latency: float = 0,
+    ):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._tick_condition = threading.Condition()
+        self._streams: list[FakeStream] = []
+        self._stream_cache: dict[Hashable, FakeStream] = {}
+        self._ut = 0.0
+        self._closed = False
+        self._time_scale = time_scale
+        self._latency = latency
+        self.rpc_calls: Counter[str] = Counter()
+
+        self.krpc = FakeKRPC(self)
+        self.space_center = FakeSpaceCenter(self)
+        self.ui = FakeUI(self)
+
+        kerbin = self.space_center._bodies["Kerbin"]
+        if orbit_altitude is None:
+            stages = copy.deepcopy(stages or default_rocket())
+            surface = kerbin._rotating_state()
+            position = surface.position_to_world((kerbin._radius + 1, 0.0, 0.0))
+            vessel = FakeVessel(
+                self,
+                name,
+                kerbin,
+                stages,
+                position,
+                surface.velocity_to_world(position, (0.0, 0.0, 0.0)),
+                utils.vec_normalize(position),
+                max(s.stage for s in stages) + 1 if current_stage is None else current_stage,
+                landed=True,
+            )
+        else:
+            stages = copy.deepcopy(stages or default_rocket()[2:])
+            radius = kerbin._radius + orbit_altitude
+            vessel = FakeVessel(
+                self,
+                name,
+                kerbin,
+                stages,
+                (radius, 0.0, 0.0),
+                (0.0, 0.0, math.sqrt(kerbin._mu / radius)),
+                (0.0, 0.0, 1.0),
+                min(s.stage for s in stages) if current_stage is None else current_stage,
+            )
+        self.space_center._vessels.append(vessel)
+        self.space_center._active_vessel = vessel
+
+        self._thread = threading.Thread(target=self._run, name="FakeClient", daemon=True)
+        self._thread.start()
+
+    # simulation
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while not self._closed:
+            if not self.krpc._paused:
+                self._tick()
+            next_tick += PHYSICS_DT / self._time_scale
+            delay = next_tick - time.perf_counter()
+            if delay < 0:
+                next_tick = time.perf_counter()
+            time.sleep(max(delay, 0))
+
+    def _tick(self):
+        space_center = self.space_center
+        if space_center._rails_warp_factor > 0:
+            if space_center._max_rails_warp_factor() > 0:
+                rate = RAILS_WARP_RATES[space_center._rails_warp_factor]
+                self._warp_to(self._ut + PHYSICS_DT * rate)
+                return
+            # like the game, drop out of rails warp as soon as it isn't allowed
+            space_center._rails_warp_factor = 0
+        with self._lock:
+            for _ in range(PHYSICS_WARP_RATES[self.space_center._physics_warp_factor]):
+                for vessel in list(self.space_center._vessels):
+                    vessel._step(PHYSICS_DT)
+                self._ut += PHYSICS_DT
+        with self._tick_condition:
+            self._tick_condition.notify_all()
+        for stream in list(self._streams):
+            stream._update()
+
+    def _warp_to(self, ut: float):
+        space_center = self.space_center
+        active = space_center._active_vessel
+        if active is not None and not active._can_coast():
+            # physics warp through it, like the game does under thrust or in atmosphere
+            previous = space_center._physics_warp_factor
+            space_center._physics_warp_factor = len(PHYSICS_WARP_RATES) - 1
+            self.sleep(ut - self._ut)
+            space_center._physics_warp_factor = previous
+            return
+        with self._lock:
+            if ut <= self._ut:
+                return
+            # the game unloads anything that can't go on rails
+            space_center._vessels = [
+                v for v in space_center._vessels if v is active or v._can_coast()
+            ]
+            landed = [
+                (v, v._body._rotating_state().position_to_local(v._position))
+                for v in space_center._vessels
+                if v._landed
+            ]
+            for vessel in space_center._vessels:
+                vessel._coast(ut)
+            self._ut = ut
+            for vessel, surface_position in landed:
+                frame = vessel._body._rotating_state()
+                vessel._position = frame.position_to_world(surface_position)
+                vessel._hold_on_surface()
+        with self._tick_condition:
+            self._tick_condition.notify_all()
+        for stream in list(self._streams):
+            stream._update()
+
+    def _wait_for(self, predicate: Callable[[], bool]):
+        with self._tick_condition:
+            while not self._closed and not predicate():
+                self._tick_condition.wait(1)
+
+    # RPCs and streams
+
+    def _call(self, service: str, procedure: str, call: Callable[[], Any]):
+        """Entry point for remote objects. Stream updates bypass _invoke, like in kRPC."""
+        if getattr(self._local, "streaming", False):
+            with self._lock:
+                return call()
+        return self._invoke(service, procedure, call)
+
+    def _invoke(self, service: str, procedure: str, call: Callable[[], Any]):
+        self.rpc_calls[f"{service}.{procedure}"] += 1
+        if self._latency > 0:
+            time.sleep(self._latency)
+        with self._lock:
+            return call()
+
+    def _evaluate(self, func: Callable[..., Any], args: tuple, kwargs: dict[str, Any]):
+        self._local.streaming = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._local.streaming = False
+
+    def _start_stream(self, stream: FakeStream):
+        self._streams.append(stream)
+
+    def _remove_stream(self, stream: FakeStream):
+        with self._lock:
+            if stream not in self._streams:
+                return
+            self.rpc_calls["KRPC.RemoveStream"] += 1
+            self._streams.remove(stream)
+            if self._stream_cache.get(stream._key) is stream:
+                del self._stream_cache[stream._key]
+
+    def add_stream(self, func: Callable[..., Any], *args: Any, **kwargs: Any):
+        self.rpc_calls["KRPC.AddStream"] += 1
+        try:
+            key: Hashable = (func, args, tuple(sorted(kwargs.items())))
+            hash(key)
+        except TypeError:  # the server would compare the encoded arguments instead
+            key = object()
+        with self._lock:
+            stream = self._stream_cache.get(key)
+            if stream is None:
+                stream = self._stream_cache[key] = FakeStream(self, func, args, kwargs, key)
+            stream.start()
+        return stream
+
+    def stream(self, func: Callable[..., Any], *args: Any, **kwargs: Any):
+        return self.add_stream(func, *args, **kwargs)
+
+    def get_call(self, func: Callable[..., Any], *args: Any, **kwargs: Any):
+        return _FakeCall(func, args, kwargs)
+
+    # helpers for driving scripts
+
+    def sleep(self, seconds: float):
+        """Sleep for the given amount of game time, or real time once closed."""
+        if self._closed:
+            time.sleep(max(seconds, 0))
+            return
+        if seconds <= 0:
+            time.sleep(0)
+            return
+        if self.krpc._paused:
+            time.sleep(seconds / self._time_scale if math.isfinite(self._time_scale) else 0)
+            return
+        target = self._ut + seconds - 1e-9
+        self._wait_for(lambda: self._ut >= target)
+
+    def click(self, content: str):
+        """Click the first visible button with the given text. Returns whether one was found."""
+        for button in self.ui._buttons():
+            text = object.__getattribute__(button, "text")
+            if button._is_shown() and object.__getattribute__(text, "content") == content:
+                object.__setattr__(button, "clicked", True)
+                return True
+        return False
+
+    def close(self):
+        self._closed = True
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def connect(
+    name: str | None = None,
+    address: str | None = None,
+    rpc_port: int | None = None,
+    stream_port: int | None = None,
+    scenario: str = "launchpad",
+    **kwargs: Any,
+):
+    """Drop-in replacement for krpc.connect(). scenario is "launchpad" (default_rocket() on the
+    pad) or "orbit" (its upper stage in a 100 km circular orbit); the connection arguments are
+    ignored and kwargs are passed on to FakeClient."""
+    if scenario == "launchpad":
+        return FakeClient(**kwargs)
+    if scenario == "orbit":
+        return FakeClient(orbit_altitude=100_000, **kwargs)
+    raise ValueError(f"Unknown fake kRPC scenario: {scenario}")
@@ -0,0 +1,247 @@
+import math
+from dataclasses import dataclass
+from typing import Iterable
+
+from krpc.client import Client
+
+from common import streams, utils
+from common.krpc_types.SpaceCenter import ReferenceFrame
+from common.utils import Vec3
+
+# (x, y, z, w), same as kRPC
+Quaternion = tuple[float, float, float, float]
+
+IDENTITY: Quaternion = (0.0, 0.0, 0.0, 1.0)
+
+
+def quat_mul(q1: Quaternion, q2: Quaternion) -> Quaternion:
+    x1, y1, z1, w1 = q1
+    x2, y2, z2, w2 = q2
+    return (
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+    )
+
+
+def quat_conjugate(q: Quaternion) -> Quaternion:
+    return (-q[0], -q[1], -q[2], q[3])
+
+
+def quat_rotate(q: Quaternion, v: Vec3) -> Vec3:
+    """Rotate v by the unit quaternion q."""
+    u = (q[0], q[1], q[2])
+    t = utils.vec_scalar_mult(2, utils.vec_cross(u, v))
+    return utils.vec_sum(utils.vec_sum(v, utils.vec_scalar_mult(q[3], t)), utils.vec_cross(u, t))
+
+
+def quat_from_axes(x: Vec3, y: Vec3, z: Vec3) -> Quaternion:
+    """The rotation taking the unit axes to x, y and z (the columns of its rotation matrix)."""
+    trace = x[0] + y[1] + z[2]
+    if trace > 0:
+        s = 2 * math.sqrt(trace + 1)
+        return ((y[2] - z[1]) / s, (z[0] - x[2]) / s, (x[1] - y[0]) / s, s / 4)
+    if x[0] > y[1] and x[0] > z[2]:
+        s = 2 * math.sqrt(1 + x[0] - y[1] - z[2])
+        return (s / 4, (y[0] + x[1]) / s, (z[0] + x[2]) / s, (y[2] - z[1]) / s)
+    if y[1] > z[2]:
+        s = 2 * math.sqrt(1 + y[1] - x[0] - z[2])
+        return ((y[0] + x[1]) / s, s / 4, (z[1] + y[2]) / s, (z[0] - x[2]) / s)
+    s = 2 * math.sqrt(1 + z[2] - x[0] - y[1])
+    return ((z[0] + x[2]) / s, (z[1] + y[2]) / s, s / 4, (x[1] - y[0]) / s)
+
+
+@dataclass(frozen=True)
+class Frame:
+    """A reference frame's state relative to a root frame at one instant: where its origin is,
+    how it's rotated, how fast its origin is moving and how fast it's spinning (all in the root
+    frame). Everything else is computed locally."""
+
+    position: Vec3
+    rotation: Quaternion
+    velocity: Vec3
+    angular_velocity: Vec3
+
+    def position_to_root(self, position: Vec3) -> Vec3:
+        return utils.vec_sum(self.position, quat_rotate(self.rotation, position))
+
+    def position_from_root(self, position: Vec3) -> Vec3:
+        return quat_rotate(
+            quat_conjugate(self.rotation), utils.vec_difference(position, self.position)
+        )
+
+    def direction_to_root(self, direction: Vec3) -> Vec3:
+        return quat_rotate(self.rotation, direction)
+
+    def direction_from_root(self, direction: Vec3) -> Vec3:
+        return quat_rotate(quat_conjugate(self.rotation), direction)
+
+    def rotation_to_root(self, rotation: Quaternion) -> Quaternion:
+        return quat_mul(self.rotation, rotation)
+
+    def rotation_from_root(self, rotation: Quaternion) -> Quaternion:
+        return quat_mul(quat_conjugate(self.rotation), rotation)
+
+    def _point_velocity(self, root_position: Vec3) -> Vec3:
+        """Root velocity of a point fixed in this frame."""
+        offset = utils.vec_difference(root_position, self.position)
+        return utils.vec_sum(self.velocity, utils.vec_cross(self.angular_velocity, offset))
+
+    def velocity_to_root(self, position: Vec3, velocity: Vec3) -> Vec3:
+        root_position = self.position_to_root(position)
+        return utils.vec_sum(
+            self._point_velocity(root_position), quat_rotate(self.rotation, velocity)
+        )
+
+    def velocity_from_root(self, position: Vec3, velocity: Vec3) -> Vec3:
+        relative = utils.vec_difference(velocity, self._point_velocity(position))
+        return quat_rotate(quat_conjugate(self.rotation), relative)
+
+
+def transform_position(position: Vec3, from_: Frame, to: Frame) -> Vec3:
+    return to.position_from_root(from_.position_to_root(position))
+
+
+def transform_direction(direction: Vec3, from_: Frame, to: Frame) -> Vec3:
+    return to.direction_from_root(from_.direction_to_root(direction))
+
+
+def transform_rotation(rotation: Quaternion, from_: Frame, to: Frame) -> Quaternion:
+    return to.rotation_from_root(from_.rotation_to_root(rotation))
+
+
+def transform_velocity(position: Vec3, velocity: Vec3, from_: Frame, to: Frame) -> Vec3:
+    root_position = from_.position_to_root(position)
+    return to.velocity_from_root(root_position, from_.velocity_to_root(position, velocity))
+
+
+def transform_positions(positions: Iterable[Vec3], from_: Frame, to: Frame) -> list[Vec3]:
+    return [transform_position(position, from_, to) for position in positions]
+
+
+def transform_directions(directions: Iterable[Vec3], from_: Frame, to: Frame) -> list[Vec3]:
+    return [transform_direction(direction, from_, to) for direction in directions]
+
+
+def transform_velocities(
+    states: Iterable[tuple[Vec3, Vec3]], from_: Frame, to: Frame
+) -> list[Vec3]:
+    """Transform (position, velocity) pairs."""
+    return [transform_velocity(position, velocity, from_, to) for position, velocity in states]
+
+
+def hybrid(
+    position: Frame,
+    rotation: Frame | None = None,
+    velocity: Frame | None = None,
+    angular_velocity: Frame | None = None,
+) -> Frame:
+    """Like ReferenceFrame.create_hybrid, but for snapshots and without the RPC."""
+    rotation = rotation or position
+    velocity = velocity or position
+    angular_velocity = angular_velocity or rotation
+    return Frame(
+        position.position,
+        rotation.rotation,
+        velocity._point_velocity(position.position),
+        angular_velocity.angular_velocity,
+    )
+
+
+class _FrameStreams:
+    def __init__(self, conn: Client, frame: ReferenceFrame, root: ReferenceFrame):
+        sc = conn.space_center
+        add_stream = streams.shared(conn).stream
+        zero = (0.0, 0.0, 0.0)
+        self.streams = (
+            add_stream(sc.transform_position, zero, frame, root),
+            add_stream(sc.transform_direction, (1.0, 0.0, 0.0), frame, root),
+            add_stream(sc.transform_direction, (0.0, 1.0, 0.0), frame, root),
+            add_stream(sc.transform_velocity, zero, zero, frame, root),
+            add_stream(sc.transform_velocity, (1.0, 0.0, 0.0), zero, frame, root),
+            add_stream(sc.transform_velocity, (0.0, 1.0, 0.0), zero, frame, root),
+        )
+
+    def snapshot(self) -> Frame:
+        (position, x, y, velocity, x_velocity, y_velocity) = (s() for s in self.streams)
+        z = utils.vec_cross(x, y)
+        # the points at x and y move at velocity + w cross x, etc., which pins down w
+        a = utils.vec_difference(x_velocity, velocity)
+        b = utils.vec_difference(y_velocity, velocity)
+        angular_velocity = utils.vec_sum(
+            utils.vec_sum(
+                utils.vec_scalar_mult(utils.vec_dot(b, z), x),
+                utils.vec_scalar_mult(-utils.vec_dot(a, z), y),
+            ),
+            utils.vec_scalar_mult(utils.vec_dot(a, y), z),
+        )
+        return Frame(position, quat_from_axes(x, y, z), velocity, angular_velocity)
+
+    def remove(self):
+        for stream in self.streams:
+            stream.remove()
+
+
+class FrameCache:
+    """Snapshots of reference frames relative to root, kept up to date by streams, so frame
+    math costs no RPCs after the first time a frame is used. Snapshots are cached until the
+    game's UT changes, so everything computed in one tick sees the same state."""
+
+    def __init__(self, conn: Client, root: ReferenceFrame):
+        self._conn = conn
+        self.root = root
+        self._ut = streams.shared(conn).stream(getattr, conn.space_center, "ut")
+        self._streams: dict[ReferenceFrame, _FrameStreams] = {}
+        self._snapshots: dict[object, Frame] = {}
+        self._snapshot_ut = math.nan
+
+    def _check_tick(self):
+        ut = self._ut()
+        if ut != self._snapshot_ut:
+            self._snapshots.clear()
+            self._snapshot_ut = ut
+
+    def get(self, frame: ReferenceFrame) -> Frame:
+        self._check_tick()
+        if frame not in self._snapshots:
+            if frame not in self._streams:
+                self._streams[frame] = _FrameStreams(self._conn, frame, self.root)
+            self._snapshots[frame] = self._streams[frame].snapshot()
+        return self._snapshots[frame]
+
+    def hybrid(
+        self,
+        position: ReferenceFrame,
+        rotation: ReferenceFrame | None = None,
+        velocity: ReferenceFrame | None = None,
+        angular_velocity: ReferenceFrame | None = None,
+    ) -> Frame:
+        self._check_tick()
+        key = ("hybrid", position, rotation, velocity, angular_velocity)
+        if key not in self._snapshots:
+            self._snapshots[key] = hybrid(
+                self.get(position),
+                rotation and self.get(rotation),
+                velocity and self.get(velocity),
+                angular_velocity and self.get(angular_velocity),
+            )
+        return self._snapshots[key]
+
+    def forget(self, frame: ReferenceFrame):
+        """Stop tracking a frame that won't be used again."""
+        if frame in self._streams:
+            self._streams.pop(frame).remove()
+        self._snapshots.pop(frame, None)
+
+    def remove(self):
+        self._ut.remove()
+        for streams in self._streams.values():
+            streams.remove()
+        self._streams.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.remove()
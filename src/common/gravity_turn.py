@@ -0,0 +1,114 @@
+import math
+from typing import Any, Callable, Iterator, Sequence
+
+from krpc.client import Client
+from krpc.platform import NAN
+
+from common import settings, streams, utils
+from common.krpc_types.SpaceCenter import Vessel
+from common.playback import FlightPath
+
+
+class GravityTurn:
+    """gravturn's ascent, from liftoff until the apoapsis is high enough, so the benchmarks fly
+    the same loop as the script. Staging, warp and logging are left to the caller.
+
+    Streams come from registry, so they're shared with the caller's."""
+
+    def __init__(self, conn: Client, vessel: Vessel, registry: streams.StreamRegistry):
+        self._conn = conn
+        self._vessel = vessel
+        self._registry = registry
+        body_frame = vessel.orbit.body.reference_frame
+        prograde_ref = conn.space_center.ReferenceFrame.create_hybrid(
+            position=body_frame, rotation=vessel.surface_reference_frame
+        )
+        self.altitude = registry.stream(getattr, vessel.flight(), "mean_altitude")
+        self.apoapsis = registry.stream(getattr, vessel.orbit, "apoapsis_altitude")
+        self.srf_speed = registry.stream(getattr, vessel.flight(body_frame), "speed")
+        self.prograde = registry.stream(getattr, vessel.flight(prograde_ref), "velocity")
+        self._physics_warp_factor = registry.stream(
+            getattr, conn.space_center, "physics_warp_factor"
+        )
+
+    def launch(self, heading: float):
+        """Light the first stage and point straight up."""
+        vessel = self._vessel
+        vessel.control.activate_next_stage()
+        vessel.auto_pilot.engage()
+        vessel.auto_pilot.reference_frame = vessel.surface_reference_frame
+        vessel.auto_pilot.target_roll = NAN
+        vessel.auto_pilot.target_pitch_and_heading(90, heading)
+
+    def wait_for_speed(self, speed: float):
+        srf_speed = self.srf_speed
+        utils.wait_until(lambda: srf_speed() >= speed, srf_speed)
+
+    def start_turn(self, turn_start_pitch: float):
+        """Pitch over, and wait until prograde has followed."""
+        prograde = self.prograde
+        self._vessel.auto_pilot.target_pitch = 90 - turn_start_pitch
+        self._vessel.auto_pilot.wait()
+        turn_x = math.sin(math.radians(90 - turn_start_pitch))
+        utils.wait_until(lambda: utils.vec_normalize(prograde())[0] <= turn_x, prograde)
+
+    def track_prograde(self, target_apoapsis: float):
+        """Hold surface prograde until the apoapsis reaches target_apoapsis. Returns the number
+        of times round the loop."""
+        auto_pilot = self._vessel.auto_pilot
+        prograde = self.prograde
+
+        def steer():
+            auto_pilot.target_pitch = math.degrees(math.asin(utils.vec_normalize(prograde())[0]))
+
+        return self._ascend(target_apoapsis, steer)
+
+    def follow(
+        self,
+        flight_path: FlightPath,
+        other_data: Iterator[Sequence[Any]],
+        target_apoapsis: float,
+    ):
+        """Replay a recorded ascent until the apoapsis reaches target_apoapsis. Returns the
+        number of times round the loop."""
+        (conn, vessel) = (self._conn, self._vessel)
+        auto_pilot = vessel.auto_pilot
+        altitude = self.altitude
+        vertical_speed = self._registry.stream(
+            getattr, vessel.flight(vessel.orbit.body.reference_frame), "vertical_speed"
+        )
+        commanded_direction = None
+        next_other = next(other_data, None)
+
+        def steer():
+            nonlocal commanded_direction, next_other
+            current_altitude = altitude()
+            direction = flight_path.direction_at(
+                current_altitude, vertical_speed() * settings.autopilot_lead_time
+            )
+            if (
+                commanded_direction is None
+                or utils.vec_angle(direction, commanded_direction) > 0.0005
+            ):
+                auto_pilot.target_direction = direction
+                commanded_direction = direction
+            if next_other is not None and current_altitude >= next_other[0]:
+                if next_other[1] == "start_physics_warp":
+                    conn.space_center.physics_warp_factor = 2
+                    next_other = next(other_data, None)
+                else:
+                    raise ValueError("Unknown instruction " + str(next_other[1]))
+
+        return self._ascend(target_apoapsis, steer)
+
+    def _ascend(self, target_apoapsis: float, steer: Callable[[], None]):
+        (altitude, apoapsis, prograde) = (self.altitude, self.apoapsis, self.prograde)
+        physics_warp_factor = self._physics_warp_factor
+        iterations = 0
+        while apoapsis() < target_apoapsis:
+            steer()
+            if physics_warp_factor() > 0 and apoapsis() >= target_apoapsis - 10000:
+                self._conn.space_center.physics_warp_factor = 0
+            iterations += 1
+            utils.wait_for_update(altitude, apoapsis, prograde)
+        return iterations
@@ -0,0 +1,138 @@
+import threading
+from typing import Any
+
+from krpc.client import Client
+
+from common.krpc_types.UI import Canvas, Text
+
+# HudText fields, and the Text or RectTransform property each one sets
+_TEXT_FIELDS = {
+    "content": "content",
+    "color": "color",
+    "font_size": "size",
+    "style": "style",
+    "alignment": "alignment",
+    "line_spacing": "line_spacing",
+    "visible": "visible",
+}
+_RECT_FIELDS = {"position": "position", "size": "size"}
+
+
+class HudText:
+    """A Text element whose fields are set locally, and only sent to the game by its Hud when
+    they change. Set content with text.content = ..., and anything else with set()."""
+
+    def __init__(self, hud: "Hud", text: Text, fields: dict[str, Any]):
+        self._hud = hud
+        self._text = text
+        self._rect: Any = None
+        self._fields = dict(fields)
+        self._sent = dict(fields)
+        self._removed = False
+
+    @property
+    def content(self) -> str:
+        return self._fields["content"]
+
+    @content.setter
+    def content(self, value: str):
+        self.set(content=value)
+
+    def set(self, **fields: Any):
+        for name in fields:
+            if name not in _TEXT_FIELDS and name not in _RECT_FIELDS:
+                raise TypeError(f"HudText has no field {name}")
+        with self._hud._lock:
+            self._fields.update(fields)
+            if self._fields != self._sent:
+                self._hud._dirty.add(self)
+                self._hud._lock.notify()
+
+    def _send(self):
+        """Called with the Hud's send lock held."""
+        with self._hud._lock:
+            changes = {k: v for k, v in self._fields.items() if self._sent.get(k) != v}
+            self._sent.update(changes)
+        for name, value in changes.items():
+            if name in _RECT_FIELDS:
+                if self._rect is None:
+                    self._rect = self._text.rect_transform
+                setattr(self._rect, _RECT_FIELDS[name], value)
+            else:
+                setattr(self._text, _TEXT_FIELDS[name], value)
+
+    def remove(self):
+        with self._hud._send_lock:
+            with self._hud._lock:
+                self._hud._dirty.discard(self)
+                self._removed = True
+            self._text.remove()
+
+
+class Hud:
+    """Text readouts on a canvas (the stock one by default) that can be updated as often as the
+    script likes without competing with its control loop for the connection: only fields that
+    changed are sent, by a background thread, at most max_rate times a second."""
+
+    def __init__(self, conn: Client, canvas: Canvas | None = None, max_rate: float = 10):
+        self._conn = conn
+        self._canvas = canvas or conn.ui.stock_canvas
+        self._interval = 1 / max_rate
+        self._screen_size: tuple[float, float] | None = None
+        self._lock = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._dirty: set[HudText] = set()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="Hud", daemon=True)
+        self._thread.start()
+
+    @property
+    def screen_size(self) -> tuple[float, float]:
+        if self._screen_size is None:
+            self._screen_size = self._canvas.rect_transform.size
+        return self._screen_size
+
+    def add_text(self, content: str = "", **fields: Any):
+        """Add a Text, setting the given fields (as in HudText.set) right away."""
+        text = HudText(self, self._canvas.add_text(content), {"content": content})
+        text.set(**fields)
+        with self._send_lock:
+            with self._lock:
+                self._dirty.discard(text)
+            text._send()
+        return text
+
+    def flush(self):
+        """Send every pending change now."""
+        with self._send_lock:
+            with self._lock:
+                (dirty, self._dirty) = (self._dirty, set())
+            for text in dirty:
+                if not text._removed:
+                    text._send()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._dirty and not self._closed:
+                    self._lock.wait()
+                if self._closed:
+                    return
+            self.flush()
+            # coalesce whatever changes in the meantime into the next flush
+            with self._lock:
+                self._lock.wait_for(lambda: self._closed, self._interval)
+
+    def close(self):
+        """Stop the background thread, after sending any pending changes. The texts stay."""
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,182 @@
+import atexit
+import json
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, TextIO
+
+from krpc.client import Client
+
+# latency buckets grow by this ratio from _BUCKET_BASE seconds, so percentiles are within ~4%
+_BUCKET_RATIO = 2 ** (1 / 8)
+_BUCKET_BASE = 1e-6
+_BUCKETS = 256
+_SKIPPED_MODULES = ("krpc", "common.fake_krpc", "threading", __name__)
+
+
+class LatencyHistogram:
+    """Log-spaced histogram of call latencies, so memory doesn't grow with the number of calls."""
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        index = 0
+        if seconds > _BUCKET_BASE:
+            index = min(int(math.log(seconds / _BUCKET_BASE, _BUCKET_RATIO)) + 1, _BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p: float):
+        """Approximate latency in seconds that p percent of calls were faster than."""
+        if self.count == 0:
+            return math.nan
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                # geometric middle of the bucket
+                return _BUCKET_BASE * _BUCKET_RATIO ** (index - 0.5) if index else _BUCKET_BASE
+        return math.nan
+
+
+@dataclass
+class CallStats:
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+    def summary(self):
+        return {
+            "calls": self.latency.count,
+            "total_ms": self.latency.total * 1000,
+            "p50_ms": self.latency.percentile(50) * 1000,
+            "p99_ms": self.latency.percentile(99) * 1000,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+def _call_site():
+    """file:line and function of the first caller outside kRPC, the fake client and this module."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__", "").startswith(_SKIPPED_MODULES):
+        frame = frame.f_back
+    if frame is None:
+        return "<unknown>"
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} ({code.co_name})"
+
+
+class Instrumentation:
+    """Wraps a connection's RPCs to count them and time them, per procedure and per Python call
+    site. Message sizes are only known when talking to the game. Stream updates aren't RPCs, so
+    they aren't counted."""
+
+    def __init__(self, conn: Client):
+        self._conn = conn
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.by_procedure: dict[str, CallStats] = {}
+        self.by_call_site: dict[str, CallStats] = {}
+        self._originals: dict[str, Any] = {}
+
+    def install(self):
+        conn = self._conn
+        self._originals["_invoke"] = conn._invoke
+        conn._invoke = self._invoke  # type: ignore
+        connection = getattr(conn, "_rpc_connection", None)
+        if connection is not None:
+            self._originals["send_message"] = connection.send_message
+            self._originals["receive_message"] = connection.receive_message
+            connection.send_message = self._send_message
+            connection.receive_message = self._receive_message
+        return self
+
+    def uninstall(self):
+        conn = self._conn
+        conn._invoke = self._originals.pop("_invoke")  # type: ignore
+        connection = getattr(conn, "_rpc_connection", None)
+        if connection is not None and self._originals:
+            connection.send_message = self._originals.pop("send_message")
+            connection.receive_message = self._originals.pop("receive_message")
+
+    def _send_message(self, message: Any):
+        self._local.sent = getattr(self._local, "sent", 0) + message.ByteSize()
+        return self._originals["send_message"](message)
+
+    def _receive_message(self, typ: Any):
+        message = self._originals["receive_message"](typ)
+        self._local.received = getattr(self._local, "received", 0) + message.ByteSize()
+        return message
+
+    def _invoke(self, service: str, procedure: str, *args: Any, **kwargs: Any):
+        site = _call_site()
+        self._local.sent = self._local.received = 0
+        start = time.perf_counter()
+        try:
+            return self._originals["_invoke"](service, procedure, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                for stats in (
+                    self.by_procedure.setdefault(f"{service}.{procedure}", CallStats()),
+                    self.by_call_site.setdefault(site, CallStats()),
+                ):
+                    stats.latency.add(elapsed)
+                    stats.bytes_sent += self._local.sent
+                    stats.bytes_received += self._local.received
+
+    def summary(self):
+        with self._lock:
+            return {
+                "procedures": {k: v.summary() for k, v in self.by_procedure.items()},
+                "call_sites": {k: v.summary() for k, v in self.by_call_site.items()},
+            }
+
+    def report(self, format: str = "table", file: TextIO | None = None):
+        """Write the stats as JSON or as tables sorted by total time."""
+        file = file or sys.stderr
+        summary = self.summary()
+        if format == "json":
+            json.dump(summary, file, indent=2)
+            file.write("\n")
+            return
+        for title, rows in (
+            ("Procedure", summary["procedures"]),
+            ("Call site", summary["call_sites"]),
+        ):
+            width = max([len(title), *(len(k) for k in rows)])
+            file.write(
+                f"{title:<{width}}  {'calls':>7}  {'total ms':>9}  {'p50 ms':>7}  {'p99 ms':>7}"
+                f"  {'bytes out':>9}  {'bytes in':>9}\n"
+            )
+            for key, row in sorted(rows.items(), key=lambda item: -item[1]["total_ms"]):
+                file.write(
+                    f"{key:<{width}}  {row['calls']:>7}  {row['total_ms']:>9.1f}"
+                    f"  {row['p50_ms']:>7.2f}  {row['p99_ms']:>7.2f}"
+                    f"  {row['bytes_sent']:>9}  {row['bytes_received']:>9}\n"
+                )
+            file.write("\n")
+
+
+def instrument(conn: Client, format: str = "table", path: str | None = None) -> Instrumentation:
+    """Start instrumenting the connection and report when the script exits, to path or stderr."""
+    instrumentation = Instrumentation(conn).install()
+
+    def report():
+        if path is None:
+            instrumentation.report(format)
+        else:
+            with open(path, "w") as f:
+                instrumentation.report(format, f)
+
+    atexit.register(report)
+    return instrumentation
@@ -17,6 +17,7 @@ CelestialBody = SpaceCenter.CelestialBody
 Vessel = SpaceCenter.Vessel
 Node = SpaceCenter.Node
 Control = SpaceCenter.Control
+ReferenceFrame = SpaceCenter.ReferenceFrame
 
 # Additional helper types
 
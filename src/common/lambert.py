@@ -0,0 +1,279 @@
+import math
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Sequence
+
+from krpc.client import Client
+
+from common import expressions, orbits, streams, utils
+from common.krpc_types.SpaceCenter import CelestialBody, Node, Vessel
+from common.performance import VesselPerformance
+from common.utils import Vec3
+
+# grids with at least this many cells are split across processes
+PARALLEL_THRESHOLD = 20_000
+
+
+def _stumpff_c(z: float):
+    if z > 1e-6:
+        return (1 - math.cos(math.sqrt(z))) / z
+    if z < -1e-6:
+        return (math.cosh(math.sqrt(-z)) - 1) / -z
+    return 1 / 2 - z / 24
+
+
+def _stumpff_s(z: float):
+    if z > 1e-6:
+        root = math.sqrt(z)
+        return (root - math.sin(root)) / root**3
+    if z < -1e-6:
+        root = math.sqrt(-z)
+        return (math.sinh(root) - root) / root**3
+    return 1 / 6 - z / 120
+
+
+def lambert(
+    mu: float, r1: Vec3, r2: Vec3, time_of_flight: float, long_way: bool = False
+) -> tuple[Vec3, Vec3]:
+    """Velocities at r1 and r2 of the (less than one revolution) orbit that gets from one to the
+    other in time_of_flight, by the universal variable method. long_way picks the transfer
+    that goes more than 180° around."""
+    r1_mag = utils.vec_magnitude(r1)
+    r2_mag = utils.vec_magnitude(r2)
+    cos_angle = utils.clamp(utils.vec_dot(r1, r2) / (r1_mag * r2_mag), -1, 1)
+    A = math.sqrt(r1_mag * r2_mag * (1 + cos_angle)) * (-1 if long_way else 1)
+    if abs(A) < 1e-9:
+        raise ValueError("Lambert's problem is undefined for a 180° transfer")
+
+    def y(z: float):
+        return r1_mag + r2_mag + A * (z * _stumpff_s(z) - 1) / math.sqrt(_stumpff_c(z))
+
+    def flight_time(z: float):
+        yz = y(z)
+        return ((yz / _stumpff_c(z)) ** 1.5 * _stumpff_s(z) + A * math.sqrt(yz)) / math.sqrt(mu)
+
+    # time of flight increases with z, so bisect between the hyperbolic and one-rev limits
+    lo, hi = -4 * math.pi**2, 4 * math.pi**2 - 1e-6
+    while y(lo) < 0:
+        lo = (lo + hi) / 2
+    for _ in range(100):
+        z = (lo + hi) / 2
+        if y(z) < 0 or flight_time(z) < time_of_flight:
+            lo = z
+        else:
+            hi = z
+        if hi - lo < 1e-12:
+            break
+    yz = y((lo + hi) / 2)
+    f = 1 - yz / r1_mag
+    g = A * math.sqrt(yz / mu)
+    g_dot = 1 - yz / r2_mag
+    v1 = utils.vec_scalar_mult(1 / g, utils.vec_difference(r2, utils.vec_scalar_mult(f, r1)))
+    v2 = utils.vec_scalar_mult(1 / g, utils.vec_difference(utils.vec_scalar_mult(g_dot, r2), r1))
+    return (v1, v2)
+
+
+@dataclass(frozen=True)
+class Transfer:
+    departure_ut: float
+    time_of_flight: float
+    departure_position: Vec3
+    departure_velocity: Vec3
+    departure_dv: Vec3
+    arrival_dv: Vec3
+    delta_v: float
+
+    @property
+    def arrival_ut(self):
+        return self.departure_ut + self.time_of_flight
+
+
+@dataclass(frozen=True)
+class Porkchop:
+    """Delta-v (of whatever the search minimised) for each departure UT (rows) and time of
+    flight (columns), and the best transfer found."""
+
+    departure_uts: Sequence[float]
+    flight_times: Sequence[float]
+    delta_v: list[array]
+    best: Transfer
+
+
+def _transfer(
+    departure: orbits.KeplerOrbit,
+    arrival: orbits.KeplerOrbit,
+    departure_ut: float,
+    time_of_flight: float,
+    rendezvous: bool,
+):
+    (r1, v1) = departure.state_at(departure_ut)
+    (r2, v2) = arrival.state_at(departure_ut + time_of_flight)
+    # go around the same way as the departure orbit
+    long_way = utils.vec_dot(utils.vec_cross(r1, r2), utils.vec_cross(r1, v1)) < 0
+    try:
+        (transfer_v1, transfer_v2) = lambert(departure.mu, r1, r2, time_of_flight, long_way)
+    except (ValueError, ZeroDivisionError):
+        return None
+    departure_dv = utils.vec_difference(transfer_v1, v1)
+    arrival_dv = utils.vec_difference(v2, transfer_v2)
+    delta_v = utils.vec_magnitude(departure_dv)
+    if rendezvous:
+        delta_v += utils.vec_magnitude(arrival_dv)
+    return Transfer(departure_ut, time_of_flight, r1, v1, departure_dv, arrival_dv, delta_v)
+
+
+def _porkchop_row(
+    args: tuple[orbits.KeplerOrbit, orbits.KeplerOrbit, float, Sequence[float], bool]
+):
+    (departure, arrival, departure_ut, flight_times, rendezvous) = args
+    row = array("d")
+    best = None
+    for time_of_flight in flight_times:
+        transfer = _transfer(departure, arrival, departure_ut, time_of_flight, rendezvous)
+        row.append(math.inf if transfer is None else transfer.delta_v)
+        if transfer is not None and (best is None or transfer.delta_v < best.delta_v):
+            best = transfer
+    return (row, best)
+
+
+def porkchop(
+    departure: orbits.KeplerOrbit,
+    arrival: orbits.KeplerOrbit,
+    departure_uts: Sequence[float],
+    flight_times: Sequence[float],
+    rendezvous: bool = False,
+    processes: int | None = None,
+) -> Porkchop:
+    """Solve Lambert's problem for every departure UT and time of flight. Minimises departure
+    delta-v, or departure plus arrival delta-v if rendezvous is set. Both orbits must be around
+    the same body and in the same frame. Large grids are spread over a process pool (processes
+    workers, or one per CPU); pass processes=1 to stay in this process."""
+    rows = [(departure, arrival, ut, flight_times, rendezvous) for ut in departure_uts]
+    if processes != 1 and len(departure_uts) * len(flight_times) >= PARALLEL_THRESHOLD:
+        with ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(_porkchop_row, rows, chunksize=8))
+    else:
+        results = [_porkchop_row(row) for row in rows]
+    candidates = [best for (_, best) in results if best is not None]
+    if not candidates:
+        raise ValueError("No transfers found")
+    return Porkchop(
+        departure_uts,
+        flight_times,
+        [row for (row, _) in results],
+        min(candidates, key=lambda transfer: transfer.delta_v),
+    )
+
+
+def _linspace(start: float, stop: float, count: int):
+    return [start + (stop - start) * i / (count - 1) for i in range(count)]
+
+
+def plan_transfer(
+    conn: Client,
+    vessel: Vessel,
+    target: CelestialBody | Vessel,
+    lead_time: float = 60,
+    rendezvous: bool = False,
+    resolution: int = 48,
+) -> Transfer:
+    """Find the cheapest transfer from the vessel's orbit to the target's, which must be around
+    the same body. Reads both orbits once, then searches departures over one synodic period
+    and flight times around the Hohmann transfer time offline, refining around the best cell."""
+    assert target.orbit
+    frame = vessel.orbit.body.non_rotating_reference_frame
+    departure = orbits.snapshot(vessel.orbit, frame)
+    arrival = orbits.snapshot(target.orbit, frame)
+    start = conn.space_center.ut + lead_time
+
+    n1, n2 = departure.mean_motion, arrival.mean_motion
+    window = 2 * math.pi / abs(n1 - n2) if abs(n1 - n2) > 1e-12 else departure.period
+    window = min(window, 10 * max(departure.search_span, arrival.search_span))
+    a1, a2 = abs(departure.semi_major_axis), abs(arrival.semi_major_axis)
+    hohmann_time = math.pi * math.sqrt((a1 + a2) ** 3 / (8 * departure.mu))
+
+    result = porkchop(
+        departure,
+        arrival,
+        _linspace(start, start + window, resolution),
+        _linspace(0.5 * hohmann_time, 1.5 * hohmann_time, resolution),
+        rendezvous,
+    )
+    # refine over the neighbouring cells
+    departure_step = window / (resolution - 1)
+    flight_step = hohmann_time / (resolution - 1)
+    best = result.best
+    return porkchop(
+        departure,
+        arrival,
+        _linspace(
+            max(start, best.departure_ut - departure_step),
+            best.departure_ut + departure_step,
+            resolution,
+        ),
+        _linspace(best.time_of_flight - flight_step, best.time_of_flight + flight_step, resolution),
+        rendezvous,
+    ).best
+
+
+def add_transfer_node(vessel: Vessel, transfer: Transfer) -> Node:
+    return vessel.control.add_node(
+        transfer.departure_ut,
+        *orbits.maneuver_components(
+            transfer.departure_position, transfer.departure_velocity, transfer.departure_dv
+        ),
+    )
+
+
+def moon_rendezvous(
+    conn: Client,
+    vessel: Vessel,
+    target: CelestialBody,
+    target_altitude: float,
+    do_circularize: bool = True,
+    performance: VesselPerformance | None = None,
+):
+    """Transfer to target, a moon of the body the vessel orbits, and correct the periapsis there
+    to target_altitude. The kick is the cheapest Lambert transfer to the target's position, so
+    the orbits don't need to be circular or coplanar."""
+    transfer = plan_transfer(conn, vessel, target)
+    node = add_transfer_node(vessel, transfer)
+    utils.log(conn, "Starting transfer kick.")
+
+    def _rendezvous_stop_condition(burn_time):
+        utils.sleep(conn, burn_time - 0.3)
+        vessel.control.throttle = 0.05
+        with streams.shared(conn).stream(
+            vessel.orbit.distance_at_closest_approach, target.orbit
+        ) as approach_dist:
+            utils.wait_until_increasing(approach_dist)
+
+    utils.execute_node(conn, vessel, node, _rendezvous_stop_condition, performance=performance)
+
+    assert (next_orbit := vessel.orbit.next_orbit)
+    next_ref_frame = next_orbit.body.non_rotating_reference_frame
+    if abs(next_orbit.periapsis_altitude - target_altitude) > 500:
+        utils.log(conn, "Orienting for altitude correction burn.")
+        vessel.auto_pilot.reference_frame = next_ref_frame
+        if next_orbit.periapsis_altitude > target_altitude:
+            vessel.auto_pilot.target_direction = tuple(-x for x in vessel.position(next_ref_frame))
+        else:
+            vessel.auto_pilot.target_direction = vessel.position(next_ref_frame)
+        vessel.auto_pilot.wait()
+        utils.log(conn, "Correcting altitude.")
+        vessel.control.throttle = 0.01
+        periapsis_altitude = expressions.server_value(
+            conn, getattr, next_orbit, "periapsis_altitude"
+        )
+        if next_orbit.periapsis_altitude > target_altitude:
+            expressions.wait_for(periapsis_altitude <= target_altitude)
+        else:
+            expressions.wait_for(periapsis_altitude >= target_altitude)
+        vessel.control.throttle = 0
+
+    if do_circularize:
+        print("Waiting for SOI change.")
+        # do stuff
+        utils.log(conn, "Starting transfer circularization.")
+        utils.circularize(conn, vessel, performance)
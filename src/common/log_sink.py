@@ -0,0 +1,80 @@
+import json
+import math
+import queue
+import threading
+import time
+from typing import Any, TextIO
+
+from krpc.client import Client
+
+from common import streams
+
+_sinks: dict[int, "LogSink"] = {}
+
+
+class LogSink:
+    """Sends utils.log messages to the game from a background thread, so logging right before a
+    burn or staging doesn't delay it. A message shown in the last duplicate_interval seconds isn't
+    shown again.
+
+    If path is given, every message is also appended to it as a JSON line with the wall-clock
+    time, game time, duration and whether it was shown."""
+
+    def __init__(self, conn: Client, path: str | None = None, duplicate_interval: float = 2):
+        self._conn = conn
+        self._duplicate_interval = duplicate_interval
+        self._ut = streams.shared(conn).stream(getattr, conn.space_center, "ut")
+        self._file: TextIO | None = None if path is None else open(path, "a")
+        self._queue: queue.Queue[dict[str, Any] | None] = queue.Queue()
+        self._last_shown: dict[str, float] = {}
+        self._thread = threading.Thread(target=self._run, name="LogSink", daemon=True)
+        self._thread.start()
+
+    def log(self, content: str, duration: float = 5):
+        print(content)
+        self._queue.put(
+            {"time": time.time(), "ut": self._ut(), "message": content, "duration": duration}
+        )
+
+    def _run(self):
+        while (record := self._queue.get()) is not None:
+            now = time.monotonic()
+            content = record["message"]
+            shown = now - self._last_shown.get(content, -math.inf) >= self._duplicate_interval
+            record["shown"] = shown
+            if shown:
+                self._last_shown[content] = now
+                try:
+                    ui = self._conn.ui
+                    ui.message(
+                        content, duration=record["duration"], position=ui.MessagePosition.top_right
+                    )
+                except Exception:  # eg. the connection closed first; the console has it anyway
+                    record["shown"] = False
+            if self._file is not None:
+                self._file.write(json.dumps(record) + "\n")
+                self._file.flush()
+
+    def close(self):
+        """Send whatever is still queued, then stop. utils.log goes back to logging directly."""
+        if _sinks.get(id(self._conn)) is self:
+            del _sinks[id(self._conn)]
+        self._queue.put(None)
+        self._thread.join()
+        if self._file is not None:
+            self._file.close()
+        try:
+            self._ut.remove()
+        except Exception:  # the connection may already be closed
+            pass
+
+
+def install(conn: Client, path: str | None = None, duplicate_interval: float = 2) -> LogSink:
+    """Make utils.log use a LogSink for this connection."""
+    sink = LogSink(conn, path, duplicate_interval)
+    _sinks[id(conn)] = sink
+    return sink
+
+
+def get(conn: Client) -> LogSink | None:
+    return _sinks.get(id(conn))
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from typing import Callable
+
+from common import orbits, utils
+from common.brachistochrone import ShipState
+from common.krpc_types.SpaceCenter import Control, Node
+from common.utils import Vec3
+
+# direction to thrust in at a UT, given the delta-v burned so far
+SteeringLaw = Callable[[float, Vec3], Vec3]
+
+
+@dataclass(frozen=True)
+class BurnSegment:
+    """Part of a long burn. ut is the middle of the segment, which is where its node goes."""
+
+    ut: float
+    duration: float
+    delta_v: Vec3
+
+
+def _integrate(
+    ship: ShipState, start_ut: float, duration: float, dv: Vec3, steer: SteeringLaw, substeps: int
+):
+    """(delta-v, displacement relative to coasting) of burning at full thrust along the steering
+    law for duration, ignoring gravity."""
+    step = duration / substeps
+    segment_dv = (0.0, 0.0, 0.0)
+    displacement = (0.0, 0.0, 0.0)
+    for i in range(substeps):
+        ut = start_ut + (i + 0.5) * step
+        direction = steer(ut, utils.vec_sum(dv, segment_dv))
+        # midpoint mass, so the substep's dv is close to the rocket equation's
+        acceleration = ship.available_thrust / (ship.mass - ship.flow_rate * (i + 0.5) * step)
+        step_dv = utils.vec_scalar_mult(acceleration * step, direction)
+        displacement = utils.vec_sum(
+            displacement,
+            utils.vec_sum(
+                utils.vec_scalar_mult(step, segment_dv), utils.vec_scalar_mult(step / 2, step_dv)
+            ),
+        )
+        segment_dv = utils.vec_sum(segment_dv, step_dv)
+    return (segment_dv, displacement)
+
+
+def _segment_error(ship: ShipState, duration: float, segment_dv: Vec3, displacement: Vec3):
+    """(position error, velocity error) of flying the segment as a node instead, ie. burning for
+    the same time in the fixed direction of its total delta-v."""
+    direction = utils.vec_normalize(segment_dv)
+    fixed_dv = utils.vec_scalar_mult(utils.get_dv_of_burn(ship, duration), direction)
+    fixed_displacement = utils.vec_scalar_mult(ship.burn_distance(duration), direction)
+    return (
+        utils.vec_magnitude(utils.vec_difference(fixed_displacement, displacement)),
+        utils.vec_magnitude(utils.vec_difference(fixed_dv, segment_dv)),
+    )
+
+
+def split_burn(
+    ship: ShipState,
+    start_ut: float,
+    burn_time: float,
+    steer: SteeringLaw,
+    position_tolerance: float = 1000,
+    velocity_tolerance: float = 1,
+    min_segments: int = 4,
+    max_segments: int = 256,
+    substeps: int = 16,
+) -> list[BurnSegment]:
+    """Split a long full-thrust burn following a steering law into segments that can each be
+    flown as one node, without any flying more than the tolerances off the continuous burn.
+
+    Segment lengths adapt: a segment is halved until it's within tolerance, and the next one
+    starts at double its length if it was well within it. Gravity is ignored, as for the
+    torchship burns this is meant for."""
+    segments: list[BurnSegment] = []
+    min_step = burn_time / max_segments
+    step = burn_time / min_segments
+    elapsed = 0.0
+    dv = (0.0, 0.0, 0.0)
+    while burn_time - elapsed > 1e-9 * burn_time:
+        step = min(step, burn_time - elapsed)
+        while True:
+            (segment_dv, displacement) = _integrate(
+                ship, start_ut + elapsed, step, dv, steer, substeps
+            )
+            (position_error, velocity_error) = _segment_error(ship, step, segment_dv, displacement)
+            within = position_error <= position_tolerance and velocity_error <= velocity_tolerance
+            if within or step <= min_step:
+                break
+            step /= 2
+        segments.append(BurnSegment(start_ut + elapsed + step / 2, step, segment_dv))
+        dv = utils.vec_sum(dv, segment_dv)
+        ship = ship.after_burn(step)
+        elapsed += step
+        if position_error <= position_tolerance / 4 and velocity_error <= velocity_tolerance / 4:
+            step = min(step * 2, burn_time / min_segments)
+    return segments
+
+
+def add_nodes(
+    control: Control, orbit: orbits.KeplerOrbit, segments: list[BurnSegment]
+) -> list[Node]:
+    """Add a node for each segment. The prograde/normal/radial split of each one is worked out
+    locally by propagating orbit (in any non-rotating frame, like segments' delta-v) through the
+    nodes before it, so each node is a single add_node call."""
+    nodes = []
+    for segment in segments:
+        (r, v) = orbit.state_at(segment.ut)
+        nodes.append(
+            control.add_node(segment.ut, *orbits.maneuver_components(r, v, segment.delta_v))
+        )
+        orbit = orbits.from_state(orbit.mu, r, utils.vec_sum(v, segment.delta_v), segment.ut)
+    return nodes
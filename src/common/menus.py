@@ -0,0 +1,137 @@
+import queue
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from krpc.client import Client
+
+from common import streams
+
+# gap between stacked elements, in pixels
+_SPACING = 2
+
+
+@dataclass(frozen=True)
+class Field:
+    """An input field with a label to its left."""
+
+    label: str
+    value: str = ""
+
+
+@dataclass(frozen=True)
+class Button:
+    """goto is the name of the screen the button opens. Buttons without one end the menu."""
+
+    label: str
+    goto: str | None = None
+
+
+@dataclass(frozen=True)
+class Screen:
+    """A panel of fields, then buttons, stacked in a column."""
+
+    name: str
+    buttons: Sequence[Button]
+    fields: Sequence[Field] = ()
+
+
+class _Panel:
+    def __init__(self, screen: Screen, panel: Any, buttons: list[Any], fields: list[Any]):
+        self.screen = screen
+        self.panel = panel
+        self.buttons = buttons
+        self.fields = fields
+
+
+class Menu:
+    """Screens of buttons and fields on a canvas of their own. Every panel is built and laid out
+    up front, with element sizes read once per kind, so switching screens is just showing one.
+
+    Every button's clicked stream feeds one queue, so waiting for a click uses no CPU."""
+
+    def __init__(
+        self,
+        conn: Client,
+        screens: Sequence[Screen],
+        x_offset: float = 0,
+        registry: streams.StreamRegistry | None = None,
+    ):
+        self._conn = conn
+        self._canvas = conn.ui.add_canvas()
+        self._clicks: queue.Queue[tuple[str, int]] = queue.Queue()
+        self._streams: list[Any] = []
+        self._add_stream = (streams.shared(conn) if registry is None else registry).stream
+        self._sizes: dict[str, tuple[float, float]] = {}
+        self._panels = {screen.name: self._build(screen, x_offset) for screen in screens}
+
+    def _size(self, kind: str, element: Any):
+        if kind not in self._sizes:
+            self._sizes[kind] = element.rect_transform.size
+        return self._sizes[kind]
+
+    def _build(self, screen: Screen, x_offset: float):
+        panel = self._canvas.add_panel(False)
+        fields = [panel.add_input_field() for _ in screen.fields]
+        buttons = [panel.add_button(button.label) for button in screen.buttons]
+        rows = [(element, self._size("field", element)) for element in fields] + [
+            (element, self._size("button", element)) for element in buttons
+        ]
+
+        y = (sum(size[1] for (_, size) in rows) + _SPACING * (len(rows) - 1)) / 2
+        for index, (element, size) in enumerate(rows):
+            y -= size[1] / 2
+            element.rect_transform.position = (x_offset, y)
+            if index < len(fields):
+                self._add_label(panel, screen.fields[index].label, x_offset - size[0] / 2, y)
+                if screen.fields[index].value:
+                    element.value = screen.fields[index].value
+            y -= size[1] / 2 + _SPACING
+
+        for index, button in enumerate(buttons):
+            clicked = self._add_stream(getattr, button, "clicked")
+            clicked.add_callback(
+                lambda value, key=(screen.name, index): self._clicks.put(key) if value else None
+            )
+            self._streams.append(clicked)
+        return _Panel(screen, panel, buttons, fields)
+
+    def _add_label(self, panel: Any, content: str, right: float, y: float):
+        label = panel.add_text(content)
+        label.color = (1, 1, 1)
+        label.alignment = self._conn.ui.TextAnchor.middle_right
+        transform = label.rect_transform
+        transform.pivot = (1, 0.5)
+        transform.position = (right - 4, y)
+
+    def run(self, start: str) -> tuple[str, int]:
+        """Show screens, starting with start, until a button without a goto is clicked. Returns
+        the name of its screen and its index there."""
+        name = start
+        while True:
+            panel = self._panels[name]
+            panel.panel.visible = True
+            while True:
+                (clicked_name, index) = self._clicks.get()
+                if clicked_name == name:
+                    break
+            panel.buttons[index].clicked = False
+            panel.panel.visible = False
+            goto = panel.screen.buttons[index].goto
+            if goto is None:
+                return (name, index)
+            name = goto
+
+    def values(self, screen: str) -> list[str]:
+        """What's in the screen's fields."""
+        return [field.value for field in self._panels[screen].fields]
+
+    def remove(self):
+        for stream in self._streams:
+            stream.remove()
+        self._canvas.remove()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.remove()
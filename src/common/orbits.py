@@ -0,0 +1,390 @@
+import math
+from array import array
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from krpc.client import Client
+from krpc.error import RPCError
+
+from common import streams, utils
+from common.krpc_types.SpaceCenter import CelestialBody, Orbit, ReferenceFrame, Vessel
+from common.utils import Vec3
+
+
+@dataclass(frozen=True)
+class KeplerOrbit:
+    """Orbital elements that can be propagated locally, without any RPCs.
+
+    The orientation of the orbit is stored as the perifocal basis vectors (p_hat towards
+    periapsis, q_hat 90° ahead of it) in whatever reference frame it was built in, which
+    carries the same information as inclination, LAN and argument of periapsis without
+    depending on that frame's axis conventions. Positions and velocities are relative to the
+    centre of the orbited body, in that frame."""
+
+    mu: float
+    semi_major_axis: float
+    eccentricity: float
+    p_hat: Vec3
+    q_hat: Vec3
+    epoch: float
+    mean_anomaly_at_epoch: float
+
+    @property
+    def mean_motion(self):
+        return math.sqrt(self.mu / abs(self.semi_major_axis) ** 3)
+
+    @property
+    def period(self):
+        if self.eccentricity >= 1:
+            return math.inf
+        return 2 * math.pi / self.mean_motion
+
+    @property
+    def search_span(self):
+        """How far ahead to look for events: one period, or a while for hyperbolic orbits."""
+        period = self.period
+        return period if math.isfinite(period) else 10 * 2 * math.pi / self.mean_motion
+
+    @property
+    def periapsis(self):
+        return abs(self.semi_major_axis) * abs(1 - self.eccentricity)
+
+    @property
+    def apoapsis(self):
+        if self.eccentricity >= 1:
+            return math.inf
+        return self.semi_major_axis * (1 + self.eccentricity)
+
+    @property
+    def normal(self):
+        return utils.vec_cross(self.q_hat, self.p_hat)
+
+    # these three assume a KSP body frame, where y points out of the north pole
+
+    @property
+    def inclination(self):
+        return utils.vec_angle(self.normal, (0, 1, 0))
+
+    @property
+    def longitude_of_ascending_node(self):
+        normal = self.normal
+        if math.hypot(normal[0], normal[2]) < 1e-12:
+            return 0.0
+        ascending_node = utils.vec_cross((0, 1, 0), normal)
+        return math.atan2(ascending_node[2], ascending_node[0]) % (2 * math.pi)
+
+    @property
+    def argument_of_periapsis(self):
+        lan = self.longitude_of_ascending_node
+        ascending_node = (math.cos(lan), 0.0, math.sin(lan))
+        angle = utils.vec_angle(ascending_node, self.p_hat)
+        return angle if self.p_hat[1] >= 0 else 2 * math.pi - angle
+
+    def mean_anomaly(self, ut: float):
+        return self.mean_anomaly_at_epoch + self.mean_motion * (ut - self.epoch)
+
+    def true_anomaly(self, ut: float):
+        return true_from_mean(self.mean_anomaly(ut), self.eccentricity)
+
+    def true_anomalies(self, uts: Iterable[float]) -> array:
+        return array("d", (self.true_anomaly(ut) for ut in uts))
+
+    def radius_at_true_anomaly(self, true_anomaly: float):
+        e = self.eccentricity
+        return self.semi_major_axis * (1 - e * e) / (1 + e * math.cos(true_anomaly))
+
+    def true_anomaly_at_radius(self, radius: float):
+        """The positive true anomaly at which the orbit crosses this radius. It also crosses
+        at minus this, and the result is clamped to periapsis/apoapsis if it never does."""
+        e = self.eccentricity
+        if e < 1e-12:
+            return 0.0
+        p = self.semi_major_axis * (1 - e * e)
+        return math.acos(utils.clamp((p / radius - 1) / e, -1, 1))
+
+    def time_to_mean_anomaly(self, mean_anomaly: float, ut: float):
+        """Time from ut until the orbit next reaches this mean anomaly."""
+        delta = mean_anomaly - self.mean_anomaly(ut)
+        if self.eccentricity >= 1:
+            return delta / self.mean_motion
+        return (delta % (2 * math.pi)) / self.mean_motion
+
+    def ut_at_true_anomaly(self, true_anomaly: float, ut: float):
+        """The first UT after ut at which the orbit reaches this true anomaly."""
+        M = mean_from_true(true_anomaly, self.eccentricity)
+        return ut + self.time_to_mean_anomaly(M, ut)
+
+    def state_at(self, ut: float) -> tuple[Vec3, Vec3]:
+        """(position, velocity) at ut."""
+        e = self.eccentricity
+        a = abs(self.semi_major_axis)
+        E = anomaly_from_mean(self.mean_anomaly(ut), e)
+        if e < 1:
+            b = a * math.sqrt(1 - e * e)
+            r = a * (1 - e * math.cos(E))
+            x, y = a * (math.cos(E) - e), b * math.sin(E)
+            k = math.sqrt(self.mu * a) / r
+            vx, vy = -k * math.sin(E), k * math.sqrt(1 - e * e) * math.cos(E)
+        else:
+            r = a * (e * math.cosh(E) - 1)
+            x, y = a * (e - math.cosh(E)), a * math.sqrt(e * e - 1) * math.sinh(E)
+            k = math.sqrt(self.mu * a) / r
+            vx, vy = -k * math.sinh(E), k * math.sqrt(e * e - 1) * math.cosh(E)
+        return (self._from_perifocal(x, y), self._from_perifocal(vx, vy))
+
+    def position_at(self, ut: float) -> Vec3:
+        return self.state_at(ut)[0]
+
+    def velocity_at(self, ut: float) -> Vec3:
+        return self.state_at(ut)[1]
+
+    def positions_at(self, uts: Iterable[float]) -> list[Vec3]:
+        return [self.state_at(ut)[0] for ut in uts]
+
+    def position_at_true_anomaly(self, true_anomaly: float) -> Vec3:
+        r = self.radius_at_true_anomaly(true_anomaly)
+        return self._from_perifocal(r * math.cos(true_anomaly), r * math.sin(true_anomaly))
+
+    def time_of_closest_approach(
+        self, other: "KeplerOrbit", ut: float, span: float | None = None
+    ) -> tuple[float, float]:
+        """(UT, distance) of the closest approach to another orbit around the same body, within
+        span seconds after ut (one period by default). Both must be in the same frame."""
+
+        def distance(t: float):
+            return utils.vec_magnitude(
+                utils.vec_difference(self.position_at(t), other.position_at(t))
+            )
+
+        return closest_approach(distance, ut, self.search_span if span is None else span)
+
+    def _from_perifocal(self, x: float, y: float) -> Vec3:
+        return utils.vec_sum(
+            utils.vec_scalar_mult(x, self.p_hat), utils.vec_scalar_mult(y, self.q_hat)
+        )
+
+
+def from_state(mu: float, position: Vec3, velocity: Vec3, ut: float):
+    """Elements of the orbit with this position and velocity relative to the body at ut."""
+    r, v = position, velocity
+    r_mag = utils.vec_magnitude(r)
+    v_sq = utils.vec_dot(v, v)
+    rv = utils.vec_dot(r, v)
+    e_vec = utils.vec_scalar_mult(
+        1 / mu,
+        utils.vec_difference(
+            utils.vec_scalar_mult(v_sq - mu / r_mag, r), utils.vec_scalar_mult(rv, v)
+        ),
+    )
+    e = utils.vec_magnitude(e_vec)
+    a = -mu / (2 * (v_sq / 2 - mu / r_mag))
+    p_hat = utils.vec_normalize(e_vec) if e > 1e-9 else utils.vec_normalize(r)
+    # (r x v) x p, expanded so it doesn't depend on the handedness of the frame
+    q_hat = utils.vec_normalize(
+        utils.vec_difference(
+            utils.vec_scalar_mult(utils.vec_dot(r, p_hat), v),
+            utils.vec_scalar_mult(utils.vec_dot(v, p_hat), r),
+        )
+    )
+    true_anomaly = math.atan2(utils.vec_dot(r, q_hat), utils.vec_dot(r, p_hat))
+    return KeplerOrbit(mu, a, e, p_hat, q_hat, ut, mean_from_true(true_anomaly, e))
+
+
+def maneuver_components(position: Vec3, velocity: Vec3, delta_v: Vec3):
+    """(prograde, normal, radial) of a delta-v given in the same non-rotating frame as the
+    position and velocity, as taken by Control.add_node."""
+    prograde = utils.vec_normalize(velocity)
+    normal = utils.vec_normalize(utils.vec_cross(velocity, position))
+    anti_radial = utils.vec_cross(prograde, normal)
+    return (
+        utils.vec_dot(delta_v, prograde),
+        utils.vec_dot(delta_v, normal),
+        -utils.vec_dot(delta_v, anti_radial),
+    )
+
+
+def snapshot(orbit: Orbit, reference_frame: ReferenceFrame | None = None):
+    """Read an orbit's elements from the game once, so it can be propagated locally.
+
+    reference_frame should be centred on the orbited body and not rotate; it defaults to the
+    body's non-rotating frame. The orientation comes from two position_at calls at true
+    anomalies 0 and 90°."""
+    body = orbit.body
+    if reference_frame is None:
+        reference_frame = body.non_rotating_reference_frame
+    elements = KeplerOrbit(
+        body.gravitational_parameter,
+        orbit.semi_major_axis,
+        orbit.eccentricity,
+        (1.0, 0.0, 0.0),
+        (0.0, 1.0, 0.0),
+        orbit.epoch,
+        orbit.mean_anomaly_at_epoch,
+    )
+    # the UTs are local, so the only round trips are for the positions themselves
+    periapsis_ut = elements.ut_at_true_anomaly(0, elements.epoch)
+    quarter_ut = elements.ut_at_true_anomaly(math.pi / 2, periapsis_ut)
+    p_hat = utils.vec_normalize(orbit.position_at(periapsis_ut, reference_frame))
+    q_hat = utils.vec_normalize(orbit.position_at(quarter_ut, reference_frame))
+    return KeplerOrbit(
+        elements.mu,
+        elements.semi_major_axis,
+        elements.eccentricity,
+        p_hat,
+        q_hat,
+        elements.epoch,
+        elements.mean_anomaly_at_epoch,
+    )
+
+
+class Patch:
+    """One patched conic of a vessel's trajectory, from start_ut until end_ut (inf if it never
+    leaves the SOI)."""
+
+    def __init__(self, orbit: Orbit, body: CelestialBody, start_ut: float, end_ut: float):
+        self.orbit = orbit
+        self.body = body
+        self.start_ut = start_ut
+        self.end_ut = end_ut
+        self._kepler: KeplerOrbit | None = None
+
+    @property
+    def kepler(self):
+        """Local elements in the body's non-rotating frame, snapshotted the first time."""
+        if self._kepler is None:
+            self._kepler = snapshot(self.orbit)
+        return self._kepler
+
+
+class OrbitChain:
+    """The vessel's sequence of patched conics, only rebuilt when something might have changed
+    it: the engines are running, the list of maneuver nodes changed, or the vessel has passed
+    an SOI change. Checking that is free since it's all read from streams."""
+
+    def __init__(self, conn: Client, vessel: Vessel):
+        self._vessel = vessel
+        add_stream = streams.shared(conn).stream
+        self._ut = add_stream(getattr, conn.space_center, "ut")
+        self._throttle = add_stream(getattr, vessel.control, "throttle")
+        self._nodes = add_stream(getattr, vessel.control, "nodes")
+        self._patches: list[Patch] = []
+        self._fingerprint = None
+
+    def remove(self):
+        for stream in (self._ut, self._throttle, self._nodes):
+            stream.remove()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.remove()
+
+    @property
+    def patches(self) -> list[Patch]:
+        fingerprint = (tuple(self._nodes()), self._throttle() > 0)
+        if (
+            fingerprint != self._fingerprint
+            or fingerprint[1]
+            or not self._patches
+            or self._ut() >= self._patches[0].end_ut
+        ):
+            self._patches = self._build()
+            self._fingerprint = fingerprint
+        return self._patches
+
+    def find(self, body: CelestialBody) -> Patch | None:
+        """The first patch around this body."""
+        return next((patch for patch in self.patches if patch.body == body), None)
+
+    def get_next_orbit_in_soi(self, body: CelestialBody):
+        """Same as utils.get_next_orbit_in_soi(vessel.orbit, body), but cached."""
+        patch = self.find(body)
+        if patch is None:
+            return (None, 0)
+        return (patch.orbit, max(patch.start_ut - self._ut(), 0))
+
+    def _build(self):
+        patches = []
+        # every patch's time_to_soi_change counts from now, not from the start of the patch
+        now = start_ut = self._ut()
+        orbit = self._vessel.orbit
+        while orbit is not None:
+            try:
+                time_to_soi_change = orbit.time_to_soi_change
+            except RPCError:
+                time_to_soi_change = math.nan
+            end_ut = now + time_to_soi_change if not math.isnan(time_to_soi_change) else math.inf
+            patches.append(Patch(orbit, orbit.body, start_ut, end_ut))
+            if math.isinf(end_ut):
+                break
+            start_ut = end_ut
+            orbit = orbit.next_orbit
+        return patches
+
+
+def circular(mu: float, radius: float, inclination: float, mean_anomaly: float, epoch=0.0):
+    return KeplerOrbit(
+        mu,
+        radius,
+        0.0,
+        (1.0, 0.0, 0.0),
+        (0.0, math.sin(inclination), math.cos(inclination)),
+        epoch,
+        mean_anomaly,
+    )
+
+
+def closest_approach(
+    distance: Callable[[float], float], ut: float, span: float, samples: int = 360
+) -> tuple[float, float]:
+    """(UT, distance) minimising distance(UT) in [ut, ut + span], by sampling and then a golden
+    section search around the best sample."""
+    step = span / samples
+    best = min(range(samples + 1), key=lambda i: distance(ut + i * step))
+    lo, hi = ut + max(best - 1, 0) * step, ut + min(best + 1, samples) * step
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(60):
+        a = hi - ratio * (hi - lo)
+        b = lo + ratio * (hi - lo)
+        if distance(a) < distance(b):
+            hi = b
+        else:
+            lo = a
+    closest = (lo + hi) / 2
+    return (closest, distance(closest))
+
+
+def mean_from_true(true_anomaly: float, e: float):
+    if e < 1:
+        E = math.atan2(math.sqrt(1 - e * e) * math.sin(true_anomaly), e + math.cos(true_anomaly))
+        return E - e * math.sin(E)
+    H = 2 * math.atanh(math.sqrt((e - 1) / (e + 1)) * math.tan(true_anomaly / 2))
+    return e * math.sinh(H) - H
+
+
+def anomaly_from_mean(M: float, e: float):
+    """Eccentric (or hyperbolic) anomaly, by Newton's method."""
+    if e < 1:
+        M = math.remainder(M, 2 * math.pi)
+        E = M if e < 0.8 else math.pi * (1 if M >= 0 else -1)
+        for _ in range(50):
+            delta = (E - e * math.sin(E) - M) / (1 - e * math.cos(E))
+            E -= delta
+            if abs(delta) < 1e-12:
+                break
+        return E
+    H = math.asinh(M / e)
+    for _ in range(50):
+        delta = (e * math.sinh(H) - H - M) / (e * math.cosh(H) - 1)
+        H -= delta
+        if abs(delta) < 1e-12:
+            break
+    return H
+
+
+def true_from_mean(M: float, e: float):
+    E = anomaly_from_mean(M, e)
+    if e < 1:
+        return math.atan2(math.sqrt(1 - e * e) * math.sin(E), math.cos(E) - e)
+    return 2 * math.atan(math.sqrt((e + 1) / (e - 1)) * math.tanh(E / 2))
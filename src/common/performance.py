@@ -0,0 +1,227 @@
+import math
+from dataclasses import dataclass, replace
+
+from krpc.client import Client
+
+from common import streams
+from common.krpc_types.SpaceCenter import Vessel
+
+# standard gravity, which KSP uses to turn Isp into exhaust velocity
+G0 = 9.80665
+
+
+@dataclass(frozen=True)
+class StagePerformance:
+    """A stretch of burning with the same engines lit, in vacuum at full throttle. stage is the
+    one that was activated to start it."""
+
+    stage: int
+    start_mass: float
+    end_mass: float
+    thrust: float
+    specific_impulse: float
+
+    @property
+    def exhaust_velocity(self):
+        return self.specific_impulse * G0
+
+    @property
+    def flow_rate(self):
+        return self.thrust / self.exhaust_velocity
+
+    @property
+    def delta_v(self):
+        return self.exhaust_velocity * math.log(self.start_mass / self.end_mass)
+
+    @property
+    def burn_time(self):
+        return (self.start_mass - self.end_mass) / self.flow_rate
+
+    def burn_time_for(self, dv: float):
+        return self.start_mass * (1 - math.exp(-dv / self.exhaust_velocity)) / self.flow_rate
+
+    def dv_of_burn(self, burn_time: float):
+        return self.exhaust_velocity * math.log(
+            self.start_mass / (self.start_mass - self.flow_rate * burn_time)
+        )
+
+    def braking_distance(self, speed: float, burn_time: float):
+        """Distance covered while burning retrograde for burn_time, starting at speed."""
+        end_mass = self.start_mass - self.flow_rate * burn_time
+        return speed * burn_time - self.exhaust_velocity / self.flow_rate * (
+            self.start_mass - end_mass + end_mass * math.log(end_mass / self.start_mass)
+        )
+
+
+@dataclass
+class _Engine:
+    stage: int
+    decouple_stage: int
+    thrust: float
+    flow_rate: float
+
+
+def _stages(
+    current_stage: int, parts: list[tuple[float, float, int]], engines: list[_Engine]
+) -> list[StagePerformance]:
+    """Burn through the vessel one stretch at a time. Each engine draws from the propellant in its
+    own decouple stage, and the next stage is activated once the parts it drops are empty."""
+    dry: dict[int, float] = {}
+    propellant: dict[int, float] = {}
+    for mass, dry_mass, decouple in parts:
+        dry[decouple] = dry.get(decouple, 0) + dry_mass
+        propellant[decouple] = propellant.get(decouple, 0) + mass - dry_mass
+
+    stages = []
+    for stage in range(current_stage, -1, -1):
+        if stage < current_stage:
+            dry.pop(stage, None)
+            propellant.pop(stage, None)
+        while True:
+            running = [
+                e
+                for e in engines
+                if e.stage >= stage
+                and e.decouple_stage < stage
+                and propellant.get(e.decouple_stage, 0) > 0
+            ]
+            if not running:
+                break
+            flow_rates: dict[int, float] = {}
+            for e in running:
+                flow_rates[e.decouple_stage] = flow_rates.get(e.decouple_stage, 0) + e.flow_rate
+            duration = min(propellant[d] / flow for d, flow in flow_rates.items())
+            start_mass = sum(dry.values()) + sum(propellant.values())
+            for d, flow in flow_rates.items():
+                propellant[d] = max(propellant[d] - flow * duration, 0)
+                if propellant[d] < 1e-9 * start_mass:
+                    propellant[d] = 0
+            thrust = sum(e.thrust for e in running)
+            flow_rate = sum(flow_rates.values())
+            stages.append(
+                StagePerformance(
+                    stage,
+                    start_mass,
+                    start_mass - flow_rate * duration,
+                    thrust,
+                    thrust / flow_rate / G0,
+                )
+            )
+            if stage - 1 in flow_rates and propellant[stage - 1] == 0:
+                break
+    return stages
+
+
+class VesselPerformance:
+    """A snapshot of the vessel's stages: which engines burn what propellant, and how much dV and
+    burn time each stage has. Reading the part tree takes a lot of RPCs, so it only happens
+    again after staging. The vessel's mass is streamed to account for propellant burned since.
+
+    The utils burn helpers accept this in place of a vessel, and then make no RPCs."""
+
+    def __init__(
+        self, conn: Client, vessel: Vessel, registry: streams.StreamRegistry | None = None
+    ):
+        self._vessel = vessel
+        add_stream = (streams.shared(conn) if registry is None else registry).stream
+        self._mass = add_stream(getattr, vessel, "mass")
+        self._current_stage = add_stream(getattr, vessel.control, "current_stage")
+        self.refresh()
+
+    def refresh(self):
+        """Read the part tree again."""
+        vessel = self._vessel
+        self._stage = vessel.control.current_stage
+        self._snapshot_mass = self._mass()
+        parts = [(part.mass, part.dry_mass, part.decouple_stage) for part in vessel.parts.all]
+        engines = []
+        for engine in vessel.parts.engines:
+            part = engine.part
+            thrust = engine.max_vacuum_thrust * engine.thrust_limit
+            isp = engine.vacuum_specific_impulse
+            if thrust > 0 and isp > 0:
+                engines.append(
+                    _Engine(part.stage, part.decouple_stage, thrust, thrust / (isp * G0))
+                )
+        self._stages = _stages(self._stage, parts, engines)
+
+    @property
+    def stages(self) -> list[StagePerformance]:
+        """What's left of each stage, in the order they burn."""
+        if self._current_stage() != self._stage:
+            self.refresh()
+        burned = self._snapshot_mass - self._mass()
+        stages = []
+        for stage in self._stages:
+            propellant = stage.start_mass - stage.end_mass
+            if burned >= propellant:
+                burned -= propellant
+                continue
+            if burned > 0:
+                stage = replace(stage, start_mass=stage.start_mass - burned)
+                burned = 0
+            stages.append(stage)
+        return stages
+
+    @property
+    def delta_v(self):
+        return sum(stage.delta_v for stage in self.stages)
+
+    # the current stage's values, so this can stand in for a vessel in single-stage code
+
+    @property
+    def mass(self):
+        return self._mass()
+
+    @property
+    def available_thrust(self):
+        stages = self.stages
+        return stages[0].thrust if stages else 0.0
+
+    @property
+    def specific_impulse(self):
+        stages = self.stages
+        return stages[0].specific_impulse if stages else 0.0
+
+    def burn_time(self, dv: float):
+        """Time to burn dv at full throttle, staging as needed. inf if there isn't enough dV."""
+        total = 0.0
+        for stage in self.stages:
+            if dv <= stage.delta_v:
+                return total + stage.burn_time_for(dv)
+            total += stage.burn_time
+            dv -= stage.delta_v
+        return math.inf
+
+    def dv_of_burn(self, burn_time: float):
+        """dV gained by burning at full throttle for burn_time, staging as needed."""
+        total = 0.0
+        for stage in self.stages:
+            if burn_time <= stage.burn_time:
+                return total + stage.dv_of_burn(burn_time)
+            total += stage.delta_v
+            burn_time -= stage.burn_time
+        return total
+
+    def braking_distance(self, speed: float):
+        """Distance covered while burning retrograde from speed to a stop. inf if there isn't
+        enough dV."""
+        distance = 0.0
+        for stage in self.stages:
+            dv = min(speed, stage.delta_v)
+            burn_time = stage.burn_time_for(dv)
+            distance += stage.braking_distance(speed, burn_time)
+            speed -= dv
+            if speed <= 0:
+                return distance
+        return math.inf
+
+    def remove(self):
+        self._mass.remove()
+        self._current_stage.remove()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.remove()
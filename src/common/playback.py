@@ -0,0 +1,61 @@
+import math
+from array import array
+from bisect import bisect_right
+from typing import Sequence
+
+from common import utils
+
+
+def nlerp(a: utils.Vec3, b: utils.Vec3, t: float) -> utils.Vec3:
+    return utils.vec_normalize(
+        utils.vec_sum(utils.vec_scalar_mult(1 - t, a), utils.vec_scalar_mult(t, b))
+    )
+
+
+def slerp(a: utils.Vec3, b: utils.Vec3, t: float) -> utils.Vec3:
+    """Interpolate between two unit vectors at a constant angular rate."""
+    angle = utils.vec_angle(a, b)
+    if angle < 1e-6:  # too close for the sines to be accurate
+        return nlerp(a, b, t)
+    sin_angle = math.sin(angle)
+    return utils.vec_sum(
+        utils.vec_scalar_mult(math.sin((1 - t) * angle) / sin_angle, a),
+        utils.vec_scalar_mult(math.sin(t * angle) / sin_angle, b),
+    )
+
+
+class FlightPath:
+    """A recorded (altitude, direction) flight path that can be sampled at any altitude.
+
+    Lookups bisect the sorted altitudes and interpolate between the two surrounding samples, so
+    the commanded direction is continuous and doesn't depend on how often it's sampled.
+    Altitudes outside the recording are clamped to its ends."""
+
+    def __init__(self, direction_data: Sequence[tuple[float, Sequence[float]]], use_slerp=True):
+        if not direction_data:
+            raise ValueError("Flight path needs at least one point")
+        points = sorted(direction_data, key=lambda point: point[0])
+        self.altitudes = array("d", (altitude for altitude, _ in points))
+        self._x = array("d", (direction[0] for _, direction in points))
+        self._y = array("d", (direction[1] for _, direction in points))
+        self._z = array("d", (direction[2] for _, direction in points))
+        self._interpolate = slerp if use_slerp else nlerp
+
+    def __len__(self):
+        return len(self.altitudes)
+
+    def _point(self, index: int) -> utils.Vec3:
+        return utils.vec_normalize((self._x[index], self._y[index], self._z[index]))
+
+    def direction_at(self, altitude: float, lookahead: float = 0) -> utils.Vec3:
+        """Direction to point at, looking `lookahead` metres of altitude ahead to give the
+        autopilot time to turn."""
+        altitude += lookahead
+        index = bisect_right(self.altitudes, altitude)
+        if index == 0:
+            return self._point(0)
+        if index == len(self.altitudes):
+            return self._point(index - 1)
+        start, end = self.altitudes[index - 1], self.altitudes[index]
+        t = (altitude - start) / (end - start)  # end > start, since bisect_right skips equals
+        return self._interpolate(self._point(index - 1), self._point(index), t)
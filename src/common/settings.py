@@ -1,2 +1,4 @@
-warp_sleep = 1
-wait_sleep = 0.001
+warp_sleep = 1
+autopilot_lead_time = 0.5  # seconds the recorded flight path is followed ahead by
+recording_tolerance = 0.002  # max radians a simplified flight path may stray from the recording
+telemetry_bus_name = "krpc_telemetry"  # shared memory block gravturn publishes its ascent to
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+from array import array
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from common import utils
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ships (
+    name TEXT PRIMARY KEY,
+    record_values TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    ship TEXT NOT NULL REFERENCES ships (name),
+    target_apoapsis REAL NOT NULL,
+    target_inclination REAL NOT NULL,
+    record_values TEXT NOT NULL,
+    direction_data BLOB NOT NULL,
+    other_data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recordings_by_target
+    ON recordings (ship, target_apoapsis, target_inclination);
+"""
+
+
+@dataclass(frozen=True)
+class RecordingInfo:
+    """Summary of a stored recording. Load the flight path with ShipStore.load_recording."""
+
+    id: int
+    target_apoapsis: float
+    target_inclination: float
+
+
+@dataclass(frozen=True)
+class Recording:
+    target_apoapsis: float
+    target_inclination: float
+    values: list[Any]
+    direction_data: list[tuple[float, utils.Vec3]]
+    other_data: list[list[Any]]
+
+
+def _pack_directions(direction_data: Sequence[tuple[float, Sequence[float]]]) -> bytes:
+    packed = array("d")
+    for altitude, direction in direction_data:
+        packed.append(altitude)
+        packed.extend(direction)
+    return packed.tobytes()
+
+
+def _unpack_directions(data: bytes) -> list[tuple[float, utils.Vec3]]:
+    packed = array("d")
+    packed.frombytes(data)
+    return [
+        (packed[i], (packed[i + 1], packed[i + 2], packed[i + 3])) for i in range(0, len(packed), 4)
+    ]
+
+
+class ShipStore:
+    """gravturn's ship profiles and recorded flight paths, kept in an SQLite database.
+
+    Recordings are only ever inserted, so saving one doesn't touch the others, and listing
+    them doesn't load their flight paths."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def is_empty(self) -> bool:
+        return self._db.execute("SELECT NOT EXISTS (SELECT 1 FROM ships)").fetchone()[0] == 1
+
+    def record_values(self, ship: str) -> list[Any] | None:
+        """The values last entered on the record panel for this ship, or None if it's new."""
+        row = self._db.execute("SELECT record_values FROM ships WHERE name = ?", (ship,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_record_values(self, ship: str, values: Sequence[Any]):
+        with self._db:
+            self._db.execute(
+                "INSERT INTO ships (name, record_values) VALUES (?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET record_values = excluded.record_values",
+                (ship, json.dumps(values)),
+            )
+
+    def recordings(self, ship: str) -> list[RecordingInfo]:
+        return [
+            RecordingInfo(*row)
+            for row in self._db.execute(
+                "SELECT id, target_apoapsis, target_inclination FROM recordings"
+                " WHERE ship = ? ORDER BY id",
+                (ship,),
+            )
+        ]
+
+    def load_recording(self, recording_id: int) -> Recording:
+        row = self._db.execute(
+            "SELECT target_apoapsis, target_inclination, record_values, direction_data,"
+            " other_data FROM recordings WHERE id = ?",
+            (recording_id,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No recording with id {recording_id}")
+        target_apoapsis, target_inclination, values, direction_data, other_data = row
+        return Recording(
+            target_apoapsis,
+            target_inclination,
+            json.loads(values),
+            _unpack_directions(direction_data),
+            json.loads(other_data),
+        )
+
+    def add_recording(
+        self,
+        ship: str,
+        target_apoapsis: float,
+        target_inclination: float,
+        values: Sequence[Any],
+        direction_data: Sequence[tuple[float, Sequence[float]]],
+        other_data: Sequence[Sequence[Any]],
+    ) -> int:
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO recordings (ship, target_apoapsis, target_inclination,"
+                " record_values, direction_data, other_data) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    ship,
+                    target_apoapsis,
+                    target_inclination,
+                    json.dumps(values),
+                    _pack_directions(direction_data),
+                    json.dumps(other_data),
+                ),
+            )
+        assert cursor.lastrowid is not None
+        return cursor.lastrowid
+
+    def import_json(self, path: str):
+        """Merge the ships and recordings from an old gravturn_ships.json into this store, all
+        in one transaction. Ships already in the store keep their record values, and recordings
+        already in it aren't added again."""
+        with open(path, "r") as f:
+            ships = json.load(f)
+        with self._db:
+            for name, ship in ships.items():
+                self._db.execute(
+                    "INSERT INTO ships (name, record_values) VALUES (?, ?)"
+                    " ON CONFLICT (name) DO NOTHING",
+                    (name, json.dumps(ship["record_values"])),
+                )
+                for recording in ship.get("recordings", []):
+                    row = (
+                        name,
+                        recording["target_apoapsis"],
+                        recording["target_inclination"],
+                        json.dumps(recording["values"]),
+                        _pack_directions(recording["direction_data"]),
+                        json.dumps(recording["other_data"]),
+                    )
+                    self._db.execute(
+                        "INSERT INTO recordings (ship, target_apoapsis, target_inclination,"
+                        " record_values, direction_data, other_data)"
+                        " SELECT ?1, ?2, ?3, ?4, ?5, ?6 WHERE NOT EXISTS (SELECT 1 FROM recordings"
+                        " WHERE ship = ?1 AND target_apoapsis = ?2 AND target_inclination = ?3"
+                        " AND direction_data = ?5)",
+                        row,
+                    )
+
+
+def open_store(path: str, legacy_path: str | None = None) -> ShipStore:
+    """Open the store at path, first merging in the old JSON file at legacy_path if there is
+    one. The JSON file is only renamed to .imported once its import has been committed."""
+    store = ShipStore(path)
+    if legacy_path is not None and os.path.exists(legacy_path) and os.path.getsize(legacy_path) > 0:
+        try:
+            store.import_json(legacy_path)
+        except BaseException:
+            store.close()
+            raise
+        os.replace(legacy_path, legacy_path + ".imported")
+    return store
@@ -0,0 +1,83 @@
+from typing import Generic, TypeVar
+
+from common import playback, utils
+
+T = TypeVar("T")
+
+_Point = tuple[float, utils.Vec3, T]
+
+
+class PathSimplifier(Generic[T]):
+    """Streaming piecewise-linear simplification of an (altitude, direction) path.
+
+    Points are fed in one at a time with add(). A point is only kept if the segment from the
+    last kept point couldn't otherwise be stretched further without some dropped point
+    straying more than `tolerance` radians from the slerp between the segment's ends, which is
+    exactly how FlightPath will reconstruct it. Each point carries a payload (eg. a telemetry
+    row), which is what add() and finish() return for the points that are kept. At most
+    `max_window` points are held back at once, which bounds both memory and the work per point.
+    """
+
+    def __init__(self, tolerance: float, max_window: int = 256):
+        self.tolerance = tolerance
+        self.max_window = max_window
+        self.points_in = 0
+        self.points_out = 0
+        self.max_error = 0.0
+        self._anchor: _Point | None = None
+        self._window: list[_Point] = []
+        self._window_error = 0.0
+
+    @property
+    def compression_ratio(self):
+        return self.points_in / self.points_out if self.points_out else 1.0
+
+    def add(self, altitude: float, direction: utils.Vec3, payload: T) -> list[T]:
+        """Returns the payloads of any points that are now known to be kept."""
+        self.points_in += 1
+        point = (altitude, direction, payload)
+        if self._anchor is None:
+            self._anchor = point
+            return self._keep(point)
+
+        if self._window:
+            error = 0.0
+            if len(self._window) < self.max_window:
+                error = self._segment_error(self._anchor, point, self._window)
+            if len(self._window) >= self.max_window or error > self.tolerance:
+                # the segment can't reach this point, so end it at the previous one
+                end = self._window.pop()
+                self.max_error = max(self.max_error, self._window_error)
+                self._anchor = end
+                self._window = [point]
+                self._window_error = 0.0
+                return self._keep(end)
+            self._window_error = error
+
+        self._window.append(point)
+        return []
+
+    def finish(self) -> list[T]:
+        """Keep the last point. Call this once the path is complete."""
+        if not self._window:
+            return []
+        end = self._window[-1]
+        self.max_error = max(self.max_error, self._window_error)
+        self._anchor = end
+        self._window = []
+        self._window_error = 0.0
+        return self._keep(end)
+
+    def _keep(self, point: _Point) -> list[T]:
+        self.points_out += 1
+        return [point[2]]
+
+    @staticmethod
+    def _segment_error(start: _Point, end: _Point, points: list[_Point]):
+        span = end[0] - start[0]
+        error = 0.0
+        for altitude, direction, _ in points:
+            t = (altitude - start[0]) / span if span else 0
+            expected = playback.slerp(start[1], end[1], min(max(t, 0), 1))
+            error = max(error, utils.vec_angle(direction, expected))
+        return error
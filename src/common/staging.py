@@ -0,0 +1,111 @@
+import queue
+import threading
+from typing import Any, Callable
+
+from krpc.client import Client
+
+from common.expressions import ServerCondition
+
+
+class Rule:
+    """An action for a StagingEngine to run when a server-side condition becomes true."""
+
+    def __init__(self, engine: "StagingEngine", action: Callable[[], None], once: bool):
+        self._engine = engine
+        self._action = action
+        self._once = once
+        self._event: Any = None
+        self._finished = False
+        self._cancelled = False
+        self.fired = threading.Event()
+
+    def _trigger(self):
+        if self._cancelled or (self._once and self.fired.is_set()):
+            return
+        if self._once:
+            self.fired.set()
+        self._engine._queue.put(self)
+
+    def _run(self):
+        if self._cancelled:
+            return
+        if self._once:
+            self._remove_event()
+        else:
+            self.fired.set()
+        self._action()
+
+    def _remove_event(self):
+        with self._engine._lock:
+            (event, self._event) = (self._event, None)
+            self._finished = True
+        if event is not None:
+            event.remove()
+
+    def cancel(self):
+        """Stop watching the condition. An action already waiting to run won't."""
+        self._cancelled = True
+        self._remove_event()
+
+
+class StagingEngine:
+    """Runs actions as soon as the server reports their condition is true, eg. staging when the
+    boosters burn out, so a script's main loop doesn't have to check for it every tick.
+
+    Actions run in order on the engine's own thread, so they can make RPCs and sleep without
+    holding up stream updates or the main loop. An exception in an action stops the engine and
+    is raised again by close()."""
+
+    def __init__(self, conn: Client):
+        self._conn = conn
+        self._queue: queue.Queue[Rule | None] = queue.Queue()
+        self._lock = threading.Lock()
+        self._rules: list[Rule] = []
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="StagingEngine", daemon=True)
+        self._thread.start()
+
+    def when(self, condition: ServerCondition, action: Callable[[], None], once: bool = True):
+        """Run action the first time condition is true, or every time it becomes true if not
+        once. Actions can add more rules, eg. to watch the next stage."""
+        rule = Rule(self, action, once)
+        event = condition.add_event(rule._trigger)
+        with self._lock:
+            self._rules.append(rule)
+            if not rule._finished:  # it can fire, and be done with the event, before we get here
+                (rule._event, event) = (event, None)
+        if event is not None:
+            event.remove()
+        return rule
+
+    def _run(self):
+        while (rule := self._queue.get()) is not None:
+            if self._error is not None:
+                continue
+            try:
+                rule._run()
+            except BaseException as e:
+                self._error = e
+
+    def _cancel_rules(self):
+        with self._lock:
+            rules = list(self._rules)
+        for rule in rules:
+            rule.cancel()
+
+    def close(self):
+        """Cancel the rules that haven't fired, and wait for any running action to finish."""
+        self._cancel_rules()
+        self._queue.put(None)
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        # including any added by that action
+        self._cancel_rules()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
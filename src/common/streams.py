@@ -0,0 +1,121 @@
+import threading
+import weakref
+from typing import Any, Callable, Hashable
+
+from krpc.client import Client
+
+
+class SharedStream:
+    """A handle on a stream owned by a StreamRegistry. Works like a kRPC stream, except remove()
+    only releases this handle, and callbacks added through it are removed along with it."""
+
+    def __init__(self, registry: "StreamRegistry", key: Hashable, stream: Any):
+        self._registry = registry
+        self._key = key
+        self._stream = stream
+        self._callbacks: list[Callable[[Any], None]] = []
+        self._removed = False
+
+    def __call__(self):
+        return self._stream()
+
+    @property
+    def condition(self):
+        return self._stream.condition
+
+    def wait(self, timeout: float | None = None):
+        self._stream.wait(timeout)
+
+    def add_callback(self, callback: Callable[[Any], None]):
+        self._callbacks.append(callback)
+        self._stream.add_callback(callback)
+
+    def remove_callback(self, callback: Callable[[Any], None]):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+            self._stream.remove_callback(callback)
+
+    def remove(self):
+        if self._removed:
+            return
+        self._removed = True
+        for callback in self._callbacks:
+            self._stream.remove_callback(callback)
+        self._callbacks.clear()
+        self._registry._release(self._key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.remove()
+
+
+class StreamRegistry:
+    """Hands out shared handles on streams, so asking for the same (func, *args) twice reuses
+    one server-side stream. It's removed when the last handle is. Like conn.add_stream, the
+    arguments must compare equal for streams to be shared, eg. getattr on the same object.
+
+    kRPC itself gives identical add_stream calls the same stream, and removing it through one
+    of them removes it for all, so code sharing a connection should share a registry too: see
+    shared()."""
+
+    def __init__(self, conn: Client):
+        self._conn = conn
+        self._lock = threading.Lock()
+        self._streams: dict[Hashable, tuple[Any, int]] = {}
+
+    def stream(self, func: Callable[..., Any], *args: Any) -> SharedStream:
+        try:
+            key: Hashable = (func, args)
+            hash(key)
+        except TypeError:  # can't be compared, so it gets a stream of its own
+            key = object()
+        with self._lock:
+            (stream, count) = self._streams.get(key, (None, 0))
+            if stream is None:
+                stream = self._conn.add_stream(func, *args)
+            self._streams[key] = (stream, count + 1)
+        return SharedStream(self, key, stream)
+
+    def _release(self, key: Hashable):
+        with self._lock:
+            if key not in self._streams:  # already closed
+                return
+            (stream, count) = self._streams[key]
+            if count > 1:
+                self._streams[key] = (stream, count - 1)
+                return
+            del self._streams[key]
+        stream.remove()
+
+    def __len__(self):
+        """Number of server-side streams currently open."""
+        return len(self._streams)
+
+    def close(self):
+        """Remove every stream, whether or not all its handles were released."""
+        with self._lock:
+            streams = [stream for (stream, _) in self._streams.values()]
+            self._streams.clear()
+        for stream in streams:
+            stream.remove()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_shared: "weakref.WeakKeyDictionary[Client, StreamRegistry]" = weakref.WeakKeyDictionary()
+_shared_lock = threading.Lock()
+
+
+def shared(conn: Client) -> StreamRegistry:
+    """The connection's own registry, for code that opens streams without being handed one.
+    Don't close it, just remove the handles."""
+    with _shared_lock:
+        if conn not in _shared:
+            _shared[conn] = StreamRegistry(conn)
+        return _shared[conn]
@@ -0,0 +1,167 @@
+import json
+import struct
+import threading
+from array import array
+from dataclasses import dataclass, field
+from typing import Any
+
+from krpc.client import Client
+
+from common import simplify, streams, utils
+from common.krpc_types.SpaceCenter import Vessel
+
+COLUMNS = ("ut", "altitude", "direction_x", "direction_y", "direction_z", "warp")
+_TYPECODES = ("d", "d", "d", "d", "d", "b")
+
+# the recording file is a sequence of blocks, each starting with a tag and a count
+_HEADER = struct.Struct("<4sI")
+_SAMPLES_TAG = b"SMPL"
+_EVENTS_TAG = b"EVNT"
+
+
+@dataclass
+class Telemetry:
+    """A recording read back from disk. Each column is an array indexed by sample."""
+
+    columns: dict[str, array] = field(default_factory=dict)
+    events: list[tuple[float, float, str, Any]] = field(default_factory=list)
+
+    def direction_data(self) -> list[tuple[float, utils.Vec3]]:
+        """(altitude, direction) pairs, in the format gravturn's flight path playback uses."""
+        c = self.columns
+        return [
+            (altitude, (x, y, z))
+            for altitude, x, y, z in zip(
+                c["altitude"], c["direction_x"], c["direction_y"], c["direction_z"]
+            )
+        ]
+
+    def other_data(self) -> list[tuple[float, str, Any]]:
+        """(altitude, name, value) for each event."""
+        return [(altitude, name, value) for _, altitude, name, value in self.events]
+
+
+class TelemetryRecorder:
+    """Records the vessel's surface-frame direction from stream callbacks on this connection.
+
+    Samples go into preallocated columns of `capacity` rows, which are appended to `path` and
+    reused whenever they fill up, so memory use doesn't grow with the length of the flight. A new
+    sample is only taken when the direction has turned by more than `min_angle` radians. If
+    `tolerance` is set, samples are also passed through a PathSimplifier before being stored.
+    Streams come from `registry`, or the connection's shared one, so they're shared with the
+    script's own."""
+
+    def __init__(
+        self,
+        conn: Client,
+        vessel: Vessel,
+        path: str,
+        capacity: int = 4096,
+        min_angle: float = 0.00175,
+        tolerance: float | None = None,
+        registry: streams.StreamRegistry | None = None,
+    ):
+        self.path = path
+        self.min_angle = min_angle
+        self.simplifier = None if tolerance is None else simplify.PathSimplifier(tolerance)
+        self._capacity = capacity
+        self._columns = tuple(array(code, [0]) * capacity for code in _TYPECODES)
+        self._size = 0
+        self._events: list[tuple[float, float, str, Any]] = []
+        self._last_direction: utils.Vec3 | None = None
+        self._lock = threading.Lock()
+        self._file = None
+
+        add_stream = (streams.shared(conn) if registry is None else registry).stream
+        self._ut = add_stream(getattr, conn.space_center, "ut")
+        self._altitude = add_stream(getattr, vessel.flight(), "mean_altitude")
+        self._warp = add_stream(getattr, conn.space_center, "physics_warp_factor")
+        self._direction = add_stream(vessel.direction, vessel.surface_reference_frame)
+
+    def start(self):
+        self._file = open(self.path, "wb")
+        self._direction.add_callback(self._on_direction)
+        self._on_direction(self._direction())
+
+    def stop(self):
+        """Stop recording, write out whatever is buffered and close the file."""
+        self._direction.remove_callback(self._on_direction)
+        for stream in (self._ut, self._altitude, self._warp, self._direction):
+            stream.remove()
+        with self._lock:
+            if self.simplifier:
+                for row in self.simplifier.finish():
+                    self._append(row)
+            self._flush()
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def event(self, name: str, value: Any = None):
+        """Mark something happening at the current time and altitude, eg. starting physics warp."""
+        with self._lock:
+            self._events.append((self._ut(), self._altitude(), name, value))
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _on_direction(self, direction: utils.Vec3):
+        with self._lock:
+            if self._file is None:
+                return
+            last = self._last_direction
+            if last is not None and utils.vec_angle(direction, last) <= self.min_angle:
+                return
+            self._last_direction = direction
+            row = (self._ut(), self._altitude(), *direction, self._warp())
+            if self.simplifier:
+                for kept in self.simplifier.add(row[1], direction, row):
+                    self._append(kept)
+            else:
+                self._append(row)
+
+    def _append(self, row: tuple[float, ...]):
+        for column, value in zip(self._columns, row):
+            column[self._size] = value
+        self._size += 1
+        if self._size == self._capacity:
+            self._flush()
+
+    def _flush(self):
+        if self._file is None:
+            return
+        if self._size:
+            self._file.write(_HEADER.pack(_SAMPLES_TAG, self._size))
+            for column in self._columns:
+                self._file.write(memoryview(column)[: self._size].tobytes())
+            self._size = 0
+        if self._events:
+            data = json.dumps(self._events).encode()
+            self._file.write(_HEADER.pack(_EVENTS_TAG, len(data)))
+            self._file.write(data)
+            self._events.clear()
+        self._file.flush()
+
+
+def read_telemetry(path: str) -> Telemetry:
+    telemetry = Telemetry({name: array(code) for name, code in zip(COLUMNS, _TYPECODES)})
+    with open(path, "rb") as f:
+        while header := f.read(_HEADER.size):
+            tag, count = _HEADER.unpack(header)
+            if tag == _SAMPLES_TAG:
+                for name in COLUMNS:
+                    column = telemetry.columns[name]
+                    column.fromfile(f, count)
+            elif tag == _EVENTS_TAG:
+                telemetry.events.extend(tuple(event) for event in json.loads(f.read(count)))
+            else:
+                raise ValueError(f"Unknown telemetry block {tag!r} in {path}")
+    return telemetry
@@ -0,0 +1,188 @@
+import os
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Sequence
+
+from krpc.client import Client
+
+from common import streams
+from common.krpc_types.SpaceCenter import Vessel
+from common.telemetry import COLUMNS
+
+# magic, version, field count, length of the field names
+_HEADER = struct.Struct("<4sHHI")
+_MAGIC = b"TBUS"
+_VERSION = 1
+
+
+def _layout(fields: Sequence[str]):
+    names = "\0".join(fields).encode()
+    # the sequence number and values after the names need 8-byte alignment
+    seq_offset = -(-(_HEADER.size + len(names)) // 8) * 8
+    return (names, seq_offset, seq_offset + 8 + 8 * len(fields))
+
+
+class TelemetryBus:
+    """The latest value of a fixed set of float fields, in shared memory, so other processes can
+    read it without a connection of their own.
+
+    One process writes (publish), any number read. Writes are guarded by a seqlock: the sequence
+    number is odd while a write is in progress, and readers retry if it was odd or changed while
+    they were reading, so they never see half an update and never block the writer."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._owner = owner
+        (magic, version, count, names_length) = _HEADER.unpack_from(shm.buf)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{shm.name} isn't a telemetry bus")
+        names = bytes(shm.buf[_HEADER.size : _HEADER.size + names_length]).decode()
+        self.fields = tuple(names.split("\0")) if count else ()
+        (_, seq_offset, end) = _layout(self.fields)
+        self._seq = shm.buf[seq_offset : seq_offset + 8].cast("Q")
+        self._values = shm.buf[seq_offset + 8 : end].cast("d")
+        self._values_format = struct.Struct(f"<{len(self.fields)}d")
+        self._values_offset = seq_offset + 8
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, fields: Sequence[str] = COLUMNS, name: str | None = None):
+        """Create the block, or take over one left behind under the same name by a process that
+        never closed it (eg. it crashed). Readers still attached to that one keep getting
+        updates. If it doesn't hold the same fields, it's replaced instead."""
+        (names, _, size) = _layout(fields)
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            assert name is not None
+            stale = cls._take_over(name, tuple(fields))
+            if stale is not None:
+                return stale
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, _VERSION, len(fields), len(names))
+        shm.buf[_HEADER.size : _HEADER.size + len(names)] = names
+        return cls(shm, True)
+
+    @classmethod
+    def _take_over(cls, name: str, fields: tuple[str, ...]):
+        """Own an existing block if it's a bus with these fields, otherwise unlink it."""
+        # tracked like a block we created, since we're now the one to destroy it
+        shm = shared_memory.SharedMemory(name)
+        try:
+            bus = cls(shm, True)
+        except (ValueError, struct.error):
+            shm.close()
+            shm.unlink()
+            return None
+        if bus.fields != fields or shm.size < _layout(fields)[2]:
+            bus.close()
+            return None
+        if bus._seq[0] % 2:  # its writer died mid-publish, which would leave readers spinning
+            bus._seq[0] += 1
+        return bus
+
+    @classmethod
+    def attach(cls, name: str):
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:  # before 3.13, attaching also marks the block to be destroyed at exit
+            shm = shared_memory.SharedMemory(name)
+            if os.name == "posix":
+                resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+        return cls(shm, False)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def seq(self):
+        """Goes up by 2 with every publish; 0 until the first one."""
+        return self._seq[0]
+
+    def publish(self, values: Sequence[float]):
+        with self._lock:
+            self._seq[0] += 1
+            self._values_format.pack_into(self._shm.buf, self._values_offset, *values)
+            self._seq[0] += 1
+
+    def read(self) -> tuple[int, tuple[float, ...]]:
+        """(seq, values) of the latest publish."""
+        while True:
+            before = self._seq[0]
+            if before % 2 == 0:
+                values = tuple(self._values)
+                if self._seq[0] == before:
+                    return (before, values)
+            time.sleep(0)
+
+    def read_dict(self):
+        return dict(zip(self.fields, self.read()[1]))
+
+    def wait(self, seq: int, timeout: float | None = None, poll_interval: float = 0.005):
+        """Block until something newer than seq is published, then read() it. Returns None on
+        timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._seq[0] <= seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+        return self.read()
+
+    def close(self):
+        """Detach from the block. The process that created it also destroys it."""
+        self._seq.release()
+        self._values.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TelemetryPublisher:
+    """Publishes the vessel's ut, altitude, surface-frame direction and physics warp factor (the
+    telemetry.COLUMNS) to a TelemetryBus whenever the direction or altitude stream updates."""
+
+    def __init__(
+        self,
+        conn: Client,
+        vessel: Vessel,
+        name: str | None = None,
+        registry: streams.StreamRegistry | None = None,
+    ):
+        self.bus = TelemetryBus.create(COLUMNS, name)
+        add_stream = (streams.shared(conn) if registry is None else registry).stream
+        self._ut = add_stream(getattr, conn.space_center, "ut")
+        self._altitude = add_stream(getattr, vessel.flight(), "mean_altitude")
+        self._warp = add_stream(getattr, conn.space_center, "physics_warp_factor")
+        self._direction = add_stream(vessel.direction, vessel.surface_reference_frame)
+        self._triggers = (self._altitude, self._direction)
+
+    def _on_update(self, _):
+        self.bus.publish((self._ut(), self._altitude(), *self._direction(), self._warp()))
+
+    def start(self):
+        for stream in self._triggers:
+            stream.add_callback(self._on_update)
+        self._on_update(None)
+
+    def stop(self):
+        for stream in self._triggers:
+            stream.remove_callback(self._on_update)
+        for stream in (self._ut, self._altitude, self._warp, self._direction):
+            stream.remove()
+        self.bus.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,48 @@
+import ast
+
+from common import ascent, ship_store, utils
+
+# Tunes gravturn.py's turn_start_speed, turn_start_pitch and apoapsis_margin for the active
+# vessel by simulating its ascent offline, then saves them as its record values so the next
+# gravturn.py launch has them filled in.
+
+if __name__ == "__main__":
+    ships_filename = "gravturn_ships.db"
+    legacy_ships_filename = "gravturn_ships.json"
+
+    conn = utils.connect()
+    vessel = conn.space_center.active_vessel
+    vehicle = ascent.Vehicle.of(vessel, float(input("Drag area (Cd * A, m^2) [1.0]: ") or 1))
+
+    with ship_store.open_store(ships_filename, legacy_ships_filename) as store:
+        record_values = store.record_values(vessel.name)
+        if record_values is not None:
+            (target_apoapsis, _, target_inclination, _, _, *flags) = record_values
+        else:
+            target_apoapsis = ast.literal_eval(input("Target apoapsis: "))
+            target_inclination = ast.literal_eval(input("Target inclination: "))
+            flags = [
+                ast.literal_eval(input("Number of SRB stages: ")),
+                input("Has fairing (y/n): ") == "y",
+                input("Has payload (y/n): ") == "y",
+            ]
+
+        utils.log(conn, f"Optimizing ascent to {target_apoapsis:,} m @ {target_inclination}°.")
+        (parameters, result) = ascent.optimize(vehicle, target_apoapsis, target_inclination)
+        utils.log(
+            conn,
+            f"Turn at {parameters.turn_start_speed} m/s by {parameters.turn_start_pitch}°,"
+            f" margin {parameters.apoapsis_margin} m: {result.delta_v:.0f} m/s to orbit",
+        )
+
+        store.save_record_values(
+            vessel.name,
+            [
+                target_apoapsis,
+                parameters.apoapsis_margin,
+                target_inclination,
+                parameters.turn_start_speed,
+                parameters.turn_start_pitch,
+                *flags,
+            ],
+        )
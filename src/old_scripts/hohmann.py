@@ -1,16 +1,17 @@
-import krpc
-
-from common import utils
-
-# Connection setup
-conn = krpc.connect()
-vessel = conn.space_center.active_vessel
-target = conn.space_center.bodies["Mun"]
-
-vessel.control.sas = False
-vessel.control.rcs = False
-vessel.auto_pilot.engage()
-
-utils.hohmann_moon_rendezvous(conn, vessel, target, 2000000, do_circularize=False)
-
-vessel.control.sas = True
+from common import lambert, performance, utils
+
+# Connection setup
+conn = utils.connect()
+vessel = conn.space_center.active_vessel
+target = conn.space_center.bodies["Mun"]
+ship_performance = performance.VesselPerformance(conn, vessel)
+
+vessel.control.sas = False
+vessel.control.rcs = False
+vessel.auto_pilot.engage()
+
+lambert.moon_rendezvous(
+    conn, vessel, target, 2000000, do_circularize=False, performance=ship_performance
+)
+
+vessel.control.sas = True
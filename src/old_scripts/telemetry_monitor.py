@@ -0,0 +1,20 @@
+import math
+import time
+
+from common import settings, telemetry_bus, utils
+
+# Prints the ascent telemetry gravturn.py publishes, straight from shared memory: no connection
+# to the game and no RPCs. Start it once gravturn.py is launching.
+
+if __name__ == "__main__":
+    with telemetry_bus.TelemetryBus.attach(settings.telemetry_bus_name) as bus:
+        seq = 0
+        while (update := bus.wait(seq, timeout=10)) is not None:
+            (seq, values) = update
+            sample = dict(zip(bus.fields, values))
+            pitch = math.degrees(math.asin(utils.clamp(sample["direction_x"], -1, 1)))
+            print(
+                f"UT {sample['ut']:.1f}  altitude {sample['altitude']:,.0f} m"
+                f"  pitch {pitch:.1f}°  warp {sample['warp']:.0f}"
+            )
+            time.sleep(0.5)
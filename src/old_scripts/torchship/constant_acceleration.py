@@ -1,36 +1,37 @@
-import time
-
-import krpc
-
-from common import utils
-
-
-def get_current_acceleration(vessel):
-    return vessel.thrust / vessel.mass
-
-
-desired_acceleration = 9.81
-allowed_error = 0.001
-
-if __name__ == "__main__":
-    conn = krpc.connect()
-    Expression = conn.krpc.Expression
-    vessel = conn.space_center.active_vessel
-    control = vessel.control
-
-    with conn.stream(getattr, vessel, "thrust") as thrust, conn.stream(
-        getattr, vessel, "mass"
-    ) as mass, conn.stream(getattr, control, "throttle") as throttle:
-        while True:
-            if throttle() > 0 and abs(thrust() / mass() - desired_acceleration) > allowed_error:
-                # control.throttle = 1
-                # for engine in vessel.parts.engines: # because kspi doesn't play nice with krpc
-                #     engine.thrust_limit = 1
-                thrust_limit = desired_acceleration / (vessel.max_thrust / vessel.mass)
-                if thrust_limit > 1:
-                    utils.log(conn, "Warning: desired acceleration is currently impossible.")
-                    thrust_limit = 1
-                # for engine in vessel.parts.engines:
-                #     engine.thrust_limit = thrust_limit
-                control.throttle = thrust_limit
-            time.sleep(0.1)
+import time
+
+from common import expressions, utils
+
+
+def get_current_acceleration(vessel):
+    return vessel.thrust / vessel.mass
+
+
+desired_acceleration = 9.81
+allowed_error = 0.001
+
+if __name__ == "__main__":
+    conn = utils.connect()
+    vessel = conn.space_center.active_vessel
+    control = vessel.control
+
+    acceleration = expressions.server_value(conn, getattr, vessel, "thrust") / (
+        expressions.server_value(conn, getattr, vessel, "mass")
+    )
+    off_target = (expressions.server_value(conn, getattr, control, "throttle") > 0) & (
+        (acceleration > desired_acceleration + allowed_error)
+        | (acceleration < desired_acceleration - allowed_error)
+    )
+    while True:
+        expressions.wait_for(off_target)
+        # control.throttle = 1
+        # for engine in vessel.parts.engines: # because kspi doesn't play nice with krpc
+        #     engine.thrust_limit = 1
+        thrust_limit = desired_acceleration / (vessel.max_thrust / vessel.mass)
+        if thrust_limit > 1:
+            utils.log(conn, "Warning: desired acceleration is currently impossible.")
+            thrust_limit = 1
+        # for engine in vessel.parts.engines:
+        #     engine.thrust_limit = thrust_limit
+        control.throttle = thrust_limit
+        time.sleep(0.1)  # give the new throttle time to take effect
@@ -1,141 +1,68 @@
-import re
-import sys
-import time
-
-import krpc
-
-from common import utils
-
-
-def get_coast_time(distance, first_burn_dv, first_burn_time):
-    return (distance - first_burn_dv * first_burn_time) / (first_burn_dv)
-
-
-if __name__ == "__main__":
-    # dv_budget = int(re.sub("\D", "", input("dv budget: ")))
-    dv_budget = 100000
-
-    conn = krpc.connect()
-    vessel = conn.space_center.active_vessel
-    control = vessel.control
-    auto_pilot = vessel.auto_pilot
-    target = conn.space_center.target_body
-
-    if target is None:
-        utils.log(conn, "Target must be a celestial body, aborting.")
-        sys.exit()
-
-    control.remove_nodes()
-
-    # get an approximation of the target's position when we get there
-    total_burn_dv = dv_budget / 2
-    total_burn_time = utils.get_burn_time(vessel, total_burn_dv)
-
-    burn_vector = utils.vec_normalize(
-        target.orbit.position_at(conn.space_center.ut, vessel.orbital_reference_frame)
-    )
-    node = utils.add_node_with_burn(control, conn.space_center.ut, burn_vector, total_burn_dv)
-
-    (final_orbit, _) = utils.get_next_orbit_in_soi(node.orbit, target.orbit.body)
-    if final_orbit is None:
-        utils.log(conn, "Failed to get naive arrival UT, aborting.")
-        sys.exit()
-
-    arrival_ut = final_orbit.time_of_closest_approach(target.orbit)
-    node.remove()
-
-    coast_speed = utils.vec_magnitude(
-        utils.vec_sum(
-            utils.vec_scalar_mult(
-                total_burn_dv,
-                utils.vec_normalize(
-                    utils.vec_difference(
-                        target.orbit.position_at(
-                            arrival_ut, target.orbit.body.non_rotating_reference_frame
-                        ),
-                        vessel.position(target.orbit.body.non_rotating_reference_frame),
-                    )
-                ),
-            ),
-            vessel.velocity(target.orbit.body.non_rotating_reference_frame),
-        )
-    )
-
-    control.sas = False
-    auto_pilot.engage()
-    auto_pilot.reference_frame = vessel.orbital_reference_frame
-    auto_pilot.target_direction = target.position(vessel.orbital_reference_frame)
-    auto_pilot.wait()
-    auto_pilot.disengage()
-
-    node = control.add_node(conn.space_center.ut + 3)
-    utils.set_node_burn(
-        node, utils.vec_normalize(vessel.direction(node.orbital_reference_frame)), total_burn_dv
-    )
-    control.sas = True
-    time.sleep(0.2)
-    auto_pilot.sas_mode = conn.space_center.SASMode.maneuver
-    control.throttle = 1
-
-    remaining_burn_dv = total_burn_dv
-    while remaining_burn_dv / total_burn_dv > 0.2:
-        hybrid_frame = conn.space_center.ReferenceFrame.create_hybrid(
-            position=vessel.orbital_reference_frame,
-            rotation=node.orbital_reference_frame,
-            velocity=target.orbit.body.non_rotating_reference_frame,
-        )
-        burn_vector = utils.vec_difference(
-            utils.vec_scalar_mult(
-                coast_speed,
-                utils.vec_normalize(
-                    utils.vec_difference(
-                        target.orbit.position_at(arrival_ut, hybrid_frame),
-                        vessel.position(hybrid_frame),
-                    )
-                ),
-            ),
-            vessel.velocity(hybrid_frame),
-        )
-        remaining_burn_dv = utils.vec_magnitude(burn_vector)
-        old_node = node
-        node = control.add_node(
-            conn.space_center.ut + 3 * conn.space_center.warp_rate,
-            burn_vector[1],
-            burn_vector[2],
-            -burn_vector[0],
-        )
-        old_node.remove()
-
-    while remaining_burn_dv > 100:
-        (final_orbit, _) = utils.get_next_orbit_in_soi(vessel.orbit, target)
-        if final_orbit is None:
-            (final_orbit, _) = utils.get_next_orbit_in_soi(vessel.orbit, target.orbit.body)
-        arrival_ut = final_orbit.time_of_closest_approach(target.orbit)
-        hybrid_frame = conn.space_center.ReferenceFrame.create_hybrid(
-            position=vessel.orbital_reference_frame,
-            rotation=node.orbital_reference_frame,
-            velocity=target.orbit.body.non_rotating_reference_frame,
-        )
-        burn_vector = utils.vec_normalize(
-            utils.vec_difference(
-                target.orbit.position_at(arrival_ut, hybrid_frame),
-                final_orbit.position_at(arrival_ut, hybrid_frame),
-            )
-        )
-        if utils.vec_magnitude(burn_vector) < target.equatorial_radius:
-            burn_vector = utils.vec_normalize(vessel.velocity(hybrid_frame))
-        remaining_burn_dv = coast_speed - utils.vec_magnitude(
-            vessel.velocity(target.non_rotating_reference_frame)
-        )
-        burn_vector = utils.vec_scalar_mult(remaining_burn_dv, burn_vector)
-        old_node = node
-        node = control.add_node(
-            conn.space_center.ut + 3 * conn.space_center.warp_rate,
-            burn_vector[1],
-            burn_vector[2],
-            -burn_vector[0],
-        )
-        old_node.remove()
-    print(remaining_burn_dv)
-    control.throttle = 0
-    control.remove_nodes()
+import re
+import sys
+
+from common import brachistochrone, performance, streams, utils
+
+if __name__ == "__main__":
+    # dv_budget = int(re.sub("\D", "", input("dv budget: ")))
+    dv_budget = 100000
+    replan_interval = 10  # s
+
+    conn = utils.connect()
+    vessel = conn.space_center.active_vessel
+    control = vessel.control
+    auto_pilot = vessel.auto_pilot
+    target = conn.space_center.target_body
+
+    if target is None:
+        utils.log(conn, "Target must be a celestial body, aborting.")
+        sys.exit()
+
+    control.remove_nodes()
+    ship_performance = performance.VesselPerformance(conn, vessel)
+
+    # plan the whole flip-and-burn up front to check it's within budget
+    plan = brachistochrone.plan_intercept(conn, vessel, target, ship_performance)
+    if plan.delta_v > dv_budget:
+        utils.log(conn, f"Intercept needs {int(plan.delta_v):,}m/s, over budget. Aborting.")
+        sys.exit()
+    utils.log(conn, f"Estimated dv usage: {int(plan.delta_v):,}m/s", 10)
+    utils.log(
+        conn, f"Estimated travel time: {utils.seconds_to_hms(plan.arrival_ut - plan.start_ut)}", 10
+    )
+
+    control.sas = False
+    auto_pilot.engage()
+    auto_pilot.reference_frame = target.orbit.body.non_rotating_reference_frame
+    auto_pilot.target_direction = plan.accelerate_direction
+    auto_pilot.wait()
+
+    with streams.shared(conn).stream(getattr, conn.space_center, "ut") as ut:
+        # the plan starts now, so make up for however long turning took
+        plan = brachistochrone.plan_intercept(conn, vessel, target, ship_performance)
+        auto_pilot.target_direction = plan.accelerate_direction
+        control.throttle = 1
+
+        # the ship never flies the plan exactly (steering lag, gravity, thrust drift), so solve
+        # again from where it actually is every so often. The solver gets ill-conditioned close
+        # to the flip, so that stops a little before it and the deceleration is flown as planned
+        next_plan_ut = ut() + replan_interval
+        while (now := ut()) < plan.flip_ut:
+            if now >= next_plan_ut:
+                next_plan_ut = now + replan_interval
+                if plan.flip_ut - now > 2 * replan_interval:
+                    try:
+                        plan = brachistochrone.plan_intercept(
+                            conn, vessel, target, ship_performance
+                        )
+                        auto_pilot.target_direction = plan.accelerate_direction
+                    except ValueError as e:
+                        utils.log(conn, f"Couldn't re-plan, keeping the old plan: {e}")
+            next_ut = min(next_plan_ut, plan.flip_ut)
+            utils.wait_until(lambda: ut() >= next_ut, ut)
+
+        utils.log(conn, "Flipping.")
+        auto_pilot.target_direction = plan.decelerate_direction
+        utils.wait_until(lambda: ut() >= plan.arrival_ut, ut)
+    control.throttle = 0
+    auto_pilot.disengage()
@@ -1,63 +1,80 @@
-import time
-
-import krpc
-
-from common import utils
-
-if __name__ == "__main__":
-    # flip_margin = 200 # s
-
-    # set up connection
-    conn = krpc.connect()
-    vessel = conn.space_center.active_vessel
-    control = vessel.control
-    auto_pilot = vessel.auto_pilot
-
-    # set up display text
-    screen_size = conn.ui.stock_canvas.rect_transform.size
-    text = conn.ui.stock_canvas.add_text(f"Distance to flip/burn:")
-    text.rect_transform.position = (0, (screen_size[1] / 2) - 160)
-    text.rect_transform.size = (800, 50)
-    text.color = (1, 1, 1)
-    text.size = 18
-    text.alignment = conn.ui.TextAnchor.middle_center
-
-    # main loop
-    while True:
-        time.sleep(0.1)  # sleep first because of continue
-
-        (target, target_is_body) = (
-            (conn.space_center.target_body, True)
-            if conn.space_center.target_body
-            else (conn.space_center.target_vessel, False)
-        )
-
-        if not target:
-            text.content = "No target set."
-            continue
-
-        speed = utils.vec_magnitude(vessel.velocity(target.orbital_reference_frame))
-        (orbit, time_to_soi) = (
-            utils.get_next_orbit_in_soi(vessel.orbit, target) if target_is_body else (None, None)
-        )
-
-        if orbit is not None:  # straight line distance to periapsis
-            current_distance = utils.vec_magnitude(
-                utils.vec_difference(
-                    vessel.position(target.orbital_reference_frame),
-                    orbit.position_at(
-                        conn.space_center.ut + time_to_soi + orbit.time_to_periapsis,
-                        target.orbital_reference_frame,
-                    ),
-                )
-            )
-        else:  # straight line distance to center of target
-            current_distance = utils.vec_magnitude(vessel.position(target.orbital_reference_frame))
-
-        distance_until_flip = current_distance - utils.get_braking_distance(
-            vessel, speed
-        )  # - speed*flip_margin
-        try:
-            text.content = f"Distance to flip/burn: {int(distance_until_flip):,} m"
-        except ValueError:
-            text.content = f"Distance to flip/burn: NaN m"
+import time
+
+from common import frames, hud, orbits, performance, utils
+
+if __name__ == "__main__":
+    # flip_margin = 200 # s
+
+    # set up connection
+    conn = utils.connect()
+    vessel = conn.space_center.active_vessel
+    control = vessel.control
+    auto_pilot = vessel.auto_pilot
+    chain = orbits.OrbitChain(conn, vessel)
+    ship_performance = performance.VesselPerformance(conn, vessel)
+    frame_cache = frames.FrameCache(conn, vessel.orbit.body.non_rotating_reference_frame)
+    vessel_frame = vessel.reference_frame
+    target_frames = {}
+
+    # set up display text
+    readout = hud.Hud(conn)
+    text = readout.add_text(
+        "Distance to flip/burn:",
+        position=(0, (readout.screen_size[1] / 2) - 160),
+        size=(800, 50),
+        color=(1, 1, 1),
+        font_size=18,
+        alignment=conn.ui.TextAnchor.middle_center,
+    )
+
+    # main loop
+    while True:
+        time.sleep(0.1)  # sleep first because of continue
+
+        (target, target_is_body) = (
+            (conn.space_center.target_body, True)
+            if conn.space_center.target_body
+            else (conn.space_center.target_vessel, False)
+        )
+
+        if not target:
+            text.content = "No target set."
+            continue
+
+        if target not in target_frames:
+            target_frames[target] = (
+                target.orbital_reference_frame,
+                target.non_rotating_reference_frame if target_is_body else None,
+            )
+        (target_frame, target_non_rotating_frame) = target_frames[target]
+        ship = frame_cache.get(vessel_frame)
+        target_state = frame_cache.get(target_frame)
+
+        speed = utils.vec_magnitude(
+            frames.transform_velocity((0, 0, 0), (0, 0, 0), ship, target_state)
+        )
+        patch = chain.find(target) if target_is_body else None
+
+        if patch is not None:  # straight line distance to periapsis
+            current_distance = utils.vec_magnitude(
+                utils.vec_difference(
+                    frames.transform_position(
+                        (0, 0, 0), ship, frame_cache.get(target_non_rotating_frame)
+                    ),
+                    patch.kepler.position_at_true_anomaly(0),
+                )
+            )
+        else:  # straight line distance to center of target
+            current_distance = utils.vec_magnitude(
+                frames.transform_position((0, 0, 0), ship, target_state)
+            )
+
+        distance_until_flip = current_distance - utils.get_braking_distance(
+            ship_performance, speed
+        )  # - speed*flip_margin
+        try:
+            text.content = f"Distance to flip/burn: {int(distance_until_flip):,} m"
+        except ValueError:
+            text.content = f"Distance to flip/burn: NaN m"
+        except OverflowError:  # braking distance is inf
+            text.content = "Not enough dV left to stop."